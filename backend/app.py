@@ -1,12 +1,40 @@
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 # global modules
 from config import global_settings
 from router import api_router
+from natural_query.services.pg_service import close_db
+from natural_query.services.async_pg_service import close_async_db
+from natural_query.services.db_router import db_router
+from natural_query.core.schema_cache import schema_cache
+from natural_query.router import job_manager
+from natural_query.services.llm_service import llmService
+from natural_query.core.worker_metrics import worker_metrics
+from natural_query.warmup import readiness, warmup
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Uvicorn accepts connections only once the warmup is done
+    await warmup([name.strip() for name in global_settings.SCHEMA_CACHE_SCHEMAS.split(",") if name.strip()])
+    if global_settings.METRICS_SHARED:
+        worker_metrics.start()
+    yield
+    readiness.draining = True
+    worker_metrics.stop()
+    job_manager.shutdown()
+    schema_cache.stop()
+    db_router.stop()
+    db_router.close()
+    await db_router.aclose()
+    await close_async_db()
+    close_db()
+    llmService.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,6 +47,7 @@ app.add_middleware(
 app.include_router(api_router)
 
 if __name__ == "__main__":
+    # Development server (auto reload, one process); in production use serve.py
     import uvicorn
     
     uvicorn.run(
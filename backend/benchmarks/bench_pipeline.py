@@ -0,0 +1,287 @@
+"""
+Offline micro-benchmarks of the pipeline: no watsonx credits, only a local Postgres and
+Redis (the DB_* and REDIS_URI settings). The LLM is the deterministic fake model
+(LLM_PROVIDER=fake, forced by this script unless set), so end to end timings are the
+pipeline's own overhead plus LLM_FAKE_LATENCY per call.
+
+For each catalog size a scratch schema (bench_pipeline_<n>) gets n tables (see
+bench_schema_extractor) and its first table --rows rows of synthetic data. Benchmarks:
+
+- schema_extraction: SchemaExtractor (information_schema) and CatalogSchemaExtractor
+- sql_prompt: build_sql_prompt on a new snapshot (cold) and on a reused one (warm)
+- is_select_query: PostgresDB.is_select_query over the SQL validator corpus
+- execute_query: streaming and JSON serialization of results of increasing size
+- conversation: ConversationManager add_messages / get_conversation_history
+- pipeline: sql_generator and process_query (caches off) on the public schema
+
+The JSON report carries the commit, so reports of two commits can be compared; with
+--compare the exit status is 1 when a median got slower than --threshold allows.
+
+Usage (from backend/):
+    python -m benchmarks.bench_pipeline --output before.json
+    python -m benchmarks.bench_pipeline --output after.json --compare before.json
+    python -m benchmarks.bench_pipeline --sizes 10 100 --rows 100 10000 --only execute_query
+"""
+import os
+
+# Before the settings are read: offline model, and no cache hiding the pipeline's cost
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("SQL_CACHE_ENABLED", "false")
+os.environ.setdefault("RESULT_CACHE_ENABLED", "false")
+
+from benchmarks.bench_schema_extractor import create_catalog, drop_catalog
+from natural_query.core.catalog_extractor import CatalogSchemaExtractor
+from natural_query.core.schema_extractor import SchemaExtractor
+from natural_query.core.schema_cache import SchemaSnapshot
+from natural_query.services.pg_service import PostgresDB, get_db, close_db
+from natural_query.services.llm_service import llmService
+from natural_query.tools import build_sql_prompt, execute_query, sql_generator
+from natural_query.service import ConversationManager, KNAIService
+from config import global_settings
+from typing import Any, Callable, Dict, List, Optional
+import subprocess
+import statistics
+import platform
+import argparse
+import json
+import time
+import uuid
+import sys
+
+BENCHMARKS = ("schema_extraction", "sql_prompt", "is_select_query", "execute_query", "conversation", "pipeline")
+QUESTION = "What are the ten largest amounts by name this month?"
+CORPUS = os.path.join(os.path.dirname(__file__), "sql_validator_corpus.jsonl")
+
+SEED_ROWS = """
+    INSERT INTO "{schema}".t_1 (name, description, amount, quantity, created_at)
+    SELECT 'item ' || g, md5(g::text), (g %% 1000) * 1.25, g %% 50,
+           timestamp '2025-01-01' + g * interval '1 minute'
+    FROM generate_series(1, %(rows)s) AS g
+"""
+
+def measure(function: Callable[[], Any], repeat: int, number: int = 1) -> Dict[str, float]:
+    """
+    Times function: repeat samples of number calls each, reported per call.
+
+    Args:
+        function: Call to time
+        repeat: Samples
+        number: Calls per sample (for functions too fast to time one by one)
+
+    Returns:
+        Median, p95, min and max in milliseconds per call
+    """
+    function()  # Warm-up: imports, connections, lazily built structures
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        samples.append((time.perf_counter() - started) / number * 1000)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[int(0.95 * (len(samples) - 1))], 4),
+        "min_ms": round(samples[0], 4),
+        "max_ms": round(samples[-1], 4),
+        "samples": repeat,
+        "calls_per_sample": number
+    }
+
+def seed(schema_name: str, tables: int, rows: int) -> None:
+    create_catalog(schema_name, tables)
+    with get_db().get_cursor(cursor_factory=None) as cur:
+        cur.execute(SEED_ROWS.format(schema=schema_name), {"rows": rows})
+        cur.execute(f'ANALYZE "{schema_name}".t_1')
+
+def bench_schema_extraction(schema_name: str, tables: int, repeat: int, legacy_max_tables: int) -> Dict[str, Dict]:
+    results = {"catalog": measure(lambda: CatalogSchemaExtractor().get_schema(schema_name), repeat)}
+    if tables <= legacy_max_tables:
+        results["information_schema"] = measure(lambda: SchemaExtractor().get_schema(schema_name), repeat)
+    return results
+
+def bench_sql_prompt(schema_name: str, repeat: int) -> Dict[str, Dict]:
+    schema = CatalogSchemaExtractor().get_schema(schema_name)
+    warm = SchemaSnapshot(schema_name, "bench", schema)
+    return {
+        # A new snapshot rebuilds the per-table renderings and token counts
+        "cold": measure(lambda: build_sql_prompt(QUESTION, SchemaSnapshot(schema_name, "bench", schema)), repeat),
+        "warm": measure(lambda: build_sql_prompt(QUESTION, warm), repeat, number=10)
+    }
+
+def bench_is_select_query(repeat: int) -> Dict[str, Dict]:
+    with open(CORPUS) as f:
+        queries = [json.loads(line)["sql"] for line in f if line.strip()]
+
+    def run() -> None:
+        for query in queries:
+            PostgresDB.is_select_query(query)
+
+    result = measure(run, repeat, number=10)
+    result["queries"] = len(queries)
+    result["per_query_us"] = round(result["median_ms"] / len(queries) * 1000, 3)
+    return {"corpus": result}
+
+def bench_execute_query(schema_name: str, row_counts: List[int], repeat: int) -> Dict[str, Dict]:
+    results = {}
+    for rows in row_counts:
+        query = f'SELECT * FROM "{schema_name}".t_1 ORDER BY id LIMIT {rows}'
+        result = measure(lambda: execute_query(query), repeat)
+        output = execute_query(query)
+        result["result_bytes"] = len(output)
+        if output.startswith('{"error"'):
+            result["error"] = json.loads(output)["error"]
+        results[f"rows={rows}"] = result
+    return results
+
+def bench_conversation(lengths: List[int], repeat: int) -> Dict[str, Dict]:
+    manager = ConversationManager(redis_url=global_settings.REDIS_URI)
+    message = ("user", "How did the sales of the last quarter compare with the same quarter last year?")
+    results = {}
+    try:
+        for length in lengths:
+            conversation_id = f"bench-{uuid.uuid4()}"
+            manager.add_messages(conversation_id, [message] * length)
+            results[f"messages={length}"] = {
+                "add_messages": measure(lambda: manager.add_messages(conversation_id, [message, message]), repeat),
+                "history_last_10": measure(
+                    lambda: manager.get_conversation_history(conversation_id, last_n=10), repeat
+                ),
+                "history_full": measure(lambda: manager.get_conversation_history(conversation_id), repeat)
+            }
+            manager.redis_client.delete(f"conv:{conversation_id}")
+    finally:
+        manager.redis_client.close()
+    return results
+
+def bench_pipeline(repeat: int) -> Dict[str, Dict]:
+    service = KNAIService(ConversationManager(redis_url=global_settings.REDIS_URI))
+    results = {
+        "sql_generator": measure(lambda: sql_generator(QUESTION), repeat),
+        "process_query_sql": measure(lambda: service.process_query(QUESTION), repeat),
+        "process_query_casual": measure(lambda: service.process_query("hello, thank you"), repeat)
+    }
+    response = service.process_query(QUESTION)
+    results["process_query_sql"]["status"] = response["status"]
+    results["process_query_sql"]["timings"] = response["response"].get("timings")
+    return results
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """
+    Medians of a report keyed by path, e.g. "execute_query.tables=10.rows=100"
+    """
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict) and "median_ms" in value:
+            flat[path] = value["median_ms"]
+        elif isinstance(value, dict):
+            flat.update(flatten(value, path))
+    return flat
+
+def compare(report: Dict, baseline: Dict, threshold: float) -> int:
+    """
+    Prints the change of every median against a previous report.
+
+    Returns:
+        Benchmarks slower than the baseline by more than threshold
+    """
+    current, previous = flatten(report["results"]), flatten(baseline["results"])
+    print(f"\nCompared with {baseline['meta'].get('commit', '?')} ({baseline['meta'].get('created_at', '?')}):")
+    regressions = 0
+    for path in sorted(current.keys() & previous.keys()):
+        ratio = current[path] / previous[path] if previous[path] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"  {path:<70} {previous[path]:>10.3f}ms -> {current[path]:>10.3f}ms  x{ratio:.2f}{flag}")
+    return regressions
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def run(args: argparse.Namespace) -> Dict:
+    selected = set(args.only or BENCHMARKS)
+    results: Dict[str, Any] = {name: {} for name in BENCHMARKS if name in selected}
+
+    if selected & {"schema_extraction", "sql_prompt", "execute_query"}:
+        for size in args.sizes:
+            schema_name = f"bench_pipeline_{size}"
+            seed(schema_name, size, max(args.rows))
+            try:
+                if "schema_extraction" in selected:
+                    results["schema_extraction"][f"tables={size}"] = bench_schema_extraction(
+                        schema_name, size, args.repeat, args.legacy_max_tables
+                    )
+                if "sql_prompt" in selected:
+                    results["sql_prompt"][f"tables={size}"] = bench_sql_prompt(schema_name, args.repeat)
+                if "execute_query" in selected and size == args.sizes[0]:
+                    # The result size, not the catalog's, drives serialization
+                    results["execute_query"] = bench_execute_query(schema_name, args.rows, args.repeat)
+            finally:
+                if not args.keep:
+                    drop_catalog(schema_name, size)
+            print(f"{size:>6} tables done")
+
+    if "is_select_query" in selected:
+        results["is_select_query"] = bench_is_select_query(args.repeat)
+    if "conversation" in selected:
+        results["conversation"] = bench_conversation(args.messages, args.repeat)
+    if "pipeline" in selected:
+        results["pipeline"] = bench_pipeline(args.repeat)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "llm_provider": global_settings.LLM_PROVIDER,
+            "llm_latency_s": global_settings.LLM_FAKE_LATENCY,
+            "schema_prompt_format": global_settings.SCHEMA_PROMPT_FORMAT,
+            "repeat": args.repeat
+        },
+        "results": results
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Tables per synthetic catalog")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 1000, 10000], help="Result sizes for execute_query")
+    parser.add_argument("--messages", type=int, nargs="+", default=[10, 100, 1000],
+                        help="Conversation lengths for the ConversationManager benchmarks")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="Run only these benchmarks")
+    parser.add_argument("--legacy-max-tables", type=int, default=100,
+                        help="Largest catalog the information_schema extractor is timed on")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic schemas after the run")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--compare", help="Previous JSON report to compare the medians with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative slowdown reported as a regression when comparing")
+    args = parser.parse_args()
+
+    regressions = 0
+    try:
+        report = run(args)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=4)
+        if args.compare:
+            with open(args.compare) as f:
+                regressions = compare(report, json.load(f), args.threshold)
+        else:
+            for path, median in flatten(report["results"]).items():
+                print(f"  {path:<70} {median:>10.3f}ms")
+    finally:
+        llmService.close()
+        close_db()
+    sys.exit(1 if regressions else 0)
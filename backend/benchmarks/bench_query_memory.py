@@ -0,0 +1,115 @@
+"""
+Compares peak memory and time of materializing a query result the old way
+(fetchall into RealDictRows + json.dumps(indent=4)) against streaming it from a
+server-side cursor into a bounded ResultBuffer (QUERY_MAX_ROWS / QUERY_MAX_BYTES).
+
+Rows come from generate_series, so no tables are needed. Each run happens in its own
+subprocess: tracemalloc reports Python allocations and ru_maxrss the process peak,
+which also covers libpq's result buffers.
+
+Usage (from backend/):
+    python -m benchmarks.bench_query_memory --rows 10000 1000000
+    python -m benchmarks.bench_query_memory --rows 1000000 --modes streaming --max-rows 1000000
+"""
+from typing import Dict, Any, List
+import subprocess
+import argparse
+import json
+import sys
+
+QUERY = """
+    SELECT g AS id,
+           md5(g::text) AS name,
+           (g %% 1000) * 1.25 AS amount,
+           timestamp '2025-01-01' + g * interval '1 minute' AS placed_at
+    FROM generate_series(1, %(rows)s) AS g
+"""
+
+MODES = ("legacy", "streaming")
+
+def run_worker(mode: str, rows: int, max_rows: int, max_bytes: int, fetch_size: int) -> Dict[str, Any]:
+    import tracemalloc
+    import resource
+    import time
+
+    from natural_query.services.pg_service import get_db, close_db
+    from natural_query.tools import ResultBuffer
+
+    db = get_db()
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    started = time.perf_counter()
+
+    if mode == "legacy":
+        results = db.execute_select(QUERY, {"rows": rows})
+        text = json.dumps(results, indent=4, default=str)
+        returned, truncated = len(results), False
+    else:
+        buffer = ResultBuffer(max_rows, max_bytes)
+        cursor_rows = db.iter_select(QUERY, {"rows": rows}, itersize=fetch_size)
+        try:
+            for row in cursor_rows:
+                if not buffer.add(row):
+                    break
+        finally:
+            cursor_rows.close()
+        outcome = buffer.outcome()
+        text, returned, truncated = outcome.result, outcome.row_count, outcome.truncated
+
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    close_db()
+
+    return {
+        "mode": mode,
+        "rows": rows,
+        "returned_rows": returned,
+        "truncated": truncated,
+        "result_mb": len(text) / 1024 ** 2,
+        "seconds": elapsed,
+        "python_peak_mb": peak / 1024 ** 2,
+        # ru_maxrss is in KiB on Linux
+        "rss_growth_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024
+    }
+
+def run(mode: str, rows: int, args) -> Dict[str, Any]:
+    command = [
+        sys.executable, "-m", "benchmarks.bench_query_memory", "--worker", mode,
+        "--rows", str(rows), "--max-rows", str(args.max_rows), "--max-bytes", str(args.max_bytes),
+        "--fetch-size", str(args.fetch_size)
+    ]
+    process = subprocess.run(command, capture_output=True, text=True)
+    if process.returncode:
+        raise RuntimeError(f"{mode} run with {rows} rows failed:\n{process.stderr}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 1000000], help="Result sizes to test")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--max-rows", type=int, default=10000, help="Row cap of the streaming mode")
+    parser.add_argument("--max-bytes", type=int, default=2 * 1024 * 1024, help="Byte budget of the streaming mode")
+    parser.add_argument("--fetch-size", type=int, default=2000, help="Rows per server-side cursor round trip")
+    parser.add_argument("--worker", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.rows[0], args.max_rows, args.max_bytes, args.fetch_size)))
+        sys.exit(0)
+
+    report: List[Dict[str, Any]] = []
+    for rows in args.rows:
+        for mode in args.modes:
+            row = run(mode, rows, args)
+            report.append(row)
+            print(
+                f"{mode:>9} | {rows:>9} rows | returned {row['returned_rows']:>9}"
+                f"{' (truncated)' if row['truncated'] else '':<12} | {row['seconds']:7.2f}s"
+                f" | python peak {row['python_peak_mb']:8.1f} MB | rss +{row['rss_growth_mb']:8.1f} MB"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
@@ -0,0 +1,136 @@
+"""
+Compares SchemaExtractor (information_schema) against CatalogSchemaExtractor (pg_catalog)
+on synthetic catalogs of increasing size.
+
+Each size gets its own scratch schema (bench_catalog_<n>) with n tables of 8 columns,
+a primary key, a foreign key to the previous table and a secondary index. Uses the
+DB_* settings from the environment.
+
+The information_schema extractor grows roughly quadratically (its constraint lookup is a
+correlated subquery per column), so it is skipped above --legacy-max-tables.
+
+Usage (from backend/):
+    python -m benchmarks.bench_schema_extractor --sizes 10 100 1000 5000 --repeat 3
+"""
+from natural_query.core.catalog_extractor import CatalogSchemaExtractor
+from natural_query.core.schema_extractor import SchemaExtractor
+from natural_query.services.pg_service import get_db, close_db
+from typing import Dict, List
+import statistics
+import argparse
+import json
+import time
+
+# Tables are created and dropped in batches so a single transaction never needs
+# more locks than max_locks_per_transaction allows.
+BATCH_SIZE = 200
+
+CREATE_TABLES = """
+    DO $$
+    DECLARE
+        i int;
+    BEGIN
+        FOR i IN %(first)s..%(last)s LOOP
+            EXECUTE format(
+                'CREATE TABLE %%I.t_%%s (
+                    id serial PRIMARY KEY,
+                    parent_id int %%s,
+                    name varchar(120) NOT NULL,
+                    description text,
+                    amount numeric(12, 2),
+                    quantity int DEFAULT 0,
+                    is_active boolean DEFAULT true,
+                    created_at timestamp DEFAULT now()
+                )',
+                %(schema)s, i,
+                CASE WHEN i > 1 THEN format('REFERENCES %%I.t_%%s (id)', %(schema)s, i - 1) ELSE '' END
+            );
+            EXECUTE format('CREATE INDEX ON %%I.t_%%s (created_at)', %(schema)s, i);
+            EXECUTE format('COMMENT ON TABLE %%I.t_%%s IS %%L', %(schema)s, i, 'synthetic table ' || i);
+        END LOOP;
+    END $$;
+"""
+
+def create_catalog(schema_name: str, tables: int) -> None:
+    drop_catalog(schema_name, tables)
+    with get_db().get_cursor(cursor_factory=None) as cur:
+        cur.execute(f'CREATE SCHEMA "{schema_name}"')
+
+    for first in range(1, tables + 1, BATCH_SIZE):
+        with get_db().get_cursor(cursor_factory=None) as cur:
+            cur.execute(CREATE_TABLES, {
+                "schema": schema_name,
+                "first": first,
+                "last": min(first + BATCH_SIZE - 1, tables)
+            })
+
+def drop_catalog(schema_name: str, tables: int) -> None:
+    # Drop from the last table backwards so no batch depends on a later one.
+    for last in range(tables, 0, -BATCH_SIZE):
+        names = ", ".join(
+            f'"{schema_name}".t_{i}' for i in range(max(last - BATCH_SIZE + 1, 1), last + 1)
+        )
+        with get_db().get_cursor(cursor_factory=None) as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {names} CASCADE")
+
+    with get_db().get_cursor(cursor_factory=None) as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS "{schema_name}" CASCADE')
+
+def time_extractor(extractor, schema_name: str, repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        schema = extractor.get_schema(schema_name)
+        timings.append(time.perf_counter() - started)
+    return {
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "tables": len(schema)
+    }
+
+def run(sizes: List[int], repeat: int, keep: bool, legacy_max_tables: int) -> List[Dict]:
+    report = []
+    extractors = {
+        "information_schema": SchemaExtractor(),
+        "catalog": CatalogSchemaExtractor()
+    }
+
+    for size in sizes:
+        schema_name = f"bench_catalog_{size}"
+        create_catalog(schema_name, size)
+        try:
+            row = {"tables": size}
+            for name, extractor in extractors.items():
+                if name == "information_schema" and size > legacy_max_tables:
+                    continue
+                row[name] = time_extractor(extractor, schema_name, repeat)
+            report.append(row)
+
+            line = f"{size:>6} tables | catalog {row['catalog']['median_s']:9.3f}s"
+            if "information_schema" in row:
+                row["speedup"] = row["information_schema"]["median_s"] / row["catalog"]["median_s"]
+                line += f" | information_schema {row['information_schema']['median_s']:9.3f}s | x{row['speedup']:.1f}"
+            print(line)
+        finally:
+            if not keep:
+                drop_catalog(schema_name, size)
+
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--legacy-max-tables", type=int, default=1000,
+                        help="Largest catalog the information_schema extractor is timed on")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic schemas after the run")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    try:
+        results = run(args.sizes, args.repeat, args.keep, args.legacy_max_tables)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=4)
+    finally:
+        close_db()
@@ -0,0 +1,90 @@
+"""
+Reports the prompt size of a schema in every renderer format and, optionally, the
+end-to-end SQL generation latency with each format.
+
+The schema comes from the database (DB_* settings) or from a JSON file written by
+SchemaExtractor.save_schema_to_file. Token counts use tiktoken's cl100k_base.
+
+Usage (from backend/):
+    python -m benchmarks.bench_schema_render --schema public
+    python -m benchmarks.bench_schema_render --from-file schema.json --invoke 5 \\
+        --question "What are the top 10 products by revenue?"
+"""
+from natural_query.prompt import POSTGRES_SINTAX_RULES, AGENT_ROLE, AGENT_RULES
+from natural_query.core.schema_renderer import RENDERERS, render_schema, size_report
+from typing import Dict, Any, List
+import statistics
+import argparse
+import json
+import time
+
+def load_schema(args) -> Dict[str, Any]:
+    if args.from_file:
+        with open(args.from_file) as f:
+            return json.load(f)
+
+    from natural_query.core.catalog_extractor import CatalogSchemaExtractor
+    from natural_query.services.pg_service import close_db
+    try:
+        return CatalogSchemaExtractor().get_schema(args.schema)
+    finally:
+        close_db()
+
+def time_generation(schema: Dict[str, Any], questions: List[str], repeat: int) -> List[Dict[str, Any]]:
+    from natural_query.services.llm_service import llmService
+
+    llm = llmService.getwatson_llm()
+    rows = []
+    for fmt in RENDERERS:
+        schema_text = render_schema(schema, fmt)
+        timings = []
+        for question in questions:
+            prompt = f"""
+            <|system|>:
+                {AGENT_ROLE}
+            <|sintax|>:
+                {POSTGRES_SINTAX_RULES}
+            <|rules|>:
+                {AGENT_RULES}
+            <|schema|>:
+                {schema_text}
+            <|user|>
+                {question}
+            <|assistant|>
+            """
+            for _ in range(repeat):
+                started = time.perf_counter()
+                llm.invoke(prompt)
+                timings.append(time.perf_counter() - started)
+        rows.append({
+            "format": fmt,
+            "median_s": statistics.median(timings),
+            "p95_s": sorted(timings)[int(0.95 * (len(timings) - 1))]
+        })
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--schema", default="public", help="Database schema to extract")
+    parser.add_argument("--from-file", help="Read the schema from a JSON file instead of the database")
+    parser.add_argument("--invoke", type=int, default=0, help="LLM calls per question and format (0 = size only)")
+    parser.add_argument("--question", action="append", default=[], help="Question used for --invoke (repeatable)")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    schema = load_schema(args)
+    report: Dict[str, Any] = {"tables": len(schema), "sizes": size_report(schema)}
+
+    print(f"{len(schema)} tables")
+    for row in report["sizes"]:
+        print(f"{row['format']:>8} | {row['chars']:>9} chars | {row['tokens']:>8} tokens | -{row['reduction']:.0%}")
+
+    if args.invoke:
+        questions = args.question or ["How many orders did we have last month?"]
+        report["latency"] = time_generation(schema, questions, args.invoke)
+        for row in report["latency"]:
+            print(f"{row['format']:>8} | median {row['median_s']:.3f}s | p95 {row['p95_s']:.3f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
@@ -0,0 +1,186 @@
+"""
+Regression corpus, fuzzing and throughput of the token-based SQL validator
+(natural_query/core/sql_validator.py), compared with the substring checks it replaced.
+
+1. Corpus: every entry of sql_validator_corpus.jsonl must get its expected verdict;
+   entries marked "schema" are checked against a fixed customers/orders/products schema.
+2. Fuzz: valid queries stay valid when hostile comments are inserted between tokens,
+   keywords change case or a trailing semicolon is added, and become invalid when a
+   statement, a data-modifying CTE or a locking clause is appended. Random input must
+   never raise.
+3. Throughput of analyze/validate_sql against the legacy check.
+
+Exits with status 1 when any verdict differs from the expected one.
+
+Usage (from backend/):
+    python -m benchmarks.bench_sql_validator
+    python -m benchmarks.bench_sql_validator --fuzz 20000 --seed 7 --repeat 200
+"""
+from natural_query.core.sql_validator import analyze, tokenize, validate_sql
+from typing import Dict, Any, Callable, List, Tuple
+import argparse
+import random
+import json
+import time
+import sys
+import os
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "sql_validator_corpus.jsonl")
+
+CATALOG = {
+    "customers": frozenset(["id", "name"]),
+    "orders": frozenset(["id", "customer_id", "product_id", "quantity", "total", "order_date"]),
+    "products": frozenset(["id", "name", "price"])
+}
+
+HIDDEN_PAYLOADS = [
+    "/* ; DROP TABLE orders */", "/* delete from orders; */", "-- ; update orders set total = 0\n",
+    "/* nested /* ; insert */ */"
+]
+APPENDED_PAYLOADS = [
+    "; DROP TABLE orders", ";DELETE FROM orders", "; UPDATE orders SET total = 0",
+    "FOR UPDATE", "; COMMIT", "*/; DROP TABLE orders"
+]
+PREFIXED_PAYLOADS = [
+    "WITH d AS (DELETE FROM orders RETURNING *) ", "WITH u AS (UPDATE orders SET total = 0 RETURNING id) "
+]
+ALPHABET = "abcdefghijklmnopqrstuvwxyz ;'\"$()*/-.,=\n"
+
+def legacy_is_select_query(query: str) -> bool:
+    query = query.lower().strip()
+    forbidden_commands = [
+        'insert', 'update', 'delete', 'drop', 'truncate',
+        'alter', 'create', 'replace', 'merge', 'upsert',
+        'grant', 'revoke', 'commit', 'rollback'
+    ]
+    if query.startswith('explain'):
+        return True
+    if not query.startswith('select'):
+        return False
+    return not any(cmd in query for cmd in forbidden_commands)
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def verdict(entry: Dict[str, Any]) -> bool:
+    return validate_sql(entry["sql"], CATALOG if entry.get("schema") else None).valid
+
+def run_corpus(corpus: List[Dict[str, Any]]) -> Dict[str, Any]:
+    failures = [
+        {"sql": entry["sql"], "expected": entry["valid"], "reason": analyze(entry["sql"]).reason}
+        for entry in corpus if verdict(entry) != entry["valid"]
+    ]
+    plain = [entry for entry in corpus if not entry.get("schema")]
+    legacy_wrong = [entry["sql"] for entry in plain if legacy_is_select_query(entry["sql"]) != entry["valid"]]
+    return {"entries": len(corpus), "failures": failures, "legacy_wrong": legacy_wrong, "legacy_checked": len(plain)}
+
+def insert_between_tokens(sql: str, payload: str, rng: random.Random) -> str:
+    # Token starts are never inside a literal or comment, so the payload stays a comment
+    positions = [token.position for token in tokenize(sql)[1:]] or [len(sql)]
+    position = rng.choice(positions)
+    return f"{sql[:position]} {payload} {sql[position:]}"
+
+def flip_case(sql: str, rng: random.Random) -> str:
+    # Only unquoted words: the content of literals and quoted identifiers must not change
+    tokens = [token for token in tokenize(sql) if token.kind == "ident"]
+    chars = list(sql)
+    for token in tokens:
+        for i in range(token.position, token.position + len(token.value)):
+            if rng.random() < 0.5:
+                chars[i] = chars[i].swapcase()
+    return "".join(chars)
+
+def fuzz(corpus: List[Dict[str, Any]], cases: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    valid = [entry["sql"] for entry in corpus if entry["valid"] and not entry.get("schema")]
+    selects = [sql for sql in valid if analyze(sql).statement in ("select", "values")]
+
+    mutations: List[Tuple[str, bool, Callable[[str], str]]] = [
+        ("hidden payload", True, lambda sql: insert_between_tokens(sql, rng.choice(HIDDEN_PAYLOADS), rng)),
+        ("case", True, lambda sql: flip_case(sql, rng)),
+        ("trailing semicolon", True, lambda sql: sql.rstrip().rstrip(";") + " ;\n"),
+        ("appended statement", False, lambda sql: sql.rstrip().rstrip(";") + "\n" + rng.choice(APPENDED_PAYLOADS))
+    ]
+
+    counts: Dict[str, int] = {}
+    failures = []
+    for _ in range(cases):
+        name, expected, mutate = rng.choice(mutations)
+        sql = mutate(rng.choice(valid))
+        counts[name] = counts.get(name, 0) + 1
+        if analyze(sql).valid != expected:
+            failures.append({"mutation": name, "sql": sql, "expected": expected})
+
+    for _ in range(cases // 4):
+        sql = rng.choice(PREFIXED_PAYLOADS) + rng.choice(selects)
+        counts["data-modifying CTE"] = counts.get("data-modifying CTE", 0) + 1
+        if analyze(sql).valid:
+            failures.append({"mutation": "data-modifying CTE", "sql": sql, "expected": False})
+
+    crashes = []
+    for _ in range(cases // 4):
+        sql = "select " + "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 60)))
+        try:
+            analyze(sql)
+        except Exception as e:
+            crashes.append({"sql": sql, "error": repr(e)})
+    counts["random input"] = cases // 4
+
+    return {"cases": counts, "failures": failures, "crashes": crashes}
+
+def throughput(corpus: List[Dict[str, Any]], repeat: int) -> Dict[str, float]:
+    queries = [entry["sql"] for entry in corpus]
+    checks = {
+        "legacy substring check": legacy_is_select_query,
+        "analyze": analyze,
+        "validate_sql (schema)": lambda sql: validate_sql(sql, CATALOG)
+    }
+    report = {}
+    for name, check in checks.items():
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for sql in queries:
+                check(sql)
+        report[name] = (time.perf_counter() - started) / (repeat * len(queries)) * 1e6
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Regression corpus (JSON lines)")
+    parser.add_argument("--fuzz", type=int, default=5000, help="Mutated queries to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=100, help="Passes over the corpus for the throughput")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    corpus_report = run_corpus(corpus)
+    print(f"corpus | {corpus_report['entries']} entries, {len(corpus_report['failures'])} failures")
+    for failure in corpus_report["failures"]:
+        print(f"   expected {failure['expected']}: {failure['sql']} ({failure['reason']})")
+    print(
+        f"legacy | wrong on {len(corpus_report['legacy_wrong'])} of "
+        f"{corpus_report['legacy_checked']} schema-free entries"
+    )
+
+    fuzz_report = fuzz(corpus, args.fuzz, args.seed)
+    print(
+        f"fuzz   | {sum(fuzz_report['cases'].values())} cases, {len(fuzz_report['failures'])} failures, "
+        f"{len(fuzz_report['crashes'])} crashes"
+    )
+    for failure in fuzz_report["failures"][:20]:
+        print(f"   {failure['mutation']} expected {failure['expected']}: {failure['sql']!r}")
+    for crash in fuzz_report["crashes"][:20]:
+        print(f"   crash {crash['error']}: {crash['sql']!r}")
+
+    speed = throughput(corpus, args.repeat)
+    for name, micros in speed.items():
+        print(f"{name:>22} | {micros:8.1f} us/query | {1e6 / micros:10.0f} queries/s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"corpus": corpus_report, "fuzz": fuzz_report, "throughput_us": speed}, f, indent=4)
+
+    if corpus_report["failures"] or fuzz_report["failures"] or fuzz_report["crashes"]:
+        sys.exit(1)
@@ -0,0 +1,405 @@
+"""
+Load test and traffic replay for the /natural_query API, to measure how many
+concurrent users one instance sustains and to catch capacity regressions locally.
+
+Questions come from a log (--log) or are generated (--synthetic). A log is a text file
+with one question per line, or JSONL with "query" (or "question") and optionally
+"offset", the seconds since the start of the recording.
+
+Two modes:
+- ramp (default): for each --concurrency level, that many users send questions back to
+  back for --duration seconds (closed loop: throughput at a given concurrency).
+- replay: questions are sent at their recorded offsets, scaled by --speed, whatever the
+  latency (open loop: the recorded traffic's arrival rate).
+
+Each step reports throughput, client latency p50/p95/p99, errors by kind (HTTP 503 is
+uvicorn's limit_concurrency), the per-stage p50/p95 from the responses' timings
+(llm_queue and *_wait are queueing), the server-side time outside the pipeline
+(client latency minus timings.total_ms: connection limit, event loop and network) and
+the peak LLM and pool queues seen on /metrics.
+
+--serve starts the API itself with the fake LLM (LLM_PROVIDER=fake, LLM_FAKE_LATENCY,
+LLM_FAKE_LATENCY_JITTER) and the uvicorn limits of app.py; without it the API at --url
+must be running already.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --serve --llm-latency 0.5 --concurrency 1 5 10 20 40
+    python -m benchmarks.load_test --url http://localhost:8000 --log questions.jsonl --mode replay --speed 2
+    python -m benchmarks.load_test --serve --endpoint stream --output load.json
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import subprocess
+import argparse
+import asyncio
+import random
+import httpx
+import json
+import time
+import sys
+import os
+import re
+
+DATA_QUESTIONS = [
+    "How many orders did we have last month?",
+    "What are the ten best selling products?",
+    "Which customers spent the most this year?",
+    "What is the average order value per month?",
+    "How many new customers signed up each week?",
+    "What is the total revenue by product category?",
+    "Which products have never been ordered?",
+    "What is the monthly revenue trend over the last year?",
+    "Which customers placed more than five orders?",
+    "What was the busiest day for orders?"
+]
+CASUAL_QUESTIONS = ["hello", "thanks", "hi there", "good morning", "thank you"]
+
+ENDPOINTS = {"query": "/natural_query/", "stream": "/natural_query/stream"}
+# Gauges whose peak during a step shows where requests queue
+QUEUE_GAUGES = {
+    "llm_queued": re.compile(r'^knai_llm_calls_in_flight\{[^}]*state="queued_\w+"\} (\S+)$', re.MULTILINE),
+    "llm_active": re.compile(r'^knai_llm_calls_in_flight\{[^}]*state="active"\} (\S+)$', re.MULTILINE),
+    "db_pool_waiting": re.compile(r'^knai_db_pool_connections\{[^}]*state="waiting"\} (\S+)$', re.MULTILINE),
+    "jobs_queued": re.compile(r'^knai_jobs\{state="queued"\} (\S+)$', re.MULTILINE)
+}
+
+@dataclass
+class Sample:
+    """
+    One request as seen by the client.
+    Attributes:
+        latency: Seconds until the full response
+        outcome: "ok", "error" (status "error" in the body), "http_<code>", "timeout" or "connection"
+        first_token: Seconds until the first answer chunk (stream endpoint)
+        timings: The response's per-stage timings, in milliseconds
+    """
+    latency: float
+    outcome: str
+    first_token: Optional[float] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+def synthetic_log(count: int, casual_ratio: float, seed: int) -> List[Dict[str, Any]]:
+    """
+    Questions drawn from DATA_QUESTIONS and CASUAL_QUESTIONS; repeats are expected, as in real traffic
+    """
+    rng = random.Random(seed)
+    return [
+        {"query": rng.choice(CASUAL_QUESTIONS if rng.random() < casual_ratio else DATA_QUESTIONS)}
+        for _ in range(count)
+    ]
+
+def load_log(path: str) -> List[Dict[str, Any]]:
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                entry = {"query": item.get("query") or item["question"]}
+                if "offset" in item:
+                    entry["offset"] = float(item["offset"])
+                entries.append(entry)
+            else:
+                entries.append({"query": line})
+    return entries
+
+async def _send_query(client: httpx.AsyncClient, question: str) -> Sample:
+    started = time.perf_counter()
+    response = await client.post(ENDPOINTS["query"], json={"query": question})
+    latency = time.perf_counter() - started
+    if response.status_code != 200:
+        return Sample(latency, f"http_{response.status_code}")
+    body = response.json()
+    return Sample(
+        latency,
+        "ok" if body.get("status") == "success" else "error",
+        timings=body.get("response", {}).get("timings") or {}
+    )
+
+async def _send_stream(client: httpx.AsyncClient, question: str) -> Sample:
+    started = time.perf_counter()
+    first_token = None
+    outcome, timings, event = "error", {}, None
+    async with client.stream("POST", ENDPOINTS["stream"], json={"query": question}) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return Sample(time.perf_counter() - started, f"http_{response.status_code}")
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+                if event == "token" and first_token is None:
+                    first_token = time.perf_counter() - started
+            elif line.startswith("data:") and event == "done":
+                outcome, timings = "ok", json.loads(line[5:]).get("timings") or {}
+    return Sample(time.perf_counter() - started, outcome, first_token, timings)
+
+async def send(client: httpx.AsyncClient, endpoint: str, question: str) -> Sample:
+    started = time.perf_counter()
+    try:
+        if endpoint == "stream":
+            return await _send_stream(client, question)
+        return await _send_query(client, question)
+    except httpx.TimeoutException:
+        return Sample(time.perf_counter() - started, "timeout")
+    except httpx.TransportError:
+        return Sample(time.perf_counter() - started, "connection")
+
+async def ramp_step(client: httpx.AsyncClient, endpoint: str, questions: List[str],
+                    concurrency: int, duration: float) -> List[Sample]:
+    """
+    concurrency users sending questions back to back for duration seconds
+    """
+    samples: List[Sample] = []
+    deadline = time.perf_counter() + duration
+    cursor = iter(range(sys.maxsize))
+
+    async def user() -> None:
+        while time.perf_counter() < deadline:
+            samples.append(await send(client, endpoint, questions[next(cursor) % len(questions)]))
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return samples
+
+async def replay(client: httpx.AsyncClient, endpoint: str, entries: List[Dict[str, Any]],
+                 speed: float, default_rate: float) -> Tuple[List[Sample], int]:
+    """
+    Sends every entry at its offset divided by speed (entries without offsets arrive
+    at default_rate per second). Returns the samples and the peak requests in flight.
+    """
+    started = time.perf_counter()
+    in_flight = peak = 0
+
+    async def one(entry: Dict[str, Any], at: float) -> Sample:
+        nonlocal in_flight, peak
+        await asyncio.sleep(max(at - (time.perf_counter() - started), 0))
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            return await send(client, endpoint, entry["query"])
+        finally:
+            in_flight -= 1
+
+    base = entries[0].get("offset", 0.0) if entries else 0.0
+    tasks = [
+        one(entry, (entry["offset"] - base) / speed if "offset" in entry else index / default_rate)
+        for index, entry in enumerate(entries)
+    ]
+    return list(await asyncio.gather(*tasks)), peak
+
+class QueueSampler:
+    """
+    Polls /metrics during a step and keeps the peak of the queue gauges
+    """
+
+    def __init__(self, client: httpx.AsyncClient, interval: float = 0.5):
+        self.client = client
+        self.interval = interval
+        self.peaks: Dict[str, float] = {}
+        self.misses = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _poll(self) -> None:
+        while True:
+            try:
+                response = await self.client.get("/metrics")
+                # Refused too when the API is at its connection limit
+                if response.status_code != 200:
+                    self.misses += 1
+                    await asyncio.sleep(self.interval)
+                    continue
+                text = response.text
+                for name, pattern in QUEUE_GAUGES.items():
+                    values = [float(value) for value in pattern.findall(text)]
+                    if values:
+                        self.peaks[name] = max(self.peaks.get(name, 0.0), sum(values))
+            except httpx.HTTPError:
+                self.misses += 1
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self) -> "QueueSampler":
+        self._task = asyncio.create_task(self._poll())
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._task.cancel()
+
+def percentiles(values: List[float], scale: float = 1000) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+    pick = lambda q: round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * scale, 2)
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(ordered[-1] * scale, 2)}
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, Any]:
+    """
+    Throughput, latency percentiles (ms), errors by kind and per-stage percentiles
+    """
+    outcomes: Dict[str, int] = {}
+    for sample in samples:
+        outcomes[sample.outcome] = outcomes.get(sample.outcome, 0) + 1
+    ok = [sample for sample in samples if sample.outcome == "ok"]
+
+    stages: Dict[str, List[float]] = {}
+    outside = []
+    for sample in ok:
+        for name, value in sample.timings.items():
+            if name != "total_ms":
+                stages.setdefault(name[:-3], []).append(value / 1000)
+        if "total_ms" in sample.timings:
+            outside.append(max(sample.latency - sample.timings["total_ms"] / 1000, 0.0))
+
+    summary = {
+        "requests": len(samples),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(1 - len(ok) / len(samples), 4) if samples else 0.0,
+        "outcomes": outcomes,
+        "latency_ms": percentiles([sample.latency for sample in ok]),
+        "outside_pipeline_ms": percentiles(outside),
+        "stages_ms": {
+            name: {key: value for key, value in percentiles(values).items() if key in ("p50", "p95")}
+            for name, values in sorted(stages.items())
+        }
+    }
+    first_tokens = [sample.first_token for sample in ok if sample.first_token is not None]
+    if first_tokens:
+        summary["first_token_ms"] = percentiles(first_tokens)
+    return summary
+
+def print_step(label: str, summary: Dict[str, Any]) -> None:
+    latency = summary["latency_ms"]
+    errors = {name: count for name, count in summary["outcomes"].items() if name != "ok"}
+    print(
+        f"{label:>14} | {summary['requests']:>6} req | {summary['throughput_rps']:>8.2f} req/s | "
+        f"p50 {latency['p50'] or 0:>9.1f} p95 {latency['p95'] or 0:>9.1f} p99 {latency['p99'] or 0:>9.1f} ms | "
+        f"errors {summary['error_rate']:.1%} {errors if errors else ''}"
+    )
+    slowest = sorted(summary["stages_ms"].items(), key=lambda item: item[1]["p95"] or 0, reverse=True)[:4]
+    if slowest:
+        print(" " * 17 + "stages p95: " + ", ".join(f"{name} {values['p95']:.1f}" for name, values in slowest)
+              + f" | outside pipeline p95 {summary['outside_pipeline_ms']['p95'] or 0:.1f}")
+    if summary.get("first_token_ms"):
+        print(" " * 17 + f"first token p50 {summary['first_token_ms']['p50']:.1f} p95 {summary['first_token_ms']['p95']:.1f}")
+    if summary.get("queue_peaks"):
+        print(" " * 17 + "queue peaks: " + ", ".join(f"{name} {value:g}" for name, value in summary["queue_peaks"].items()))
+
+def serve(port: int, llm_latency: float, llm_jitter: float, limit_concurrency: Optional[int],
+          workers: int, log_path: Optional[str] = None) -> subprocess.Popen:
+    """
+    Starts the API with the fake LLM and waits until it answers /ping; its output
+    goes to log_path, or nowhere
+    """
+    env = dict(os.environ, LLM_PROVIDER="fake",
+               LLM_FAKE_LATENCY=str(llm_latency), LLM_FAKE_LATENCY_JITTER=str(llm_jitter))
+    command = [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning",
+               "--timeout-keep-alive", "300", "--workers", str(workers)]
+    if limit_concurrency:
+        command += ["--limit-concurrency", str(limit_concurrency)]
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The API exited with status {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ping", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("The API did not start within 60s")
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    entries = load_log(args.log) if args.log else synthetic_log(args.synthetic, args.casual_ratio, args.seed)
+    if not entries:
+        raise ValueError("No questions to send")
+    questions = [entry["query"] for entry in entries]
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    steps = []
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        if args.warmup:
+            await ramp_step(client, args.endpoint, questions, 1, args.warmup)
+
+        if args.mode == "replay":
+            with QueueSampler(client) as sampler:
+                started = time.perf_counter()
+                samples, peak = await replay(client, args.endpoint, entries, args.speed, args.rate)
+                summary = summarize(samples, time.perf_counter() - started)
+            summary.update({"mode": "replay", "speed": args.speed, "peak_in_flight": peak,
+                            "queue_peaks": sampler.peaks,
+                            "metrics_misses": sampler.misses})
+            print_step("replay", summary)
+            steps.append(summary)
+        else:
+            for concurrency in args.concurrency:
+                with QueueSampler(client) as sampler:
+                    started = time.perf_counter()
+                    samples = await ramp_step(client, args.endpoint, questions, concurrency, args.duration)
+                    summary = summarize(samples, time.perf_counter() - started)
+                summary.update({"mode": "ramp", "concurrency": concurrency, "queue_peaks": sampler.peaks,
+                                "metrics_misses": sampler.misses})
+                print_step(f"{concurrency} users", summary)
+                steps.append(summary)
+
+    return {
+        "meta": {
+            "url": args.url,
+            "endpoint": args.endpoint,
+            "mode": args.mode,
+            "questions": len(entries),
+            "served": args.serve,
+            "llm_latency_s": args.llm_latency if args.serve else None,
+            "llm_jitter_s": args.llm_jitter if args.serve else None,
+            "limit_concurrency": args.limit_concurrency if args.serve else None,
+            "workers": args.workers if args.serve else None,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "steps": steps
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=list(ENDPOINTS), default="query")
+    parser.add_argument("--mode", choices=["ramp", "replay"], default="ramp")
+    parser.add_argument("--log", help="Question log: one question per line, or JSONL with query and offset")
+    parser.add_argument("--synthetic", type=int, default=200, help="Questions generated when no log is given")
+    parser.add_argument("--casual-ratio", type=float, default=0.2, help="Share of casual synthetic questions")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 5, 10, 20, 40],
+                        help="Concurrent users of each ramp step")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per ramp step")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed-up of the recorded offsets")
+    parser.add_argument("--rate", type=float, default=5.0, help="Requests per second of log entries without offsets")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds of single-user traffic before measuring")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds before a request counts as a timeout")
+    parser.add_argument("--serve", action="store_true", help="Start the API with the fake LLM for the test")
+    parser.add_argument("--port", type=int, default=8765, help="Port of the API started by --serve")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per fake LLM call (--serve)")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="Random extra seconds per fake LLM call (--serve)")
+    parser.add_argument("--limit-concurrency", type=int, default=20,
+                        help="uvicorn limit_concurrency of the API started by --serve, 0 for none")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes (--serve)")
+    parser.add_argument("--server-log", help="File receiving the output of the API started by --serve")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    server = None
+    if args.serve:
+        args.url = f"http://127.0.0.1:{args.port}"
+        server = serve(args.port, args.llm_latency, args.llm_jitter, args.limit_concurrency, args.workers,
+                       args.server_log)
+    try:
+        report = asyncio.run(run(args))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=4)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
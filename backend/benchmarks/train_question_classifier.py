@@ -0,0 +1,94 @@
+"""
+Trains the local question classifier on a labelled question file and reports its
+held-out accuracy, the share of questions that would still go to the LLM at a given
+confidence threshold, and the per-question latency.
+
+The file holds one JSON object per line: {"question": "...", "label": "sql_request"}
+or {"question": "...", "label": "casual_interaction"}. The bundled seed dataset is
+natural_query/core/data/classifier_questions.jsonl.
+
+Usage (from backend/):
+    python -m benchmarks.train_question_classifier --output classifier.npz
+    python -m benchmarks.train_question_classifier --data questions.jsonl --folds 5 --threshold 0.9
+"""
+from natural_query.core.question_classifier import (
+    DEFAULT_DATASET, SQL_REQUEST, QuestionClassifier, load_dataset
+)
+from typing import Dict, Any, List
+import numpy as np
+import statistics
+import argparse
+import json
+import time
+
+def evaluate(classifier: QuestionClassifier, questions: List[str], labels: List[str],
+             threshold: float) -> Dict[str, Any]:
+    correct = confident = confident_correct = 0
+    true_positive = false_positive = false_negative = 0
+    timings = []
+    for question, label in zip(questions, labels):
+        started = time.perf_counter()
+        result = classifier.classify(question)
+        timings.append(time.perf_counter() - started)
+
+        correct += result.label == label
+        if result.confidence >= threshold:
+            confident += 1
+            confident_correct += result.label == label
+        true_positive += result.label == SQL_REQUEST and label == SQL_REQUEST
+        false_positive += result.label == SQL_REQUEST and label != SQL_REQUEST
+        false_negative += result.label != SQL_REQUEST and label == SQL_REQUEST
+
+    total = len(questions)
+    return {
+        "questions": total,
+        "accuracy": correct / total,
+        "sql_precision": true_positive / ((true_positive + false_positive) or 1),
+        "sql_recall": true_positive / ((true_positive + false_negative) or 1),
+        "local_rate": confident / total,
+        "local_accuracy": confident_correct / (confident or 1),
+        "median_ms": statistics.median(timings) * 1000,
+        "p99_ms": sorted(timings)[int(0.99 * (total - 1))] * 1000
+    }
+
+def cross_validate(questions: List[str], labels: List[str], folds: int, threshold: float,
+                   epochs: int, seed: int) -> List[Dict[str, Any]]:
+    order = np.random.default_rng(seed).permutation(len(questions))
+    reports = []
+    for fold in range(folds):
+        held_out = set(order[fold::folds].tolist())
+        train = [i for i in range(len(questions)) if i not in held_out]
+        test = sorted(held_out)
+        classifier = QuestionClassifier().fit(
+            [questions[i] for i in train], [labels[i] for i in train], epochs=epochs, seed=seed
+        )
+        reports.append(evaluate(classifier, [questions[i] for i in test], [labels[i] for i in test], threshold))
+    return reports
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=DEFAULT_DATASET, help="Labelled question file (JSON lines)")
+    parser.add_argument("--folds", type=int, default=5, help="Cross-validation folds for the evaluation")
+    parser.add_argument("--threshold", type=float, default=0.85, help="Confidence below which the LLM decides")
+    parser.add_argument("--epochs", type=int, default=60, help="Training epochs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Train on the whole file and save the model here (.npz)")
+    parser.add_argument("--report", help="Write the evaluation as JSON to this file")
+    args = parser.parse_args()
+
+    questions, labels = load_dataset(args.data)
+    print(f"{len(questions)} questions, {labels.count(SQL_REQUEST)} sql_request")
+
+    reports = cross_validate(questions, labels, args.folds, args.threshold, args.epochs, args.seed)
+    summary = {key: statistics.mean(report[key] for report in reports) for key in reports[0] if key != "questions"}
+    for key, value in summary.items():
+        print(f"{key:>15} | {value:.4f}")
+
+    if args.output:
+        started = time.perf_counter()
+        QuestionClassifier().fit(questions, labels, epochs=args.epochs, seed=args.seed).save(args.output)
+        print(f"Model trained in {time.perf_counter() - started:.2f}s and saved to {args.output}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"folds": reports, "mean": summary}, f, indent=4)
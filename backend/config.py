@@ -1,6 +1,7 @@
 from os import getenv
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
+from typing import Optional
 import re
 
 load_dotenv()
@@ -38,30 +39,108 @@ class GlobalConfig(BaseSettings):
     
     API_V_STR: str = f"/api/{V_STR}"
     
-    LLM_MODEL_ID: str = getenv("LLM_MODEL_ID")
+    # "watsonx", or "fake" for the deterministic offline model (benchmarks, load tests)
+    LLM_PROVIDER: str = getenv("LLM_PROVIDER", "watsonx")
+    LLM_FAKE_LATENCY: float = float(getenv("LLM_FAKE_LATENCY", 0))
+    LLM_FAKE_LATENCY_JITTER: float = float(getenv("LLM_FAKE_LATENCY_JITTER", 0))
+    LLM_MODEL_ID: str = getenv("LLM_MODEL_ID", "fake" if LLM_PROVIDER == "fake" else None)
     OLLAMA_MODEL_ID: str = "granite3.1-dense:8b"
     LLM_TEMPERATURE: float = float(getenv("LLM_TEMPERATURE", 0))
     LLM_MAX_TOKENS: int = int(getenv("LLM_MAX_TOKENS", 1280))
-    PROJECT_ID: str = getenv("PROJECT_ID",)
-    LLM_URL: str = getenv("LLM_URL",)
-    if not LLM_URL:
+    LLM_IAM_URL: str = getenv("LLM_IAM_URL", "https://iam.cloud.ibm.com/identity/token")
+    LLM_TOKEN_REFRESH_MARGIN: float = float(getenv("LLM_TOKEN_REFRESH_MARGIN", 300))
+    LLM_MAX_CONCURRENCY: int = int(getenv("LLM_MAX_CONCURRENCY", 8))
+    LLM_RATE_LIMIT: float = float(getenv("LLM_RATE_LIMIT", 0))
+    LLM_RATE_BURST: int = int(getenv("LLM_RATE_BURST", 5))
+    LLM_MAX_QUEUE: int = int(getenv("LLM_MAX_QUEUE", 100))
+    LLM_QUEUE_TIMEOUT: float = float(getenv("LLM_QUEUE_TIMEOUT", 30))
+    LLM_COALESCE_ENABLED: bool = getenv("LLM_COALESCE_ENABLED", "true").lower() == "true"
+    PROJECT_ID: Optional[str] = getenv("PROJECT_ID",)
+    LLM_URL: Optional[str] = getenv("LLM_URL",)
+    if LLM_PROVIDER not in ("watsonx", "fake"):
+        raise ValueError("LLM_PROVIDER must be watsonx or fake")
+    # The fake provider runs offline: no watsonx settings needed
+    if LLM_PROVIDER == "watsonx" and not LLM_URL:
         raise ValueError("LLM_URL must be set")
-    if not PROJECT_ID:
+    if LLM_PROVIDER == "watsonx" and not PROJECT_ID:
         raise ValueError("PROJECT_ID must be set")
     if not LLM_MODEL_ID:
         raise ValueError("LLM_MODEL_ID must be set")
     
     REDIS_URI: str = getenv("REDIS_URI")
+    CONVERSATION_TTL: int = int(getenv("CONVERSATION_TTL", 24 * 60 * 60))
+    CONVERSATION_MAX_MESSAGES: int = int(getenv("CONVERSATION_MAX_MESSAGES", 200))
+    SCHEMA_EXTRACTOR: str = getenv("SCHEMA_EXTRACTOR", "catalog")
+    SCHEMA_CACHE_SCHEMAS: str = getenv("SCHEMA_CACHE_SCHEMAS", "public")
+    SCHEMA_CACHE_REFRESH_INTERVAL: float = float(getenv("SCHEMA_CACHE_REFRESH_INTERVAL", 60))
+    SCHEMA_CACHE_REDIS: bool = getenv("SCHEMA_CACHE_REDIS", "false").lower() == "true"
+    SQL_CACHE_ENABLED: bool = getenv("SQL_CACHE_ENABLED", "true").lower() == "true"
+    SQL_CACHE_TTL: int = int(getenv("SQL_CACHE_TTL", 24 * 60 * 60))
+    SQL_CACHE_MAX_ENTRIES: int = int(getenv("SQL_CACHE_MAX_ENTRIES", 10000))
+    RESULT_CACHE_ENABLED: bool = getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_TTL: int = int(getenv("RESULT_CACHE_TTL", 300))
+    RESULT_CACHE_TABLE_TTLS: str = getenv("RESULT_CACHE_TABLE_TTLS", "")
+    RESULT_CACHE_MAX_ENTRY_BYTES: int = int(getenv("RESULT_CACHE_MAX_ENTRY_BYTES", 1024 * 1024))
+    RESULT_CACHE_MAX_BYTES: int = int(getenv("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    SCHEMA_PROMPT_FORMAT: str = getenv("SCHEMA_PROMPT_FORMAT", "ddl")
+    SCHEMA_TOP_K: int = int(getenv("SCHEMA_TOP_K", 8))
+    SCHEMA_TOKEN_BUDGET: int = int(getenv("SCHEMA_TOKEN_BUDGET", 3000))
+    SCHEMA_FULL_MAX_TABLES: int = int(getenv("SCHEMA_FULL_MAX_TABLES", 15))
+    QUESTION_CLASSIFIER_ENABLED: bool = getenv("QUESTION_CLASSIFIER_ENABLED", "true").lower() == "true"
+    QUESTION_CLASSIFIER_MODEL_PATH: str = getenv("QUESTION_CLASSIFIER_MODEL_PATH", "")
+    QUESTION_CLASSIFIER_THRESHOLD: float = float(getenv("QUESTION_CLASSIFIER_THRESHOLD", 0.85))
+    RESULT_SUMMARY_ENABLED: bool = getenv("RESULT_SUMMARY_ENABLED", "true").lower() == "true"
+    RESULT_PROMPT_TOKEN_BUDGET: int = int(getenv("RESULT_PROMPT_TOKEN_BUDGET", 2000))
+    RESULT_SAMPLE_ROWS: int = int(getenv("RESULT_SAMPLE_ROWS", 20))
+    RESULT_TOP_K: int = int(getenv("RESULT_TOP_K", 5))
+    SPECULATIVE_SQL_ENABLED: bool = getenv("SPECULATIVE_SQL_ENABLED", "true").lower() == "true"
+    SPECULATIVE_SQL_WORKERS: int = int(getenv("SPECULATIVE_SQL_WORKERS", 8))
+    BATCH_MAX_QUESTIONS: int = int(getenv("BATCH_MAX_QUESTIONS", 100))
+    BATCH_CONCURRENCY: int = int(getenv("BATCH_CONCURRENCY", 8))
+    BATCH_STAGE_LIMITS: str = getenv(
+        "BATCH_STAGE_LIMITS", "classify_llm=4,sql_generation=4,query=8,insight=4,answer=4"
+    )
+    JOB_WORKERS: int = int(getenv("JOB_WORKERS", 4))
+    JOB_TTL: int = int(getenv("JOB_TTL", 24 * 60 * 60))
+    JOB_MAX_QUEUED: int = int(getenv("JOB_MAX_QUEUED", 100))
+    METRICS_ENABLED: bool = getenv("METRICS_ENABLED", "true").lower() == "true"
+    RESPONSE_TIMINGS: bool = getenv("RESPONSE_TIMINGS", "true").lower() == "true"
+    METRICS_SHARED: bool = getenv("METRICS_SHARED", "true").lower() == "true"
+    METRICS_INSTANCE: str = getenv("METRICS_INSTANCE", "")
+    METRICS_PUBLISH_INTERVAL: float = float(getenv("METRICS_PUBLISH_INTERVAL", 5))
+    SERVER_HOST: str = getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT: int = int(getenv("SERVER_PORT", 8000))
+    SERVER_WORKERS: int = int(getenv("SERVER_WORKERS", 0))
+    SERVER_LIMIT_CONCURRENCY: int = int(getenv("SERVER_LIMIT_CONCURRENCY", 100))
+    SERVER_MAX_REQUESTS: int = int(getenv("SERVER_MAX_REQUESTS", 0))
+    SERVER_KEEP_ALIVE: int = int(getenv("SERVER_KEEP_ALIVE", 300))
+    SERVER_GRACEFUL_TIMEOUT: int = int(getenv("SERVER_GRACEFUL_TIMEOUT", 30))
     DB_USER: str = getenv("DB_USER", "postgres")
     DB_PASSWORD: str = getenv("DB_PASSWORD", "postgres")
     DB_HOST: str = getenv("DB_HOST", "localhost")
     DB_PORT: int = int(getenv("DB_PORT", 5432))
     DB_NAME: str = getenv("DB_NAME", "postgres")
+    DB_REPLICAS: str = getenv("DB_REPLICAS", "")
+    DB_REPLICA_MAX_LAG: float = float(getenv("DB_REPLICA_MAX_LAG", 30))
+    DB_REPLICA_HEALTH_CHECK_INTERVAL: float = float(getenv("DB_REPLICA_HEALTH_CHECK_INTERVAL", 10))
+    DB_POOL_MIN_SIZE: int = int(getenv("DB_POOL_MIN_SIZE", 1))
+    DB_POOL_MAX_SIZE: int = int(getenv("DB_POOL_MAX_SIZE", 10))
+    DB_POOL_ACQUIRE_TIMEOUT: float = float(getenv("DB_POOL_ACQUIRE_TIMEOUT", 30))
+    DB_POOL_MAX_LIFETIME: float = float(getenv("DB_POOL_MAX_LIFETIME", 1800))
+    DB_POOL_HEALTH_CHECK_INTERVAL: float = float(getenv("DB_POOL_HEALTH_CHECK_INTERVAL", 30))
+    QUERY_FETCH_SIZE: int = int(getenv("QUERY_FETCH_SIZE", 2000))
+    QUERY_MAX_ROWS: int = int(getenv("QUERY_MAX_ROWS", 10000))
+    QUERY_MAX_BYTES: int = int(getenv("QUERY_MAX_BYTES", 2 * 1024 * 1024))
+    QUERY_STATEMENT_TIMEOUT_MS: int = int(getenv("QUERY_STATEMENT_TIMEOUT_MS", 30000))
+    QUERY_GUARD_ENABLED: bool = getenv("QUERY_GUARD_ENABLED", "true").lower() == "true"
+    QUERY_GUARD_MAX_COST: float = float(getenv("QUERY_GUARD_MAX_COST", 1e7))
+    QUERY_GUARD_MAX_ROWS: int = int(getenv("QUERY_GUARD_MAX_ROWS", 10000))
+    QUERY_VALIDATE_SCHEMA: bool = getenv("QUERY_VALIDATE_SCHEMA", "true").lower() == "true"
     
     
-    WATSONX_API_KEY: str = getenv('WATSONX_API_KEY')
+    WATSONX_API_KEY: Optional[str] = getenv('WATSONX_API_KEY')
     
-    if not WATSONX_API_KEY:
+    if LLM_PROVIDER == "watsonx" and not WATSONX_API_KEY:
         raise ValueError("WATSONX_API_KEY must be set")
     
     FRONTEND_URL: str = getenv("FRONTEND_URL", "http://localhost:3000")
@@ -0,0 +1,265 @@
+from ..services.async_pg_service import AsyncPostgresDB, get_async_db
+from ..services.pg_service import PostgresDB, get_db
+from typing import Dict, List, Optional, Sequence
+import json
+
+COLUMNS_QUERY = """
+    SELECT
+        n.nspname,
+        c.relname,
+        a.attname,
+        format_type(a.atttypid, NULL) AS data_type,
+        a.attnotnull,
+        pg_get_expr(ad.adbin, ad.adrelid) AS column_default,
+        CASE
+            WHEN a.atttypid IN ('bpchar'::regtype, 'varchar'::regtype) AND a.atttypmod > 0
+            THEN a.atttypmod - 4
+        END AS max_length,
+        cd.description AS column_comment,
+        td.description AS table_comment
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    LEFT JOIN pg_attrdef ad ON ad.adrelid = c.oid AND ad.adnum = a.attnum
+    LEFT JOIN pg_description cd
+        ON cd.objoid = c.oid AND cd.classoid = 'pg_class'::regclass AND cd.objsubid = a.attnum
+    LEFT JOIN pg_description td
+        ON td.objoid = c.oid AND td.classoid = 'pg_class'::regclass AND td.objsubid = 0
+    WHERE n.nspname = ANY(%(schemas)s)
+        AND c.relkind IN ('r', 'p')
+        AND NOT c.relispartition
+    ORDER BY n.nspname, c.relname, a.attnum;
+"""
+
+KEYS_QUERY = """
+    SELECT
+        n.nspname,
+        c.relname,
+        con.contype::text AS kind,
+        con.conname AS name,
+        ARRAY(
+            SELECT a.attname
+            FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+            JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+            ORDER BY k.ord
+        ) AS columns,
+        fn.nspname AS foreign_schema,
+        fc.relname AS foreign_table,
+        ARRAY(
+            SELECT a.attname
+            FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+            JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+            ORDER BY k.ord
+        ) AS foreign_columns,
+        NULL::boolean AS is_unique
+    FROM pg_constraint con
+    JOIN pg_class c ON c.oid = con.conrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_class fc ON fc.oid = con.confrelid
+    LEFT JOIN pg_namespace fn ON fn.oid = fc.relnamespace
+    WHERE n.nspname = ANY(%(schemas)s)
+        AND con.contype IN ('p', 'u', 'f')
+    UNION ALL
+    SELECT
+        n.nspname,
+        c.relname,
+        'i',
+        ic.relname,
+        ARRAY(
+            SELECT pg_get_indexdef(i.indexrelid, k, true)
+            FROM generate_series(1, i.indnkeyatts) AS k
+            ORDER BY k
+        ),
+        NULL,
+        NULL,
+        NULL,
+        i.indisunique
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indrelid
+    JOIN pg_class ic ON ic.oid = i.indexrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = ANY(%(schemas)s)
+        AND c.relkind IN ('r', 'p')
+        AND NOT c.relispartition
+    ORDER BY 1, 2, 3, 4;
+"""
+
+CONSTRAINT_NAMES = {
+    'p': 'PRIMARY KEY',
+    'u': 'UNIQUE',
+    'f': 'FOREIGN KEY'
+}
+
+class CatalogSchemaExtractor:
+    """
+    Extracts database schema information straight from pg_catalog (pg_class, pg_attribute,
+    pg_constraint, pg_index) with two set-based queries, for any number of schemas at once.
+
+    Output per table matches SchemaExtractor.get_schema, plus "primary_key", "indexes"
+    and table/column comments.
+    """
+
+    def __init__(self, db: Optional[PostgresDB] = None):
+        """
+        Initializes the CatalogSchemaExtractor instance.
+
+        Args:
+            db: Database to read the catalog from (default is the shared application pool).
+        """
+
+        self._db = db
+
+    @property
+    def db(self) -> PostgresDB:
+        return self._db or get_db()
+
+    def get_schemas(self, schema_names: List[str]) -> Dict[str, Dict]:
+        """
+        Extracts several schemas in a single pass over the catalog.
+
+        Args:
+            schema_names: The schemas to extract.
+
+        Returns:
+            A dictionary mapping each schema name to its tables.
+
+        Raises:
+            Exception: If an error occurs during schema extraction.
+        """
+
+        try:
+            with self.db.get_cursor(cursor_factory=None) as cur:
+                cur.execute(COLUMNS_QUERY, {"schemas": list(schema_names)})
+                columns = cur.fetchall()
+
+                cur.execute(KEYS_QUERY, {"schemas": list(schema_names)})
+                keys = cur.fetchall()
+
+            return self._build(schema_names, columns, keys)
+
+        except Exception as e:
+            raise Exception(f"Schema extraction error: {e}")
+
+    async def aget_schemas(self, schema_names: List[str], db: Optional[AsyncPostgresDB] = None) -> Dict[str, Dict]:
+        """
+        Async variant of get_schemas running the same catalog queries through asyncpg.
+
+        Args:
+            schema_names: The schemas to extract.
+            db: Async database (default is the shared asyncpg pool).
+
+        Returns:
+            A dictionary mapping each schema name to its tables.
+        """
+
+        db = db or get_async_db()
+        try:
+            columns = await db.fetch(COLUMNS_QUERY.replace("%(schemas)s", "$1::text[]"), list(schema_names))
+            keys = await db.fetch(KEYS_QUERY.replace("%(schemas)s", "$1::text[]"), list(schema_names))
+            return self._build(schema_names, columns, keys)
+        except Exception as e:
+            raise Exception(f"Schema extraction error: {e}")
+
+    def _build(self, schema_names: List[str], columns: Sequence, keys: Sequence) -> Dict[str, Dict]:
+        schemas: Dict[str, Dict] = {name: {} for name in schema_names}
+
+        for row in columns:
+            schema_name, table_name, column_name, data_type, not_null, default, max_length, comment, table_comment = row
+
+            table = schemas[schema_name].get(table_name)
+            if table is None:
+                table = schemas[schema_name][table_name] = {
+                    "columns": {},
+                    "relationships": [],
+                    "primary_key": [],
+                    "indexes": []
+                }
+                if table_comment:
+                    table["comment"] = table_comment
+
+            column_def = {
+                "type": data_type,
+                "required": not_null,
+                "constraints": []
+            }
+
+            if default is not None:
+                column_def["default"] = default
+            if max_length is not None:
+                column_def["max_length"] = max_length
+            if comment:
+                column_def["comment"] = comment
+
+            table["columns"][column_name] = column_def
+
+        for row in keys:
+            schema_name, table_name, kind, name, key_columns, foreign_schema, foreign_table, foreign_columns, is_unique = row
+
+            table = schemas[schema_name].get(table_name)
+            if table is None:
+                continue
+
+            if kind == 'i':
+                table["indexes"].append({
+                    "name": name,
+                    "columns": key_columns,
+                    "unique": is_unique
+                })
+                continue
+
+            for column_name in key_columns:
+                constraints = table["columns"][column_name]["constraints"]
+                if CONSTRAINT_NAMES[kind] not in constraints:
+                    constraints.append(CONSTRAINT_NAMES[kind])
+
+            if kind == 'p':
+                table["primary_key"] = key_columns
+            elif kind == 'f':
+                target = foreign_table if foreign_schema == schema_name else f"{foreign_schema}.{foreign_table}"
+                for column_name, foreign_column in zip(key_columns, foreign_columns):
+                    table["relationships"].append({
+                        "from": column_name,
+                        "to": f"{target}.{foreign_column}"
+                    })
+
+        return schemas
+
+    def get_schema(self, schema_name: str = 'public') -> Dict:
+        """
+        Extracts a single schema, including tables, columns, keys, indexes and relationships.
+
+        Args:
+            schema_name: The name of the schema to extract (default is 'public').
+
+        Returns:
+            A dictionary containing the schema information.
+        """
+
+        return self.get_schemas([schema_name])[schema_name]
+
+    async def aget_schema(self, schema_name: str = 'public', db: Optional[AsyncPostgresDB] = None) -> Dict:
+        """
+        Async variant of get_schema.
+
+        Args:
+            schema_name: The name of the schema to extract (default is 'public').
+            db: Async database (default is the shared asyncpg pool).
+
+        Returns:
+            A dictionary containing the schema information.
+        """
+
+        return (await self.aget_schemas([schema_name], db))[schema_name]
+
+    def save_schema_to_file(self, output_file: str, schema_name: str = 'public'):
+        """
+        Extracts the schema and saves it to a JSON file.
+
+        Args:
+            output_file: The file path where the schema will be saved.
+            schema_name: The schema to extract (default is 'public').
+        """
+
+        schema = self.get_schema(schema_name)
+        with open(output_file, 'w') as f:
+            json.dump(schema, f, indent=4)
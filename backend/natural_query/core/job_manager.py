@@ -0,0 +1,338 @@
+from ..services.pg_service import PostgresDB, backend_observer
+from ..services.db_router import db_router
+from .llm_scheduler import BATCH, llm_priority
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Set, Tuple
+from config import global_settings
+import redis.asyncio as aioredis
+import threading
+import logging
+import redis
+import json
+import time
+import uuid
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOB_KEY_PREFIX = "job:"
+
+QUEUED = "queued"
+RUNNING = "running"
+CANCELLING = "cancelling"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL = (SUCCEEDED, FAILED, CANCELLED)
+
+# Only cancels the backend while it still runs this job's cursor: the connection
+# may already be back in the pool serving another query
+CANCEL_QUERY = """
+    SELECT pg_cancel_backend(pid) FROM pg_stat_activity
+    WHERE pid = %(pid)s AND state = 'active' AND position(%(marker)s in query) > 0
+"""
+
+class JobCancelledError(Exception):
+    """
+    Raised inside a job's pipeline when the job was cancelled.
+    """
+
+class JobQueueFullError(Exception):
+    """
+    Raised when a job is submitted while too many are already waiting.
+    """
+
+def _job_key(job_id: str) -> str:
+    return f"{JOB_KEY_PREFIX}{job_id}"
+
+def _events_channel(job_id: str) -> str:
+    return f"{JOB_KEY_PREFIX}{job_id}:events"
+
+def _decode(raw: Dict[bytes, bytes]) -> Optional[Dict[str, Any]]:
+    if not raw:
+        return None
+    job = {key.decode(): value.decode() for key, value in raw.items()}
+    for name in ("result", "error"):
+        if name in job:
+            job[name] = json.loads(job[name])
+    for name in ("submitted_at", "started_at", "finished_at"):
+        if name in job:
+            job[name] = float(job[name])
+    job["cancel_requested"] = job.get("cancel_requested") == "1"
+    # Where the job's SQL runs is bookkeeping for cancel, not part of the job
+    for name in ("backend_node", "backend_pid", "backend_marker"):
+        job.pop(name, None)
+    return job
+
+class JobManager:
+    """
+    Background execution of long-running questions: submit returns a job id at once,
+    a local worker pool runs the pipeline and the job's status and result live in a
+    Redis hash (with a TTL) that any API worker can poll, subscribe to or cancel.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[..., Dict[str, Any]],
+        redis_url: str = global_settings.REDIS_URI,
+        workers: int = 4,
+        ttl: int = 24 * 60 * 60,
+        max_queued: int = 100
+    ):
+        """
+        Args:
+            runner: Runs one question: runner(question, conversation_id, should_stop=...)
+                returns the {"status", "response"} dict of process_query
+            redis_url: Redis connection URL
+            workers: Jobs run at once by this process
+            ttl: Seconds a job is kept after its last update
+            max_queued: Jobs waiting for a worker before submit is refused
+        """
+        self.runner = runner
+        self.redis_client = redis.from_url(redis_url)
+        self.async_redis_client = aioredis.from_url(redis_url)
+        self.ttl = ttl
+        self.max_queued = max_queued
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job-worker")
+        self._lock = threading.Lock()
+        self._local_jobs: Set[str] = set()
+        self._counters = {"submitted": 0, "queued": 0, "running": 0, SUCCEEDED: 0, FAILED: 0, CANCELLED: 0}
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        key = _job_key(job_id)
+        pipe = self.redis_client.pipeline()
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, self.ttl)
+        if "status" in fields:
+            pipe.publish(_events_channel(job_id), fields["status"])
+        pipe.execute()
+
+    def _transition(self, job_id: str, expected: str, **fields: Any) -> bool:
+        # Compare-and-set on the status: the worker may finish the job concurrently
+        key = _job_key(job_id)
+        with self.redis_client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    if pipe.hget(key, "status") != expected.encode():
+                        return False
+                    pipe.multi()
+                    pipe.hset(key, mapping=fields)
+                    pipe.expire(key, self.ttl)
+                    pipe.publish(_events_channel(job_id), fields["status"])
+                    pipe.execute()
+                    return True
+                except redis.WatchError:
+                    continue
+
+    def submit(self, question: str, conversation_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Queues a question.
+
+        Args:
+            question: Natural language question
+            conversation_id: Optional conversation the answer is added to
+
+        Returns:
+            The new job
+
+        Raises:
+            JobQueueFullError: max_queued jobs are already waiting
+        """
+        with self._lock:
+            if self._counters["queued"] >= self.max_queued:
+                raise JobQueueFullError(f"{self._counters['queued']} jobs are already waiting")
+            self._counters["queued"] += 1
+            self._counters["submitted"] += 1
+            job_id = str(uuid.uuid4())
+            self._local_jobs.add(job_id)
+
+        try:
+            self._update(
+                job_id,
+                id=job_id,
+                status=QUEUED,
+                question=question,
+                conversation_id=conversation_id or "",
+                submitted_at=time.time()
+            )
+            self.executor.submit(self._run, job_id, question, conversation_id)
+        except Exception:
+            with self._lock:
+                self._counters["queued"] -= 1
+                self._local_jobs.discard(job_id)
+            raise
+        logger.info(f"Job {job_id} queued")
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Current state of a job, None when unknown or expired
+        """
+        return _decode(self.redis_client.hgetall(_job_key(job_id)))
+
+    async def aget(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Async variant of get.
+        """
+        return _decode(await self.async_redis_client.hgetall(_job_key(job_id)))
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        return self.redis_client.hget(_job_key(job_id), "cancel_requested") == b"1"
+
+    def _observe_backend(self, job_id: str) -> Callable[[PostgresDB, Optional[Tuple[int, str]]], None]:
+        def observe(db: PostgresDB, backend: Optional[Tuple[int, str]]) -> None:
+            if backend is None:
+                self.redis_client.hdel(_job_key(job_id), "backend_node", "backend_pid", "backend_marker")
+                return
+            # Called before the query executes: a cancel that arrived since the last
+            # checkpoint found no backend to cancel, so the query must not start
+            if self._cancel_requested(job_id):
+                raise JobCancelledError("Cancelled before the query started")
+            node = db_router.node_for(db)
+            if node is not None:
+                pid, marker = backend
+                self._update(job_id, backend_node=node.name, backend_pid=pid, backend_marker=marker)
+        return observe
+
+    def _run(self, job_id: str, question: str, conversation_id: Optional[str]) -> None:
+        with self._lock:
+            self._counters["queued"] -= 1
+            self._counters["running"] += 1
+        status, fields = FAILED, {}
+        try:
+            if self._cancel_requested(job_id):
+                status = CANCELLED
+                return
+            self._update(job_id, status=RUNNING, started_at=time.time(), worker=threading.current_thread().name)
+            if self._cancel_requested(job_id):
+                status = CANCELLED
+                return
+
+            # Background work: its LLM calls queue behind interactive requests
+            token = backend_observer.set(self._observe_backend(job_id))
+            priority_token = llm_priority.set(BATCH)
+            try:
+                result = self.runner(
+                    question, conversation_id or None,
+                    should_stop=lambda: self._cancel_requested(job_id)
+                )
+            finally:
+                llm_priority.reset(priority_token)
+                backend_observer.reset(token)
+
+            if self._cancel_requested(job_id):
+                status = CANCELLED
+            elif result.get("status") == "success":
+                status, fields = SUCCEEDED, {"result": json.dumps(result["response"], default=str)}
+            else:
+                fields = {"error": json.dumps(result.get("response", {}), default=str)}
+        except JobCancelledError:
+            status = CANCELLED
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            fields = {"error": json.dumps({"message": str(e)})}
+        finally:
+            with self._lock:
+                self._counters["running"] -= 1
+                self._counters[status] += 1
+                self._local_jobs.discard(job_id)
+            try:
+                self._update(job_id, status=status, finished_at=time.time(), **fields)
+            except Exception as e:
+                logger.error(f"Could not record the outcome of job {job_id}: {e}")
+            logger.info(f"Job {job_id} {status}")
+
+    def _cancel_backend(self, node_name: str, pid: int, marker: str) -> bool:
+        node = db_router.node(node_name)
+        if node is None:
+            return False
+        try:
+            with node.db.get_cursor(cursor_factory=None) as cursor:
+                cursor.execute(CANCEL_QUERY, {"pid": int(pid), "marker": marker})
+                row = cursor.fetchone()
+            cancelled = bool(row and row[0])
+        except Exception as e:
+            logger.error(f"Could not cancel backend {pid} on {node_name}: {e}")
+            return False
+        if cancelled:
+            logger.info(f"Cancelled backend {pid} on {node_name}")
+        return cancelled
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancels a job: a queued job never starts, a running one stops at its next stage
+        and the SQL it is executing, if any, is cancelled on the database.
+
+        Args:
+            job_id: Job to cancel
+
+        Returns:
+            The job's state after the request, None when unknown or expired
+        """
+        key = _job_key(job_id)
+        if not self.redis_client.exists(key):
+            return None
+        # The flag goes first: a worker picking the job up afterwards sees it
+        pipe = self.redis_client.pipeline()
+        pipe.hset(key, "cancel_requested", "1")
+        pipe.hget(key, "status")
+        pipe.hmget(key, "backend_node", "backend_pid", "backend_marker")
+        _, status, backend = pipe.execute()
+
+        status = status.decode()
+        if status == QUEUED:
+            self._transition(job_id, QUEUED, status=CANCELLED, finished_at=time.time())
+        elif status == RUNNING and self._transition(job_id, RUNNING, status=CANCELLING):
+            if all(backend):
+                node_name, pid, marker = (value.decode() for value in backend)
+                self._cancel_backend(node_name, int(pid), marker)
+        return self.get(job_id)
+
+    async def aevents(self, job_id: str, poll_interval: float = 15.0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields the job's state on every status change until it finishes.
+
+        Args:
+            job_id: Job to follow
+            poll_interval: Seconds between re-reads when no notification arrives
+        """
+        pubsub = self.async_redis_client.pubsub()
+        await pubsub.subscribe(_events_channel(job_id))
+        try:
+            # Read after subscribing so a change in between is not missed
+            last_status = None
+            while True:
+                job = await self.aget(job_id)
+                if job is None:
+                    return
+                if job["status"] != last_status:
+                    last_status = job["status"]
+                    yield job
+                if last_status in TERMINAL:
+                    return
+                await pubsub.get_message(ignore_subscribe_messages=True, timeout=poll_interval)
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Job counters of this process
+        """
+        with self._lock:
+            return dict(self._counters)
+
+    def shutdown(self, wait: bool = False) -> None:
+        """
+        Stops the worker pool. Jobs still queued here are cancelled and running ones
+        are asked to stop.
+        """
+        with self._lock:
+            jobs = list(self._local_jobs)
+        for job_id in jobs:
+            try:
+                self.cancel(job_id)
+            except Exception as e:
+                logger.error(f"Could not cancel job {job_id} on shutdown: {e}")
+        self.executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,382 @@
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar
+from collections import deque
+import threading
+import logging
+import asyncio
+import heapq
+import itertools
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = {INTERACTIVE: 0, BATCH: 1}
+
+# Priority of the LLM calls made in the current context; batch and background
+# work set BATCH so interactive requests are served first
+llm_priority: ContextVar[str] = ContextVar("llm_priority", default=INTERACTIVE)
+
+WAIT_WINDOW = 512
+
+class LLMOverloadedError(Exception):
+    """
+    Raised instead of queueing an LLM call when the provider's queue is full or
+    the call waited longer than the queue timeout.
+    """
+
+class _Waiter:
+    __slots__ = ("priority", "event", "loop", "future", "granted", "abandoned", "delay")
+
+    def __init__(self, priority: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+        self.granted = False
+        self.abandoned = False
+        self.delay = 0.0
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+class LLMScheduler:
+    """
+    Admission for the calls to one LLM provider: at most max_concurrency calls run
+    at once and, with a rate, starts are spaced by a token bucket. Waiting calls are
+    served by priority (interactive before batch), then in arrival order; a full
+    queue or a wait beyond queue_timeout raises LLMOverloadedError. Threads and
+    coroutines share the same queue.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 8,
+        rate: float = 0.0,
+        burst: int = 5,
+        max_queue: int = 100,
+        queue_timeout: float = 30.0
+    ):
+        """
+        Args:
+            name: Provider name in logs and metrics
+            max_concurrency: Calls running at once
+            rate: Calls started per second, 0 for no limit
+            burst: Calls that may start at once after an idle period when rate limited
+            max_queue: Calls waiting before new ones are rejected
+            queue_timeout: Seconds a call may wait before it is rejected
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[int, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._queued = 0
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+
+        self.calls = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._waits: Dict[str, Deque[float]] = {name: deque(maxlen=WAIT_WINDOW) for name in PRIORITIES}
+        self._waited: Dict[str, int] = {name: 0 for name in PRIORITIES}
+
+    def _reserve_start(self) -> float:
+        # Seconds the granted call must wait for its rate token; the bucket may go
+        # negative, which queues later calls behind this reservation
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        self._tokens -= 1
+        return max(-self._tokens / self.rate, 0.0)
+
+    def _grant(self, waiter: _Waiter) -> None:
+        self._active += 1
+        waiter.granted = True
+        waiter.delay = self._reserve_start()
+
+    def _enqueue(self, priority: str, loop: Optional[asyncio.AbstractEventLoop] = None) -> _Waiter:
+        waiter = _Waiter(priority, loop)
+        with self._lock:
+            self.calls += 1
+            if self._active < self.max_concurrency and not self._queued:
+                self._grant(waiter)
+                return waiter
+            if self._queued >= self.max_queue:
+                self.rejected += 1
+                raise LLMOverloadedError(
+                    f"LLM provider {self.name} is overloaded: {self._queued} calls already waiting"
+                )
+            self._queued += 1
+            heapq.heappush(self._heap, (PRIORITIES[priority], next(self._sequence), waiter))
+        return waiter
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        # True when the waiter gave up before being granted; granted waiters own a slot
+        with self._lock:
+            if waiter.granted:
+                return False
+            waiter.abandoned = True
+            self._queued -= 1
+            self.timeouts += 1
+        return True
+
+    def _timeout_error(self) -> LLMOverloadedError:
+        return LLMOverloadedError(
+            f"LLM provider {self.name} is overloaded: no capacity within {self.queue_timeout:.0f}s"
+        )
+
+    def _record_wait(self, priority: str, started: float) -> None:
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._waits[priority].append(waited * 1000)
+            self._waited[priority] += 1
+
+    def release(self) -> None:
+        """
+        Frees a slot and hands it to the most urgent waiting call
+        """
+        with self._lock:
+            self._active -= 1
+            while self._heap and self._active < self.max_concurrency:
+                _, _, waiter = heapq.heappop(self._heap)
+                if waiter.abandoned:
+                    continue
+                self._queued -= 1
+                self._grant(waiter)
+                waiter.wake()
+
+    def acquire(self, priority: Optional[str] = None) -> None:
+        """
+        Waits for a slot (and a rate token) on the calling thread.
+
+        Raises:
+            LLMOverloadedError: The queue is full or the wait exceeded the queue timeout
+        """
+        priority = priority or llm_priority.get()
+        started = time.perf_counter()
+        waiter = self._enqueue(priority)
+        if not waiter.granted and not waiter.event.wait(self.queue_timeout) and self._abandon(waiter):
+            raise self._timeout_error()
+        if waiter.delay:
+            time.sleep(waiter.delay)
+        self._record_wait(priority, started)
+
+    async def aacquire(self, priority: Optional[str] = None) -> None:
+        """
+        Async variant of acquire.
+        """
+        priority = priority or llm_priority.get()
+        started = time.perf_counter()
+        waiter = self._enqueue(priority, asyncio.get_running_loop())
+        if not waiter.granted:
+            try:
+                await asyncio.wait_for(waiter.future, self.queue_timeout)
+            except asyncio.TimeoutError:
+                if self._abandon(waiter):
+                    raise self._timeout_error()
+            except BaseException:
+                # Cancelled while waiting: give the slot back if it was granted meanwhile
+                if not self._abandon(waiter):
+                    self.release()
+                raise
+        try:
+            if waiter.delay:
+                await asyncio.sleep(waiter.delay)
+        except BaseException:
+            self.release()
+            raise
+        self._record_wait(priority, started)
+
+    @contextmanager
+    def slot(self, priority: Optional[str] = None) -> Iterator[None]:
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, priority: Optional[str] = None) -> AsyncIterator[None]:
+        await self.aacquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = {}
+            for priority, window in self._waits.items():
+                ordered = sorted(window)
+                waits[priority] = {
+                    "count": self._waited[priority],
+                    "p50_ms": round(ordered[len(ordered) // 2], 2) if ordered else None,
+                    "p95_ms": round(ordered[int(len(ordered) * 0.95)], 2) if ordered else None,
+                    "max_ms": round(ordered[-1], 2) if ordered else None
+                }
+            queued = {name: 0 for name in PRIORITIES}
+            for _, _, waiter in self._heap:
+                if not waiter.abandoned:
+                    queued[waiter.priority] += 1
+            return {
+                "active": self._active,
+                "queued": queued,
+                "max_concurrency": self.max_concurrency,
+                "rate": self.rate,
+                "calls": self.calls,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "queue_wait": waits
+            }
+
+class _LeaderInterrupted(Exception):
+    """
+    The caller running a coalesced call went away before it finished: the
+    callers waiting on it start the call again.
+    """
+
+class _Flight:
+    """
+    One call in flight: its outcome, the callers still waiting for it (the
+    leader included) and, for async leaders, the task running it.
+    """
+
+    def __init__(self):
+        self.future: Future = Future()
+        self.waiting = 1
+        self.task: Optional[asyncio.Task] = None
+
+class SingleFlight:
+    """
+    Coalesces identical calls in flight: the first caller of a key runs the call,
+    the ones arriving before it finishes get its result (or its error).
+
+    An async call runs in its own task, so the leader going away (client disconnect,
+    batch or job cancel) does not take the followers' answer with it: the task is
+    only cancelled once no caller waits for it anymore. A sync leader runs the call
+    on its caller's thread, so the call ends with that thread; if it is interrupted
+    (KeyboardInterrupt, SystemExit), the followers run the call again themselves.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, key: str) -> Tuple[_Flight, bool]:
+        with self._lock:
+            flight = self._calls.get(key)
+            if flight is not None:
+                flight.waiting += 1
+                self.coalesced += 1
+                return flight, False
+            flight = self._calls[key] = _Flight()
+            self.leaders += 1
+            return flight, True
+
+    def _leave(self, flight: _Flight) -> None:
+        with self._lock:
+            flight.waiting -= 1
+            abandoned = flight.waiting == 0
+        task = flight.task
+        if abandoned and task is not None and not task.done():
+            # Nobody wants the answer anymore: free the slot and the provider
+            task.get_loop().call_soon_threadsafe(task.cancel)
+
+    def _finish(self, key: str, flight: _Flight, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            if self._calls.get(key) is flight:
+                del self._calls[key]
+        if error is None:
+            flight.future.set_result(result)
+        elif isinstance(error, Exception):
+            flight.future.set_exception(error)
+        else:
+            # Cancelled or interrupted: the followers run the call themselves
+            flight.future.set_exception(_LeaderInterrupted())
+
+    def _finish_task(self, key: str, flight: _Flight, task: asyncio.Task) -> None:
+        if task.cancelled():
+            self._finish(key, flight, error=asyncio.CancelledError())
+        elif task.exception() is not None:
+            self._finish(key, flight, error=task.exception())
+        else:
+            self._finish(key, flight, task.result())
+
+    def do(self, key: str, call: Callable[[], T]) -> T:
+        """
+        Runs call, or waits for the identical call already in flight.
+        """
+        flight, leader = self._join(key)
+        if not leader:
+            try:
+                return flight.future.result()
+            except _LeaderInterrupted:
+                pass
+            finally:
+                self._leave(flight)
+            return self.do(key, call)
+
+        try:
+            result = call()
+        except BaseException as e:
+            self._finish(key, flight, error=e)
+            raise
+        finally:
+            self._leave(flight)
+        self._finish(key, flight, result)
+        return result
+
+    async def ado(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Async variant of do; sync and async callers of the same key share one call.
+        """
+        flight, leader = self._join(key)
+        if not leader:
+            waiter = asyncio.wrap_future(flight.future)
+            # Read even when this follower gave up, so asyncio does not log it as lost
+            waiter.add_done_callback(lambda done: done.cancelled() or done.exception())
+            try:
+                # Shielded: a follower giving up must not cancel the call for the others
+                return await asyncio.shield(waiter)
+            except _LeaderInterrupted:
+                pass
+            finally:
+                self._leave(flight)
+            return await self.ado(key, call)
+
+        task = asyncio.ensure_future(call())
+        flight.task = task
+        task.add_done_callback(lambda done: self._finish_task(key, flight, done))
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._leave(flight)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._calls), "leaders": self.leaders, "coalesced": self.coalesced}
@@ -0,0 +1,321 @@
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Type
+from config import global_settings
+import functools
+import threading
+import bisect
+import math
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Labels:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """
+    Monotonic count per label combination.
+    """
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def snapshot(self) -> List[List[Any]]:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def render(self, snapshots: Sequence[List[List[Any]]]) -> List[str]:
+        merged: Dict[Labels, float] = {}
+        for snapshot in snapshots:
+            for key, value in snapshot:
+                merged[tuple(key)] = merged.get(tuple(key), 0) + value
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(merged.items())
+        ]
+
+class Histogram(_Metric):
+    """
+    Distribution of observations in cumulative buckets, with their sum and count.
+    """
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per label combination: bucket counts (last one is +Inf), sum
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def count(self, **labels: Any) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def snapshot(self) -> List[List[Any]]:
+        with self._lock:
+            return [[list(key), list(counts), total[0]] for key, (counts, total) in self._values.items()]
+
+    def render(self, snapshots: Sequence[List[List[Any]]]) -> List[str]:
+        merged: Dict[Labels, Tuple[List[int], float]] = {}
+        for snapshot in snapshots:
+            for key, counts, total in snapshot:
+                if len(counts) != len(self.buckets) + 1:
+                    # Published by a worker running other buckets (mid-deploy)
+                    continue
+                entry = merged.get(tuple(key))
+                merged[tuple(key)] = (
+                    (counts, total) if entry is None
+                    else ([a + b for a, b in zip(entry[0], counts)], entry[1] + total)
+                )
+        lines = self.header()
+        for key, (counts, total) in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class CallbackMetric(_Metric):
+    """
+    Values read from elsewhere (pool, scheduler, job counters) when the metrics are
+    rendered, so they cost nothing on the request path. Across workers the values
+    are summed, or the smallest one is kept (merge="min").
+    """
+
+    def __init__(self, *args, kind: str = "gauge", collect: Callable[[], Iterable[Tuple[Dict[str, Any], float]]],
+                 merge: str = "sum", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.kind = kind
+        self.collect = collect
+        self.merge = merge
+
+    def snapshot(self) -> List[List[Any]]:
+        return [[list(self._key(labels)), value] for labels, value in self.collect() if value is not None]
+
+    def render(self, snapshots: Sequence[List[List[Any]]]) -> List[str]:
+        merged: Dict[Labels, float] = {}
+        for snapshot in snapshots:
+            for key, value in snapshot:
+                key = tuple(key)
+                if key not in merged:
+                    merged[key] = value
+                else:
+                    merged[key] = min(merged[key], value) if self.merge == "min" else merged[key] + value
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(merged.items())
+        ]
+
+class MetricsRegistry:
+    """
+    The process' metrics, rendered in the Prometheus text format, alone or merged
+    with the snapshots other workers published (see worker_metrics). When disabled,
+    recording is a no-op; callback metrics are still rendered.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric) -> Any:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(self, name, documentation, labelnames, buckets=buckets))
+
+    def callback(self, name: str, documentation: str, labelnames: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Dict[str, Any], float]]], kind: str = "gauge",
+                 merge: str = "sum") -> CallbackMetric:
+        return self._add(CallbackMetric(self, name, documentation, labelnames, kind=kind, collect=collect, merge=merge))
+
+    def is_callback(self, name: str) -> bool:
+        """
+        Whether a metric is read at render time (a current value, not a running total)
+        """
+        return isinstance(self._metrics.get(name), CallbackMetric)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Current state of every metric, JSON serializable, as render() merges it.
+        A collector that fails is left out.
+        """
+        state = {}
+        for name, metric in self._metrics.items():
+            try:
+                state[name] = metric.snapshot()
+            except Exception:
+                continue
+        return state
+
+    def render(self, snapshots: Optional[Sequence[Dict[str, Any]]] = None) -> str:
+        """
+        Args:
+            snapshots: States to merge (see snapshot()), one per worker; default is this process alone
+        """
+        if snapshots is None:
+            snapshots = [self.snapshot()]
+        lines = []
+        for name, metric in self._metrics.items():
+            try:
+                lines.extend(metric.render([snapshot[name] for snapshot in snapshots if name in snapshot]))
+            except Exception as e:
+                # One malformed snapshot must not take the whole scrape down
+                lines.append(f"# {name} unavailable: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+registry: MetricsRegistry = MetricsRegistry(enabled=global_settings.METRICS_ENABLED)
+
+requests_total = registry.counter(
+    "knai_requests_total", "Questions processed, by pipeline and outcome", ("pipeline", "status")
+)
+request_seconds = registry.histogram(
+    "knai_request_duration_seconds", "Wall time of a question, by pipeline", ("pipeline",)
+)
+stage_seconds = registry.histogram(
+    "knai_stage_duration_seconds", "Time spent in each stage of a question", ("stage",)
+)
+stage_errors_total = registry.counter(
+    "knai_stage_errors_total", "Stages that failed, by stage", ("stage",)
+)
+cache_requests_total = registry.counter(
+    "knai_cache_requests_total", "Cache lookups by cache and result (hit, miss, stale)", ("cache", "result")
+)
+llm_calls_total = registry.counter(
+    "knai_llm_calls_total", "LLM calls sent to the provider", ("provider", "stage", "status")
+)
+llm_call_seconds = registry.histogram(
+    "knai_llm_call_duration_seconds", "LLM call latency, queue wait excluded", ("provider", "stage")
+)
+llm_tokens_total = registry.counter(
+    "knai_llm_tokens_total", "LLM tokens by direction (input, output)", ("provider", "stage", "direction")
+)
+query_rows = registry.histogram(
+    "knai_query_rows", "Rows returned by generated queries", buckets=ROW_BUCKETS
+)
+
+def observe_llm_usage(provider: str, stage: str, message: Any) -> None:
+    """
+    Counts the tokens an LLM response reports (LangChain usage_metadata), if any
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if not usage or not registry.enabled:
+        return
+    llm_tokens_total.inc(usage.get("input_tokens", 0), provider=provider, stage=stage, direction="input")
+    llm_tokens_total.inc(usage.get("output_tokens", 0), provider=provider, stage=stage, direction="output")
+
+def track_request(pipeline: str, cancelled: Tuple[Type[BaseException], ...] = ()):
+    """
+    Counts and times a function returning the {"status", "response"} dict of a question.
+
+    Args:
+        pipeline: Label of the pipeline
+        cancelled: Exceptions counted as "cancelled" rather than "error"
+    """
+    def decorator(function: Callable[..., Dict[str, Any]]) -> Callable[..., Dict[str, Any]]:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            status = "error"
+            try:
+                result = function(*args, **kwargs)
+                status = result.get("status", "error")
+                return result
+            except cancelled:
+                status = "cancelled"
+                raise
+            finally:
+                requests_total.inc(pipeline=pipeline, status=status)
+                request_seconds.observe(time.perf_counter() - started, pipeline=pipeline)
+        return wrapper
+    return decorator
+
+def track_stream(pipeline: str):
+    """
+    Counts and times an async generator of (event, data) tuples ending with "done" or "error".
+    A consumer that stops early (client disconnect) is counted as "cancelled".
+    """
+    def decorator(function: Callable[..., AsyncIterator[Tuple[str, Dict]]]) -> Callable[..., AsyncIterator[Tuple[str, Dict]]]:
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                async for item in function(*args, **kwargs):
+                    yield item
+                return
+            started = time.perf_counter()
+            status = "cancelled"
+            try:
+                async for event, data in function(*args, **kwargs):
+                    if event == "done":
+                        status = "success"
+                    elif event == "error":
+                        status = "error"
+                    yield event, data
+            finally:
+                requests_total.inc(pipeline=pipeline, status=status)
+                request_seconds.observe(time.perf_counter() - started, pipeline=pipeline)
+        return wrapper
+    return decorator
@@ -0,0 +1,138 @@
+from dataclasses import dataclass, field, asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from config import global_settings
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def summarize_plan(explain: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Summary of an EXPLAIN (FORMAT JSON) result: top node, estimated cost and rows,
+    and the sequential scans it contains.
+
+    Args:
+        explain: Parsed EXPLAIN (FORMAT JSON) output.
+
+    Returns:
+        The plan summary.
+    """
+    root = explain[0]["Plan"]
+    seq_scans = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node["Node Type"] == "Seq Scan":
+            seq_scans.append({"table": node.get("Relation Name"), "rows": node["Plan Rows"]})
+        stack.extend(node.get("Plans", []))
+
+    return {
+        "node": root["Node Type"],
+        "total_cost": root["Total Cost"],
+        "rows": root["Plan Rows"],
+        "seq_scans": seq_scans
+    }
+
+def with_limit(sql: str, limit: int) -> str:
+    """
+    Caps the rows a query returns by wrapping it, which works whatever LIMIT, ORDER BY
+    or set operation the original query has.
+    """
+    return f"SELECT * FROM ({sql.strip().rstrip(';')}) AS limited LIMIT {int(limit)}"
+
+@dataclass
+class AdmissionDecision:
+    """
+    Outcome of the admission check.
+    Attributes:
+        action: "allow", "limit" (LIMIT injected) or "reject"
+        sql: Query to execute (rewritten when limited)
+        reason: Why the query was limited or rejected
+        plan: Summary of the plan the decision was based on
+    """
+    action: str
+    sql: str
+    reason: Optional[str] = None
+    plan: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        decision = asdict(self)
+        decision.pop("sql")
+        return decision
+
+class QueryGuard:
+    """
+    Pre-execution admission control for generated SQL based on the planner's estimates:
+    queries expected to return too many rows get a LIMIT, queries expected to cost
+    too much are rejected before they run.
+    """
+
+    def __init__(self, max_cost: float = 1e7, max_rows: int = 10000, limit_rows: int = 10001):
+        """
+        Args:
+            max_cost: Highest estimated plan cost admitted
+            max_rows: Estimated rows above which a LIMIT is injected
+            limit_rows: The injected LIMIT
+        """
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.limit_rows = limit_rows
+
+    def _decide(self, sql: str, plan: Dict[str, Any], limited: bool) -> Optional[AdmissionDecision]:
+        if not limited and plan["rows"] > self.max_rows:
+            # A LIMIT usually lowers the cost too (scans stop early); decided after re-planning
+            return None
+        if plan["total_cost"] > self.max_cost:
+            return AdmissionDecision(
+                "reject", sql,
+                f"Estimated cost {plan['total_cost']:.0f} exceeds the limit of {self.max_cost:.0f}",
+                plan
+            )
+        if limited:
+            return AdmissionDecision(
+                "limit", sql,
+                f"Estimated rows exceed {self.max_rows}, LIMIT {self.limit_rows} added",
+                plan
+            )
+        return AdmissionDecision("allow", sql, plan=plan)
+
+    def admit(self, sql: str, explain: Callable[[str], List[Dict[str, Any]]]) -> AdmissionDecision:
+        """
+        Decides whether and how a query may run.
+
+        Args:
+            sql: Generated SQL.
+            explain: Returns the EXPLAIN (FORMAT JSON) output of a query.
+
+        Returns:
+            AdmissionDecision with the SQL to execute.
+        """
+        decision = self._decide(sql, summarize_plan(explain(sql)), limited=False)
+        if decision is None:
+            limited_sql = with_limit(sql, self.limit_rows)
+            decision = self._decide(limited_sql, summarize_plan(explain(limited_sql)), limited=True)
+        self._log(decision)
+        return decision
+
+    async def aadmit(self, sql: str, explain: Callable[[str], Awaitable[List[Dict[str, Any]]]]) -> AdmissionDecision:
+        """
+        Async variant of admit.
+        """
+        decision = self._decide(sql, summarize_plan(await explain(sql)), limited=False)
+        if decision is None:
+            limited_sql = with_limit(sql, self.limit_rows)
+            decision = self._decide(limited_sql, summarize_plan(await explain(limited_sql)), limited=True)
+        self._log(decision)
+        return decision
+
+    def _log(self, decision: AdmissionDecision) -> None:
+        if decision.action == "allow":
+            logger.info(f"Query admitted (cost {decision.plan['total_cost']:.0f}, rows {decision.plan['rows']})")
+        else:
+            logger.warning(f"Query {decision.action}ed: {decision.reason}")
+
+query_guard: QueryGuard = QueryGuard(
+    max_cost=global_settings.QUERY_GUARD_MAX_COST,
+    max_rows=global_settings.QUERY_GUARD_MAX_ROWS,
+    limit_rows=global_settings.QUERY_MAX_ROWS + 1
+)
@@ -0,0 +1,255 @@
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+import unicodedata
+import logging
+import json
+import zlib
+import os
+import re
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SQL_REQUEST = "sql_request"
+CASUAL_INTERACTION = "casual_interaction"
+LABELS = (CASUAL_INTERACTION, SQL_REQUEST)
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(__file__), "data", "classifier_questions.jsonl")
+
+# Words that on their own make up a greeting, thanks or small talk
+CASUAL_WORDS = {
+    "hi", "hello", "hey", "there", "thanks", "thank", "you", "so", "a", "lot", "ok", "okay",
+    "cool", "great", "awesome", "bye", "goodbye", "good", "morning", "afternoon", "evening", "night",
+    "perfect", "nice", "lol", "got", "it", "see", "later",
+    "oi", "ola", "tudo", "bem", "bom", "dia", "boa", "tarde", "noite", "obrigado", "obrigada",
+    "valeu", "tchau", "ate", "logo", "beleza", "muito"
+}
+
+# Words that point at the data (aggregations, rankings, periods, business entities)
+DATA_WORDS = {
+    "many", "total", "sum", "count", "average", "avg", "median", "top", "most", "least",
+    "best", "worst", "revenue", "sales", "sold", "orders", "order", "products", "product", "customers",
+    "customer", "price", "stock", "month", "week", "year", "today", "yesterday", "list", "show",
+    "compare", "trend", "percentage", "quantos", "quantas", "quais", "media",
+    "vendas", "venda", "vendidos", "pedidos", "pedido", "produtos", "produto", "clientes", "cliente",
+    "faturamento", "receita", "estoque", "mes", "semana", "ano", "hoje", "ontem", "liste", "mostre"
+}
+
+WORD_PATTERN = re.compile(r"\w+")
+
+def normalize(text: str) -> str:
+    """
+    Lowercases and strips accents and repeated whitespace.
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.lower().split())
+
+def char_ngrams(text: str, sizes: Tuple[int, ...] = (2, 3, 4)) -> List[str]:
+    """
+    Character n-grams of each word, padded so word starts and ends are features too.
+    """
+    grams = []
+    for word in WORD_PATTERN.findall(text):
+        padded = f" {word} "
+        for size in sizes:
+            grams.extend(padded[i:i + size] for i in range(len(padded) - size + 1))
+        grams.append(f"w:{word}")
+    return grams
+
+def rule_score(text: str) -> float:
+    """
+    Keyword score of a normalized question: positive for data requests, negative for
+    small talk and 0 when the words say nothing either way.
+    """
+    words = WORD_PATTERN.findall(text)
+    if not words:
+        return -1.0
+    data_hits = sum(word in DATA_WORDS for word in words)
+    if data_hits == 0 and all(word in CASUAL_WORDS for word in words):
+        return -1.0
+    # Digits almost always refer to quantities, dates or ids
+    if any(word.isdigit() for word in words):
+        data_hits += 1
+    return min(data_hits / 2.0, 1.0)
+
+@dataclass
+class Classification:
+    """
+    Result of a local classification. source is "rules" or "model".
+    """
+    label: str
+    confidence: float
+    source: str
+
+class QuestionClassifier:
+    """
+    In-process classifier deciding between "sql_request" and "casual_interaction":
+    keyword rules plus a logistic regression over hashed character n-grams.
+    """
+
+    def __init__(self, dim: int = 2 ** 14, rule_weight: float = 2.0):
+        """
+        Initializes an untrained classifier
+
+        Args:
+            dim: Number of hashed feature buckets
+            rule_weight: Weight of the keyword score added to the model logit
+        """
+        self.dim = dim
+        self.rule_weight = rule_weight
+        self.weights = np.zeros(dim, dtype=np.float32)
+        self.bias = 0.0
+        self.trained = False
+
+    def _features(self, text: str) -> np.ndarray:
+        return np.fromiter(
+            (zlib.crc32(gram.encode("utf-8")) % self.dim for gram in char_ngrams(text)),
+            dtype=np.int64
+        )
+
+    def _logit(self, indexes: np.ndarray) -> float:
+        if not len(indexes):
+            return self.bias
+        # Bag of n-grams with L2 normalization: repeated buckets count more than once
+        return float(self.weights[indexes].sum() / np.sqrt(len(indexes))) + self.bias
+
+    def fit(self, questions: List[str], labels: List[str], epochs: int = 60,
+            learning_rate: float = 0.5, l2: float = 1e-4, seed: int = 0) -> "QuestionClassifier":
+        """
+        Trains the logistic regression with mini-batch gradient descent
+
+        Args:
+            questions: Training questions
+            labels: "sql_request" or "casual_interaction" for each question
+            epochs: Passes over the training data
+            learning_rate: Gradient step size
+            l2: L2 regularization strength
+            seed: Shuffling seed
+
+        Returns:
+            The trained classifier
+        """
+        features = [self._features(normalize(question)) for question in questions]
+        targets = np.array([label == SQL_REQUEST for label in labels], dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        batch_size = 32
+
+        self.weights[:] = 0.0
+        self.bias = 0.0
+        for _ in range(epochs):
+            order = rng.permutation(len(features))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                gradient = np.zeros(self.dim, dtype=np.float32)
+                bias_gradient = 0.0
+                for index in batch:
+                    indexes = features[index]
+                    error = 1.0 / (1.0 + np.exp(-self._logit(indexes))) - targets[index]
+                    if len(indexes):
+                        np.add.at(gradient, indexes, error / np.sqrt(len(indexes)))
+                    bias_gradient += error
+                gradient = gradient / len(batch) + l2 * self.weights
+                self.weights -= learning_rate * gradient
+                self.bias -= learning_rate * bias_gradient / len(batch)
+
+        self.trained = True
+        return self
+
+    def predict_proba(self, question: str) -> float:
+        """
+        Probability that a question is a data request
+
+        Args:
+            question: Natural language question
+
+        Returns:
+            P(sql_request) combining the model and the keyword rules
+        """
+        text = normalize(question)
+        logit = self.rule_weight * rule_score(text)
+        if self.trained:
+            logit += self._logit(self._features(text))
+        return float(1.0 / (1.0 + np.exp(-logit)))
+
+    def classify(self, question: str) -> Classification:
+        """
+        Classifies a question
+
+        Args:
+            question: Natural language question
+
+        Returns:
+            Classification with the label and its confidence
+        """
+        probability = self.predict_proba(question)
+        label = SQL_REQUEST if probability >= 0.5 else CASUAL_INTERACTION
+        confidence = probability if label == SQL_REQUEST else 1.0 - probability
+        return Classification(label, confidence, "model" if self.trained else "rules")
+
+    def save(self, path: str) -> None:
+        """
+        Saves the trained weights to a .npz file
+        """
+        np.savez_compressed(path, weights=self.weights, bias=self.bias,
+                            dim=self.dim, rule_weight=self.rule_weight)
+
+    @classmethod
+    def load(cls, path: str) -> "QuestionClassifier":
+        """
+        Loads a classifier saved with save()
+        """
+        data = np.load(path)
+        classifier = cls(dim=int(data["dim"]), rule_weight=float(data["rule_weight"]))
+        classifier.weights = data["weights"].astype(np.float32)
+        classifier.bias = float(data["bias"])
+        classifier.trained = True
+        return classifier
+
+def load_dataset(path: str = DEFAULT_DATASET) -> Tuple[List[str], List[str]]:
+    """
+    Reads a JSON lines file of {"question": ..., "label": ...} records
+
+    Args:
+        path: Dataset path
+
+    Returns:
+        Questions and labels
+
+    Raises:
+        ValueError: If a label is not one of LABELS
+    """
+    questions, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in filter(None, (line.strip() for line in f)):
+            record = json.loads(line)
+            if record["label"] not in LABELS:
+                raise ValueError(f"Unknown label {record['label']!r} in {path}")
+            questions.append(record["question"])
+            labels.append(record["label"])
+    return questions, labels
+
+_shared_classifier: Optional[QuestionClassifier] = None
+
+def get_question_classifier(model_path: Optional[str] = None) -> QuestionClassifier:
+    """
+    Returns the shared classifier, loaded from model_path when the file exists and
+    otherwise trained on the bundled seed dataset.
+
+    Args:
+        model_path: Path of a model saved by benchmarks.train_question_classifier
+
+    Returns:
+        QuestionClassifier: The shared classifier
+    """
+    global _shared_classifier
+
+    if _shared_classifier is None:
+        if model_path and os.path.exists(model_path):
+            _shared_classifier = QuestionClassifier.load(model_path)
+            logger.info(f"Question classifier loaded from {model_path}")
+        else:
+            _shared_classifier = QuestionClassifier().fit(*load_dataset())
+            logger.info("Question classifier trained on the bundled dataset")
+    return _shared_classifier
@@ -0,0 +1,292 @@
+from ..services.pg_service import PostgresDB, get_db
+from .sql_validator import analyze
+from dataclasses import dataclass, field
+from config import global_settings
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import logging
+import redis
+import json
+import time
+import re
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+QUOTED_PATTERN = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+# Names resolve as in the query itself (to_regclass follows search_path), so only
+# the tables it reads match, not namesakes in other schemas. TRUNCATE and table
+# rewrites do not move the tuple counters, so relfilenode is part of the version too.
+# A partitioned table has no counters of its own: its version sums those of its
+# leaf partitions, whose relfilenodes also reveal attached and detached partitions.
+# The version is NULL for what has no counters to follow (views, foreign tables,
+# partitions that are foreign tables, names that do not resolve).
+TABLE_VERSIONS_QUERY = """
+    SELECT t.name, n.nspname || '.' || c.relname, v.version
+    FROM unnest(%(tables)s::text[]) AS t(name)
+    LEFT JOIN pg_class c ON c.oid = to_regclass(t.name) AND c.relkind IN ('r', 'm', 'p')
+    LEFT JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN LATERAL (
+        SELECT CASE WHEN count(s.relid) = count(*) AND count(*) > 0 THEN
+                   sum(s.n_tup_ins + s.n_tup_upd + s.n_tup_del)::text || ':'
+                   || string_agg(l.relfilenode::text, ',' ORDER BY l.oid)
+               END AS version
+        FROM pg_class l
+        LEFT JOIN pg_stat_user_tables s ON s.relid = l.oid
+        WHERE l.oid = c.oid AND c.relkind <> 'p'
+           OR l.oid IN (SELECT relid FROM pg_partition_tree(c.oid) WHERE isleaf AND c.relkind = 'p')
+    ) v ON true;
+"""
+
+STAT_NAMES = {"hit": "hits", "miss": "misses", "stale": "stale", "uncacheable": "uncacheable"}
+
+def normalize_sql(sql: str) -> str:
+    """
+    Canonical text of a query for cache keys: whitespace collapsed, keywords and
+    unquoted identifiers lowercased and trailing semicolons dropped. String literals
+    and quoted identifiers are kept verbatim.
+
+    Args:
+        sql: SQL query.
+
+    Returns:
+        Normalized SQL.
+    """
+    parts = QUOTED_PATTERN.split(sql.strip().rstrip(";"))
+    normalized = []
+    for index, part in enumerate(parts):
+        # split() with a capture group puts the quoted chunks at odd indexes
+        normalized.append(part if index % 2 else re.sub(r"\s+", " ", part.lower()))
+    return "".join(normalized).strip()
+
+def referenced_tables(sql: str) -> List[Tuple[Optional[str], str]]:
+    """
+    Tables a query reads, as found by the SQL validator's tokenizer: every item of
+    comma-separated FROM lists and JOINs, in subqueries too, without CTE names or
+    the columns of expressions such as EXTRACT(YEAR FROM created_at).
+
+    Args:
+        sql: SQL query.
+
+    Returns:
+        Sorted unique (schema or None, table) pairs.
+    """
+    analysis = analyze(sql)
+    return sorted(
+        {(schema, table) for schema, table in analysis.tables if schema is not None or table not in analysis.ctes},
+        key=lambda item: (item[0] or "", item[1])
+    )
+
+def _quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+@dataclass
+class CacheLookup:
+    """
+    Outcome of a result cache lookup: "hit", "miss", "stale", or "uncacheable" when
+    some data the query reads has no version to check (see table_versions); those
+    results must not be stored. The table versions are read before executing so a
+    later store() can reuse them.
+    """
+    status: str
+    result: Optional[str] = None
+    versions: Dict[str, str] = field(default_factory=dict)
+
+class ResultCache:
+    """
+    Redis cache of query results keyed by the normalized SQL. An entry is valid while
+    the data version of every table it reads (pg_stat_user_tables change counters)
+    is unchanged and its per-table TTL has not elapsed. Queries reading anything else
+    (views, foreign tables, no table at all) are not cached. Backends flush those counters
+    asynchronously (about once a second, later under load), so a lookup right after
+    a write can still hit; the per-table TTLs bound how long.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = global_settings.REDIS_URI,
+        db: Optional[PostgresDB] = None,
+        default_ttl: int = 300,
+        table_ttls: Optional[Dict[str, int]] = None,
+        max_entry_bytes: int = 1024 * 1024,
+        max_total_bytes: int = 64 * 1024 * 1024
+    ):
+        """
+        Initializes the cache
+
+        Args:
+            redis_url: Redis connection URL
+            db: Database to read table versions from (default is the shared application pool)
+            default_ttl: Seconds a result is trusted when its tables have no specific TTL
+            table_ttls: Per-table TTL overrides in seconds
+            max_entry_bytes: Results larger than this are not cached
+            max_total_bytes: Memory budget; least recently used entries are evicted beyond it
+        """
+        self.redis_client = redis.from_url(redis_url)
+        self._db = db
+        self.default_ttl = default_ttl
+        self.table_ttls = table_ttls or {}
+        self.max_entry_bytes = max_entry_bytes
+        self.max_total_bytes = max_total_bytes
+        self.lru_key = "resultcache:lru"
+        self.sizes_key = "resultcache:sizes"
+        self.bytes_key = "resultcache:bytes"
+        self.stats_key = "resultcache:stats"
+
+    @property
+    def db(self) -> PostgresDB:
+        # Always the primary: a standby's pg_stat_user_tables does not see the primary's writes
+        return self._db or get_db()
+
+    def _key(self, sql: str) -> str:
+        return f"resultcache:{hashlib.sha1(normalize_sql(sql).encode('utf-8')).hexdigest()}"
+
+    def ttl_for(self, tables: List[Tuple[Optional[str], str]]) -> int:
+        """
+        The shortest TTL among the tables a query reads.
+        """
+        return min([self.table_ttls.get(table, self.default_ttl) for _, table in tables] or [self.default_ttl])
+
+    def table_versions(self, tables: List[Tuple[Optional[str], str]]) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Current data version of each table.
+
+        Args:
+            tables: (schema or None, table) pairs, unqualified ones resolved through the search_path.
+
+        Returns:
+            Mapping of "schema.table" to a version string, and the names that have no
+            version: views, foreign tables and names that do not resolve to a table.
+        """
+        if not tables:
+            return {}, []
+        names = [
+            f"{_quote_ident(schema)}.{_quote_ident(table)}" if schema else _quote_ident(table)
+            for schema, table in tables
+        ]
+        with self.db.get_cursor(cursor_factory=None) as cur:
+            cur.execute(TABLE_VERSIONS_QUERY, {"tables": names})
+            rows = cur.fetchall()
+        versions = {relation: version for _, relation, version in rows if version is not None}
+        unresolved = [name for name, _, version in rows if version is None]
+        return versions, unresolved
+
+    def lookup(self, sql: str) -> CacheLookup:
+        """
+        Looks up a result and checks that its tables did not change since it was stored.
+
+        Args:
+            sql: SQL query.
+
+        Returns:
+            CacheLookup with the cached result on a hit.
+        """
+        key = self._key(sql)
+        tables = referenced_tables(sql)
+        versions, unresolved = self.table_versions(tables)
+
+        if not tables or unresolved:
+            # Nothing would tell a write apart: SELECT now(), views, foreign tables
+            status = "uncacheable"
+        else:
+            try:
+                payload = self.redis_client.get(key)
+            except redis.RedisError as e:
+                logger.error(f"Error reading result cache: {e}")
+                return CacheLookup("miss", versions=versions)
+
+            if not payload:
+                status = "miss"
+            else:
+                entry = json.loads(payload)
+                expired = time.time() - entry["stored_at"] > self.ttl_for(tables)
+                status = "stale" if expired or entry["versions"] != versions else "hit"
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hincrby(self.stats_key, STAT_NAMES[status], 1)
+            if status == "hit":
+                pipe.zadd(self.lru_key, {key: time.time()})
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"Error updating result cache stats: {e}")
+
+        if status == "hit":
+            return CacheLookup(status, entry["result"], versions)
+        return CacheLookup(status, versions=versions)
+
+    def store(self, sql: str, result: str, versions: Dict[str, str]) -> bool:
+        """
+        Stores a result under the table versions read before it was executed.
+
+        Args:
+            sql: SQL query.
+            result: Serialized query result.
+            versions: Table versions from the preceding lookup.
+
+        Returns:
+            False if the result was too large to cache.
+        """
+        payload = json.dumps({"result": result, "versions": versions, "stored_at": time.time()})
+        size = len(payload.encode("utf-8"))
+        if size > self.max_entry_bytes:
+            return False
+
+        key = self._key(sql)
+        ttl = self.ttl_for(referenced_tables(sql))
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            # Expired keys are kept for a while so a lookup can still report them as stale.
+            pipe.setex(key, ttl * 2, payload)
+            pipe.zadd(self.lru_key, {key: time.time()})
+            pipe.hget(self.sizes_key, key)
+            pipe.hset(self.sizes_key, key, size)
+            previous = pipe.execute()[2]
+            total = self.redis_client.incrby(self.bytes_key, size - int(previous or 0))
+
+            while total > self.max_total_bytes:
+                evicted = self.redis_client.zpopmin(self.lru_key, 1)
+                if not evicted:
+                    break
+                evicted_key = evicted[0][0]
+                evicted_size = int(self.redis_client.hget(self.sizes_key, evicted_key) or 0)
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.delete(evicted_key)
+                pipe.hdel(self.sizes_key, evicted_key)
+                pipe.decrby(self.bytes_key, evicted_size)
+                pipe.hincrby(self.stats_key, "evictions", 1)
+                total = pipe.execute()[2]
+        except redis.RedisError as e:
+            logger.error(f"Error writing result cache: {e}")
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit/miss/stale/eviction counters, number of entries and bytes used.
+        """
+        try:
+            counters = {k.decode(): int(v) for k, v in self.redis_client.hgetall(self.stats_key).items()}
+            counters["entries"] = self.redis_client.zcard(self.lru_key)
+            counters["bytes"] = int(self.redis_client.get(self.bytes_key) or 0)
+        except redis.RedisError as e:
+            logger.error(f"Error reading result cache stats: {e}")
+            return {}
+        return counters
+
+def parse_table_ttls(value: str) -> Dict[str, int]:
+    """
+    Parses "orders:60,products:3600" into {"orders": 60, "products": 3600}.
+    """
+    ttls = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        table, _, ttl = item.partition(":")
+        ttls[table.strip()] = int(ttl)
+    return ttls
+
+result_cache: ResultCache = ResultCache(
+    default_ttl=global_settings.RESULT_CACHE_TTL,
+    table_ttls=parse_table_ttls(global_settings.RESULT_CACHE_TABLE_TTLS),
+    max_entry_bytes=global_settings.RESULT_CACHE_MAX_ENTRY_BYTES,
+    max_total_bytes=global_settings.RESULT_CACHE_MAX_BYTES
+)
@@ -0,0 +1,220 @@
+from .schema_renderer import count_tokens
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import warnings
+import logging
+import json
+import re
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?")
+SECONDS_PER_DAY = 86400.0
+
+def _round(value: float) -> Optional[float]:
+    if value is None or not np.isfinite(value):
+        return None
+    return float(f"{value:.6g}")
+
+def _percent(new: float, old: float) -> Optional[float]:
+    if not old:
+        return None
+    return _round((new - old) / abs(old) * 100)
+
+def _as_numbers(values: List[Any]) -> Optional[np.ndarray]:
+    # bool is an int subclass but a flag, not a measure; Decimal arrives as a string
+    if any(isinstance(value, bool) for value in values):
+        return None
+    try:
+        return np.array([float(value) for value in values], dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+
+def _as_datetimes(values: List[Any]) -> Optional[np.ndarray]:
+    if not all(isinstance(value, str) and DATE_PATTERN.match(value) for value in values):
+        return None
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            # Timezone offsets are dropped: trends only need the ordering and spacing
+            return np.array([DATE_PATTERN.match(value).group(0) for value in values], dtype="datetime64[s]")
+    except ValueError:
+        return None
+
+def _null_stats(total: int, present: int) -> Dict[str, Any]:
+    return {
+        "count": present,
+        "nulls": total - present,
+        "null_rate": _round((total - present) / total) if total else 0.0
+    }
+
+def profile_column(values: List[Any], top_k: int = 5) -> Dict[str, Any]:
+    """
+    Summary of one column: numeric (min/max/mean/std/sum/quartiles), datetime
+    (range) or categorical (distinct count and most frequent values).
+
+    Args:
+        values: Column values, None for nulls.
+        top_k: Most frequent values kept for categorical columns.
+
+    Returns:
+        The column profile.
+    """
+    present = [value for value in values if value is not None]
+    profile: Dict[str, Any] = {"type": "empty", **_null_stats(len(values), len(present))}
+    if not present:
+        return profile
+
+    numbers = _as_numbers(present)
+    if numbers is not None:
+        quartiles = np.percentile(numbers, [25, 50, 75])
+        profile.update({
+            "type": "numeric",
+            "min": _round(numbers.min()),
+            "max": _round(numbers.max()),
+            "mean": _round(numbers.mean()),
+            "std": _round(numbers.std()),
+            "sum": _round(numbers.sum()),
+            "p25": _round(quartiles[0]),
+            "p50": _round(quartiles[1]),
+            "p75": _round(quartiles[2])
+        })
+        return profile
+
+    times = _as_datetimes(present)
+    if times is not None:
+        profile.update({
+            "type": "datetime",
+            "min": str(times.min()),
+            "max": str(times.max()),
+            "distinct": int(np.unique(times).size)
+        })
+        return profile
+
+    labels, counts = np.unique(np.array([str(value) for value in present], dtype=object), return_counts=True)
+    order = np.argsort(-counts, kind="stable")[:top_k]
+    profile.update({
+        "type": "categorical",
+        "distinct": int(labels.size),
+        "top": [[labels[i], int(counts[i])] for i in order]
+    })
+    return profile
+
+def _is_identifier(name: str) -> bool:
+    name = name.lower()
+    return name == "id" or name.endswith("_id")
+
+def time_trends(columns: Dict[str, List[Any]], profiles: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Trend of each numeric column along the first datetime column. Rows sharing a
+    timestamp (e.g. one row per category and day) are summed into one period first.
+
+    Args:
+        columns: Column values by name.
+        profiles: Column profiles from profile_column.
+
+    Returns:
+        Per measure: slope per day, first/last period totals, overall and
+        period-over-period change in percent.
+    """
+    time_column = next((name for name, profile in profiles.items() if profile["type"] == "datetime"), None)
+    if time_column is None:
+        return []
+
+    trends = []
+    for name, profile in profiles.items():
+        if profile["type"] != "numeric" or _is_identifier(name):
+            continue
+
+        pairs = [(t, v) for t, v in zip(columns[time_column], columns[name]) if t is not None and v is not None]
+        if not pairs:
+            continue
+        times = _as_datetimes([t for t, _ in pairs])
+        values = _as_numbers([v for _, v in pairs])
+
+        periods, inverse = np.unique(times, return_inverse=True)
+        if periods.size < 3:
+            continue
+        totals = np.bincount(inverse, weights=values)
+        days = (periods - periods[0]).astype("timedelta64[s]").astype(np.float64) / SECONDS_PER_DAY
+        slope = np.polyfit(days, totals, 1)[0]
+
+        trends.append({
+            "measure": name,
+            "over": time_column,
+            "periods": int(periods.size),
+            "slope_per_day": _round(slope),
+            "first": _round(totals[0]),
+            "last": _round(totals[-1]),
+            "change_pct": _percent(totals[-1], totals[0]),
+            "last_period_change_pct": _percent(totals[-1], totals[-2])
+        })
+    return trends
+
+def sample_rows(rows: List[Dict[str, Any]], size: int) -> List[Dict[str, Any]]:
+    """
+    Evenly spaced rows, always including the first and the last one.
+    """
+    if size <= 0 or not rows:
+        return []
+    if len(rows) <= size:
+        return rows
+    indexes = np.unique(np.linspace(0, len(rows) - 1, size).round().astype(int))
+    return [rows[i] for i in indexes]
+
+def profile_rows(rows: List[Dict[str, Any]], top_k: int = 5) -> Dict[str, Any]:
+    """
+    Statistical profile of a query result.
+
+    Args:
+        rows: Query rows.
+        top_k: Most frequent values kept for categorical columns.
+
+    Returns:
+        Row count, per-column profiles and time trends.
+    """
+    names = list(rows[0].keys()) if rows else []
+    columns = {name: [row.get(name) for row in rows] for name in names}
+    profiles = {name: profile_column(values, top_k) for name, values in columns.items()}
+    return {
+        "row_count": len(rows),
+        "columns": profiles,
+        "trends": time_trends(columns, profiles)
+    }
+
+def result_for_prompt(result: str, token_budget: int, sample_size: int = 20, top_k: int = 5) -> Tuple[str, bool]:
+    """
+    The query result as it should appear in the insight prompt: unchanged when it fits
+    the token budget, otherwise a profile of all rows plus a representative sample,
+    the sample shrinking until the whole fits.
+
+    Args:
+        result: Query result JSON (list of rows, or a message/error object).
+        token_budget: Prompt tokens allowed for the result.
+        sample_size: Rows included with the profile at most.
+        top_k: Most frequent values kept for categorical columns.
+
+    Returns:
+        The text for the prompt and whether it is a summary.
+    """
+    if count_tokens(result) <= token_budget:
+        return result, False
+
+    try:
+        rows = json.loads(result)
+    except ValueError:
+        return result, False
+    if not isinstance(rows, list) or not rows or not isinstance(rows[0], dict):
+        return result, False
+
+    summary = profile_rows(rows, top_k)
+    while True:
+        summary["sample"] = sample_rows(rows, sample_size)
+        text = json.dumps(summary, default=str)
+        if count_tokens(text) <= token_budget or sample_size == 0:
+            break
+        sample_size //= 2
+
+    logger.info(f"Result of {len(rows)} rows summarized for the prompt ({count_tokens(text)} tokens)")
+    return text, True
@@ -0,0 +1,355 @@
+from ..services.pg_service import PostgresDB
+from ..services.db_router import db_router
+from .catalog_extractor import CatalogSchemaExtractor
+from .schema_extractor import SchemaExtractor
+from .stage_timer import record_stage
+from dataclasses import dataclass, field
+from config import global_settings
+from typing import Dict, Any, Callable, List, Optional
+import threading
+import asyncio
+import logging
+import redis
+import json
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cheap catalog fingerprint: any DDL touching the schema rewrites a row in one of
+# these catalogs, which changes its xmin (and relfilenode for table rewrites).
+FINGERPRINT_QUERY = """
+    SELECT md5(coalesce(string_agg(part, ',' ORDER BY part), ''))
+    FROM (
+        SELECT 'rel' || c.oid::text || ':' || c.relfilenode::text || ':' || c.xmin::text AS part
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %(schema)s
+            AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+        UNION ALL
+        SELECT 'con' || con.oid::text || ':' || con.xmin::text
+        FROM pg_constraint con
+        JOIN pg_namespace n ON n.oid = con.connamespace
+        WHERE n.nspname = %(schema)s
+        UNION ALL
+        SELECT 'att' || count(*)::text || ':' || coalesce(sum(a.xmin::text::bigint), 0)::text
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %(schema)s
+            AND a.attnum > 0
+        UNION ALL
+        SELECT 'dsc' || count(*)::text || ':' || coalesce(sum(d.xmin::text::bigint), 0)::text
+        FROM pg_description d
+        JOIN pg_class c ON c.oid = d.objoid AND d.classoid = 'pg_class'::regclass
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %(schema)s
+    ) parts;
+"""
+
+EXTRACTORS = {
+    "catalog": CatalogSchemaExtractor,
+    "information_schema": SchemaExtractor
+}
+
+@dataclass
+class SchemaSnapshot:
+    """
+    An extracted schema together with the catalog fingerprint it was taken at.
+    """
+    schema_name: str
+    fingerprint: str
+    schema: Dict[str, Any]
+    loaded_at: float = field(default_factory=time.time)
+    derived: Dict[str, Any] = field(default_factory=dict, repr=False, compare=False)
+
+    def derive(self, name: str, factory: Callable[[Dict[str, Any]], Any]) -> Any:
+        """
+        Builds an artifact from the schema once per snapshot (retrieval index,
+        rendered prompt text...) and reuses it until the schema changes.
+
+        Args:
+            name: Artifact name.
+            factory: Builds the artifact from the schema dict.
+
+        Returns:
+            The memoized artifact.
+        """
+        if name not in self.derived:
+            self.derived[name] = factory(self.schema)
+        return self.derived[name]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "schema_name": self.schema_name,
+            "fingerprint": self.fingerprint,
+            "schema": self.schema,
+            "loaded_at": self.loaded_at
+        }
+
+class SchemaCache:
+    """
+    Keeps one schema snapshot per database schema in memory (and optionally in Redis,
+    shared by all workers) and reloads it only when the catalog fingerprint changes.
+    """
+
+    def __init__(
+        self,
+        db: Optional[PostgresDB] = None,
+        redis_url: Optional[str] = None,
+        refresh_interval: float = 60.0,
+        redis_ttl: int = 7 * 24 * 60 * 60,
+        extractor: str = "catalog"
+    ):
+        """
+        Initializes the cache. No connection is opened until the first lookup.
+
+        Args:
+            db: Database to read the catalog from (default is a read replica, or the primary, chosen by db_router).
+            redis_url: Redis URL to share snapshots between workers (default: memory only).
+            refresh_interval: Seconds between background fingerprint checks.
+            redis_ttl: Seconds a snapshot is kept in Redis.
+            extractor: Extraction engine, "catalog" (pg_catalog) or "information_schema".
+        """
+        self._db = db
+        self.redis_client = redis.from_url(redis_url) if redis_url else None
+        self.refresh_interval = refresh_interval
+        self.redis_ttl = redis_ttl
+        self.extractor_class = EXTRACTORS[extractor]
+
+        self._snapshots: Dict[str, SchemaSnapshot] = {}
+        self._refresh_lock = threading.Lock()
+        self._async_refresh_lock = asyncio.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def db(self) -> PostgresDB:
+        return self._db or db_router.reader()
+
+    def fingerprint(self, schema_name: str = 'public', db: Optional[PostgresDB] = None) -> str:
+        """
+        Computes the catalog fingerprint of a schema.
+
+        Args:
+            schema_name: The schema to fingerprint.
+            db: Database to query (default: self.db).
+
+        Returns:
+            An md5 hex digest that changes whenever the schema's DDL changes.
+        """
+        with (db or self.db).get_cursor(cursor_factory=None) as cur:
+            cur.execute(FINGERPRINT_QUERY, {"schema": schema_name})
+            return cur.fetchone()[0]
+
+    def get_snapshot(self, schema_name: str = 'public') -> SchemaSnapshot:
+        """
+        Returns the cached snapshot, loading it on first use.
+
+        Args:
+            schema_name: The schema to look up.
+
+        Returns:
+            The current SchemaSnapshot.
+        """
+        snapshot = self._snapshots.get(schema_name)
+        if snapshot is not None:
+            return snapshot
+        return self.refresh(schema_name)
+
+    def get_schema(self, schema_name: str = 'public') -> Dict[str, Any]:
+        """
+        Drop-in replacement for SchemaExtractor.get_schema backed by the cache.
+
+        Args:
+            schema_name: The schema to look up.
+
+        Returns:
+            A dictionary containing the schema information.
+        """
+        return self.get_snapshot(schema_name).schema
+
+    def refresh(self, schema_name: str = 'public', force: bool = False) -> SchemaSnapshot:
+        """
+        Reloads a snapshot if the catalog fingerprint moved (or when forced).
+
+        Args:
+            schema_name: The schema to refresh.
+            force: Re-extract even if the fingerprint is unchanged.
+
+        Returns:
+            The up to date SchemaSnapshot.
+        """
+        with self._refresh_lock:
+            # Fingerprint and extraction read the same node
+            db = self.db
+            fingerprint = self.fingerprint(schema_name, db)
+            current = self._snapshots.get(schema_name)
+
+            if current is not None and current.fingerprint == fingerprint and not force:
+                return current
+
+            snapshot = None if force else self._load_shared(schema_name, fingerprint)
+            if snapshot is None:
+                started = time.perf_counter()
+                schema = self.extractor_class(db).get_schema(schema_name)
+                elapsed = time.perf_counter() - started
+                record_stage("schema_extraction", elapsed)
+                snapshot = SchemaSnapshot(schema_name, fingerprint, schema)
+                self._store_shared(snapshot)
+                logger.info(
+                    f"Schema '{schema_name}' extracted in {elapsed:.3f}s "
+                    f"({len(schema)} tables, fingerprint {fingerprint[:8]})"
+                )
+
+            self._snapshots[schema_name] = snapshot
+            return snapshot
+
+    async def aget_snapshot(self, schema_name: str = 'public') -> SchemaSnapshot:
+        """
+        Async variant of get_snapshot. A miss is loaded through asyncpg when the
+        catalog extractor is configured, otherwise in a worker thread.
+
+        Args:
+            schema_name: The schema to look up.
+
+        Returns:
+            The current SchemaSnapshot.
+        """
+        snapshot = self._snapshots.get(schema_name)
+        if snapshot is not None:
+            return snapshot
+
+        if self.extractor_class is not CatalogSchemaExtractor or self._db is not None:
+            return await asyncio.to_thread(self.refresh, schema_name)
+
+        async with self._async_refresh_lock:
+            snapshot = self._snapshots.get(schema_name)
+            if snapshot is not None:
+                return snapshot
+
+            db = db_router.async_reader()
+            rows = await db.fetch(FINGERPRINT_QUERY.replace("%(schema)s", "$1"), schema_name)
+            fingerprint = rows[0][0]
+
+            snapshot = await asyncio.to_thread(self._load_shared, schema_name, fingerprint)
+            if snapshot is None:
+                started = time.perf_counter()
+                schema = await CatalogSchemaExtractor().aget_schema(schema_name, db)
+                record_stage("schema_extraction", time.perf_counter() - started)
+                snapshot = SchemaSnapshot(schema_name, fingerprint, schema)
+                await asyncio.to_thread(self._store_shared, snapshot)
+
+            self._snapshots[schema_name] = snapshot
+            return snapshot
+
+    def invalidate(self, schema_name: Optional[str] = None) -> List[str]:
+        """
+        Drops cached snapshots so the next lookup re-extracts them. Other workers
+        pick the invalidation up on their next background check.
+
+        Args:
+            schema_name: The schema to invalidate (default: all cached schemas).
+
+        Returns:
+            The names of the invalidated schemas.
+        """
+        with self._refresh_lock:
+            names = [schema_name] if schema_name else list(self._snapshots)
+            for name in names:
+                self._snapshots.pop(name, None)
+
+            if self.redis_client:
+                try:
+                    now = time.time()
+                    for name in names:
+                        keys = list(self.redis_client.scan_iter(f"schema:{name}:snapshot:*"))
+                        if keys:
+                            self.redis_client.delete(*keys)
+                        self.redis_client.set(f"schema:{name}:invalidated_at", now, ex=self.redis_ttl)
+                except redis.RedisError as e:
+                    logger.error(f"Error invalidating shared schema cache: {e}")
+
+        logger.info(f"Schema cache invalidated: {names}")
+        return names
+
+    def warm(self, schema_names: List[str]) -> None:
+        """
+        Loads the given schemas ahead of the first request.
+
+        Args:
+            schema_names: Schemas to load.
+        """
+        for name in schema_names:
+            try:
+                self.refresh(name)
+            except Exception as e:
+                logger.error(f"Error warming schema cache for '{name}': {e}")
+
+    def start(self) -> None:
+        """
+        Starts the background thread that keeps cached snapshots fresh.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="schema-cache-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the background refresh thread.
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.refresh_interval)
+            self._thread = None
+
+    def _refresh_loop(self) -> None:
+        while not self._stop_event.wait(self.refresh_interval):
+            for name, snapshot in list(self._snapshots.items()):
+                try:
+                    self.refresh(name, force=self._invalidated_since(snapshot))
+                except Exception as e:
+                    logger.error(f"Error refreshing schema cache for '{name}': {e}")
+
+    def _invalidated_since(self, snapshot: SchemaSnapshot) -> bool:
+        if not self.redis_client:
+            return False
+        try:
+            invalidated_at = self.redis_client.get(f"schema:{snapshot.schema_name}:invalidated_at")
+            return invalidated_at is not None and float(invalidated_at) > snapshot.loaded_at
+        except redis.RedisError as e:
+            logger.error(f"Error reading schema invalidation marker: {e}")
+            return False
+
+    def _load_shared(self, schema_name: str, fingerprint: str) -> Optional[SchemaSnapshot]:
+        if not self.redis_client:
+            return None
+        try:
+            payload = self.redis_client.get(f"schema:{schema_name}:snapshot:{fingerprint}")
+            if not payload:
+                return None
+            return SchemaSnapshot(**json.loads(payload))
+        except (redis.RedisError, ValueError, TypeError) as e:
+            logger.error(f"Error loading shared schema snapshot: {e}")
+            return None
+
+    def _store_shared(self, snapshot: SchemaSnapshot) -> None:
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.setex(
+                f"schema:{snapshot.schema_name}:snapshot:{snapshot.fingerprint}",
+                self.redis_ttl,
+                json.dumps(snapshot.to_dict())
+            )
+        except redis.RedisError as e:
+            logger.error(f"Error storing shared schema snapshot: {e}")
+
+schema_cache: SchemaCache = SchemaCache(
+    redis_url=global_settings.REDIS_URI if global_settings.SCHEMA_CACHE_REDIS else None,
+    refresh_interval=global_settings.SCHEMA_CACHE_REFRESH_INTERVAL,
+    extractor=global_settings.SCHEMA_EXTRACTOR
+)
@@ -1,6 +1,5 @@
-from config import global_settings
-from typing import Dict, Any
-import psycopg2
+from ..services.pg_service import PostgresDB, get_db
+from typing import Dict, Any, Optional
 import json
 
 class SchemaExtractor:
@@ -8,39 +7,16 @@ class SchemaExtractor:
     A class to extract database schema information from a PostgreSQL database and save it to a JSON file.
     """
 
-    def __init__(self):
+    def __init__(self, db: Optional[PostgresDB] = None):
         """
-        Initializes the SchemaExtractor instance, setting up the connection parameters and cache.
-        """
-
-        self._schema_cache: Dict[str, Any] = {}
-        self.conn = None
-        self.cur = None
-        self.connection_string = f'postgresql://{global_settings.DB_USER}:{global_settings.DB_PASSWORD}@{global_settings.DB_HOST}:{global_settings.DB_PORT}/{global_settings.DB_NAME}'
-    
-    def _connect(self):
-        """
-        Establishes the connection to the PostgreSQL database.
-        
-        Raises:
-            Exception: If the connection to the database fails.
-        """
-
-        try:
-            self.conn = psycopg2.connect(self.connection_string)
-            self.cur = self.conn.cursor()
-        except Exception as e:
-            raise Exception(f"Connection error: {e}")
+        Initializes the SchemaExtractor instance, setting up the connection pool and cache.
 
-    def _disconnect(self):
-        """
-        Closes the database cursor and connection.
+        Args:
+            db: Database to read the catalog from (default is the shared application pool).
         """
 
-        if self.cur:
-            self.cur.close()
-        if self.conn:
-            self.conn.close()
+        self._schema_cache: Dict[str, Any] = {}
+        self.db = db or get_db()
 
     def get_schema(self, schema_name: str = 'public') -> Dict:
         """
@@ -57,8 +33,6 @@ class SchemaExtractor:
         """
 
         try:
-            self._connect()
-            
             schema_query = """
                 SELECT 
                     t.table_name,
@@ -82,9 +56,6 @@ class SchemaExtractor:
                     AND t.table_type = 'BASE TABLE'
                 ORDER BY t.table_name, c.ordinal_position;
             """
-            
-            self.cur.execute(schema_query, (schema_name,))
-            results = self.cur.fetchall()
 
             fk_query = """
                 SELECT
@@ -100,9 +71,13 @@ class SchemaExtractor:
                 WHERE tc.constraint_type = 'FOREIGN KEY'
                     AND tc.table_schema = %s;
             """
-            
-            self.cur.execute(fk_query, (schema_name,))
-            foreign_keys = self.cur.fetchall()
+
+            with self.db.get_cursor(cursor_factory=None) as cur:
+                cur.execute(schema_query, (schema_name,))
+                results = cur.fetchall()
+
+                cur.execute(fk_query, (schema_name,))
+                foreign_keys = cur.fetchall()
 
             schema = {}
             current_table = None
@@ -146,9 +121,6 @@ class SchemaExtractor:
 
         except Exception as e:
             raise Exception(f"Schema extraction error: {e}")
-        
-        finally:
-            self._disconnect()
 
     def save_schema_to_file(self, output_file: str, schema_name: str = 'public'):
         """
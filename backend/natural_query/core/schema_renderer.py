@@ -0,0 +1,168 @@
+from .schema_cache import SchemaSnapshot
+from typing import Dict, Any, Callable, List, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken missing or its encoding file not downloadable
+    _encoding = None
+
+TYPE_ALIASES = {
+    "character varying": "varchar",
+    "character": "char",
+    "timestamp without time zone": "timestamp",
+    "timestamp with time zone": "timestamptz",
+    "time without time zone": "time",
+    "time with time zone": "timetz",
+    "double precision": "float8",
+    "integer": "int",
+    "smallint": "int2",
+    "bigint": "int8",
+    "boolean": "bool"
+}
+
+def count_tokens(text: str) -> int:
+    """
+    Prompt size of a piece of text. Uses tiktoken's cl100k_base as a proxy for the
+    model tokenizer, or about four characters per token when tiktoken is unavailable.
+
+    Args:
+        text: Text to measure.
+
+    Returns:
+        Number of tokens.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+def _foreign_keys(definition: Dict[str, Any]) -> Dict[str, str]:
+    return {rel["from"]: rel["to"] for rel in definition.get("relationships", [])}
+
+def render_table_json(table: str, definition: Dict[str, Any]) -> str:
+    """
+    Legacy format: the Python dict repr that used to be pasted into the prompt.
+    """
+    return str({table: definition})
+
+def render_table_ddl(table: str, definition: Dict[str, Any]) -> str:
+    """
+    Compact DDL-style format, e.g. `orders(id int pk, customer_id int fk->customers.id) -- comment`.
+    """
+    foreign_keys = _foreign_keys(definition)
+    primary_key = set(definition.get("primary_key", []))
+    columns = []
+    for column, column_def in definition.get("columns", {}).items():
+        parts = [column, TYPE_ALIASES.get(column_def.get("type"), column_def.get("type"))]
+        if column in primary_key or "PRIMARY KEY" in column_def.get("constraints", []):
+            parts.append("pk")
+        if column in foreign_keys:
+            parts.append(f"fk->{foreign_keys[column]}")
+        if column_def.get("comment"):
+            parts.append(f"/*{column_def['comment']}*/")
+        columns.append(" ".join(parts))
+
+    line = f"{table}({', '.join(columns)})"
+    if definition.get("comment"):
+        line += f" -- {definition['comment']}"
+    return line
+
+def render_table_minimal(table: str, definition: Dict[str, Any]) -> str:
+    """
+    Minimal one-line format without types, e.g. `orders: id, customer_id->customers.id`.
+    """
+    foreign_keys = _foreign_keys(definition)
+    columns = [
+        f"{column}->{foreign_keys[column]}" if column in foreign_keys else column
+        for column in definition.get("columns", {})
+    ]
+    return f"{table}: {', '.join(columns)}"
+
+RENDERERS: Dict[str, Callable[[str, Dict[str, Any]], str]] = {
+    "json": render_table_json,
+    "ddl": render_table_ddl,
+    "minimal": render_table_minimal
+}
+
+def render_schema(schema: Dict[str, Any], fmt: str = "ddl") -> str:
+    """
+    Renders a schema dict for the prompt.
+
+    Args:
+        schema: Output of get_schema (or a pruned subset of it).
+        fmt: One of RENDERERS ("json", "ddl", "minimal").
+
+    Returns:
+        Schema text, one table per line (the "json" format keeps the legacy dict repr).
+    """
+    if fmt == "json":
+        return str(schema)
+    renderer = RENDERERS[fmt]
+    return "\n".join(renderer(table, definition) for table, definition in schema.items())
+
+def rendered_tables(snapshot: SchemaSnapshot, fmt: str = "ddl") -> Dict[str, str]:
+    """
+    Per-table rendering of a snapshot, computed once per snapshot and format.
+    """
+    renderer = RENDERERS[fmt]
+    return snapshot.derive(
+        f"rendered:{fmt}",
+        lambda schema: {table: renderer(table, definition) for table, definition in schema.items()}
+    )
+
+def table_token_costs(snapshot: SchemaSnapshot, fmt: str = "ddl") -> Dict[str, int]:
+    """
+    Prompt tokens of each rendered table, computed once per snapshot and format.
+    """
+    tables = rendered_tables(snapshot, fmt)
+    return snapshot.derive(
+        f"tokens:{fmt}",
+        lambda schema: {table: count_tokens(text) for table, text in tables.items()}
+    )
+
+def render_snapshot(snapshot: SchemaSnapshot, tables: Optional[List[str]] = None, fmt: str = "ddl") -> str:
+    """
+    Renders some (or all) tables of a snapshot from the precomputed per-table text.
+
+    Args:
+        snapshot: Cached schema snapshot.
+        tables: Tables to include (default: all of them).
+        fmt: One of RENDERERS.
+
+    Returns:
+        Schema text for the prompt.
+    """
+    if fmt == "json":
+        schema = snapshot.schema if tables is None else {table: snapshot.schema[table] for table in tables}
+        return render_schema(schema, fmt)
+
+    rendered = rendered_tables(snapshot, fmt)
+    return "\n".join(rendered[table] for table in (tables if tables is not None else rendered))
+
+def size_report(schema: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Characters and tokens of a schema in every format, relative to the legacy one.
+
+    Args:
+        schema: Output of get_schema.
+
+    Returns:
+        One row per format with chars, tokens and the token reduction vs "json".
+    """
+    rows = []
+    baseline = None
+    for fmt in RENDERERS:
+        text = render_schema(schema, fmt)
+        tokens = count_tokens(text)
+        baseline = baseline or tokens
+        rows.append({
+            "format": fmt,
+            "chars": len(text),
+            "tokens": tokens,
+            "reduction": 1 - tokens / baseline if baseline else 0.0
+        })
+    return rows
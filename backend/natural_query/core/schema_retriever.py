@@ -0,0 +1,263 @@
+from .schema_renderer import table_token_costs
+from .schema_cache import SchemaSnapshot
+from config import global_settings
+from collections import Counter, deque
+from typing import Dict, Any, List, Optional, Tuple
+import unicodedata
+import logging
+import math
+import re
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# English and Portuguese, accents folded as tokenize() folds them
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "did", "do", "does", "for", "from",
+    "give", "have", "how", "i", "in", "is", "it", "list", "many", "me", "much", "my",
+    "of", "on", "or", "our", "show", "tell", "that", "the", "their", "there", "this",
+    "to", "was", "we", "were", "what", "when", "where", "which", "who", "with", "you",
+    "o", "os", "um", "uma", "uns", "umas", "de", "da", "dos", "das", "no", "na",
+    "nos", "nas", "em", "por", "pelo", "pela", "pelos", "pelas", "para", "pra", "com", "sem",
+    "e", "ou", "que", "qual", "quais", "quanto", "quanta", "quantos", "quantas", "quando",
+    "onde", "como", "quem", "foi", "foram", "ser", "sao", "esta", "estao", "tem", "tinha",
+    "ha", "houve", "meu", "minha", "nosso", "nossa", "seu", "sua", "esse", "essa", "este",
+    "isso", "isto", "ao", "aos", "mostre", "mostrar", "liste", "listar", "diga"
+}
+
+# Field weights: a hit on the table name says more than a hit on a neighbour's name.
+TABLE_NAME_WEIGHT = 3
+COLUMN_NAME_WEIGHT = 1
+COMMENT_WEIGHT = 1
+NEIGHBOUR_WEIGHT = 1
+
+def _stem(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits identifiers and free text into lowercase, accent-folded, lightly stemmed
+    terms (snake_case, camelCase and punctuation all act as separators).
+
+    Args:
+        text: Question, identifier or comment.
+
+    Returns:
+        List of terms without stopwords.
+    """
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text or "")
+    # "preço" and "preco" are the same term; unfolded, accented words would split apart
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [
+        _stem(token)
+        for token in re.findall(r"[a-z0-9]+", text.lower())
+        if token not in STOPWORDS
+    ]
+
+def _table_target(reference: str) -> str:
+    # Relationship targets look like "table.column" or "schema.table.column".
+    return reference.rsplit(".", 1)[0]
+
+class SchemaRetriever:
+    """
+    Lexical BM25 index over the tables of a schema. Each table is a document made of its
+    name, column names, comments and the names of its foreign-key neighbours.
+    """
+
+    def __init__(self, schema: Dict[str, Any], k1: float = 1.5, b: float = 0.75):
+        """
+        Builds the index.
+
+        Args:
+            schema: Output of SchemaExtractor/CatalogSchemaExtractor.get_schema.
+            k1: BM25 term frequency saturation.
+            b: BM25 document length normalization.
+        """
+        self.schema = schema
+        self.k1 = k1
+        self.b = b
+
+        self.graph: Dict[str, set] = {table: set() for table in schema}
+        for table, definition in schema.items():
+            for relationship in definition.get("relationships", []):
+                target = _table_target(relationship["to"])
+                if target in self.graph and target != table:
+                    self.graph[table].add(target)
+                    self.graph[target].add(table)
+
+        self.term_freqs: Dict[str, Counter] = {}
+        for table, definition in schema.items():
+            terms = tokenize(table) * TABLE_NAME_WEIGHT
+            terms += tokenize(definition.get("comment", "")) * COMMENT_WEIGHT
+            for column, column_def in definition.get("columns", {}).items():
+                terms += tokenize(column) * COLUMN_NAME_WEIGHT
+                terms += tokenize(column_def.get("comment", "")) * COMMENT_WEIGHT
+            for neighbour in self.graph[table]:
+                terms += tokenize(neighbour) * NEIGHBOUR_WEIGHT
+            self.term_freqs[table] = Counter(terms)
+
+        self.doc_lengths = {table: sum(freqs.values()) for table, freqs in self.term_freqs.items()}
+        self.avg_doc_length = (sum(self.doc_lengths.values()) / len(schema)) if schema else 0.0
+
+        doc_freqs: Counter = Counter()
+        for freqs in self.term_freqs.values():
+            doc_freqs.update(freqs.keys())
+        total = len(schema)
+        self.idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+
+    def rank(self, question: str) -> List[Tuple[str, float]]:
+        """
+        Scores every table against a question.
+
+        Args:
+            question: Natural language question.
+
+        Returns:
+            (table, score) pairs with a positive score, best first.
+        """
+        terms = [term for term in tokenize(question) if term in self.idf]
+        scores = []
+        for table, freqs in self.term_freqs.items():
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[table] / (self.avg_doc_length or 1))
+            score = 0.0
+            for term in terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            if score > 0:
+                scores.append((table, score))
+        return sorted(scores, key=lambda item: item[1], reverse=True)
+
+    def join_path(self, source: str, targets: set, max_hops: int = 3) -> List[str]:
+        """
+        Shortest foreign-key path from a table to any of the target tables.
+
+        Args:
+            source: Table to start from.
+            targets: Tables already selected.
+            max_hops: Longest path considered.
+
+        Returns:
+            The intermediate tables on the path (empty when directly connected or unreachable).
+        """
+        queue = deque([(source, [])])
+        seen = {source}
+        while queue:
+            table, path = queue.popleft()
+            if len(path) > max_hops:
+                break
+            for neighbour in self.graph.get(table, ()):
+                if neighbour in targets:
+                    return path
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    queue.append((neighbour, path + [neighbour]))
+        return []
+
+    def select(self, question: str, top_k: int, token_budget: int,
+               table_costs: Dict[str, int], min_score_ratio: float = 0.3) -> List[str]:
+        """
+        Picks the tables a question needs: the top-k BM25 matches, each followed by the
+        tables joining it to the ones picked before, until the token budget is spent.
+
+        Args:
+            question: Natural language question.
+            top_k: Maximum number of directly matched tables.
+            token_budget: Maximum prompt tokens for the selected tables.
+            table_costs: Prompt tokens of each rendered table.
+            min_score_ratio: Matches scoring below this fraction of the best one are dropped.
+
+        Returns:
+            Selected table names in priority order (empty if nothing matched).
+        """
+        selected: List[str] = []
+        used_tokens = 0
+
+        ranked = self.rank(question)[:top_k]
+        threshold = ranked[0][1] * min_score_ratio if ranked else 0.0
+
+        for table, score in ranked:
+            if score < threshold:
+                break
+            if table in selected:
+                continue
+            candidates = self.join_path(table, set(selected)) if selected else []
+            for candidate in candidates + [table]:
+                if candidate in selected:
+                    continue
+                cost = table_costs[candidate]
+                if selected and used_tokens + cost > token_budget:
+                    return selected
+                selected.append(candidate)
+                used_tokens += cost
+
+        return selected
+
+    def fallback(self, token_budget: int, table_costs: Dict[str, int]) -> List[str]:
+        """
+        Tables for a question that matched nothing: the most connected ones (by
+        foreign-key degree) that fit in the token budget, so the model still sees
+        the core of the schema rather than all of it.
+
+        Args:
+            token_budget: Maximum prompt tokens for the selected tables.
+            table_costs: Prompt tokens of each rendered table.
+
+        Returns:
+            Selected table names, most connected first (at least one table).
+        """
+        ranked = sorted(self.schema, key=lambda table: (-len(self.graph[table]), table_costs[table], table))
+        selected: List[str] = []
+        used_tokens = 0
+        for table in ranked:
+            cost = table_costs[table]
+            if selected and used_tokens + cost > token_budget:
+                continue
+            selected.append(table)
+            used_tokens += cost
+        return selected
+
+def select_tables(snapshot: SchemaSnapshot, question: str,
+                  top_k: Optional[int] = None,
+                  token_budget: Optional[int] = None,
+                  fmt: Optional[str] = None) -> List[str]:
+    """
+    Prunes a schema snapshot down to the tables relevant to a question. Small schemas
+    get the full schema; questions that match nothing get the most connected tables
+    within the token budget.
+
+    Args:
+        snapshot: Cached schema snapshot.
+        question: Natural language question.
+        top_k: Directly matched tables to keep (default: SCHEMA_TOP_K).
+        token_budget: Prompt token budget for the schema (default: SCHEMA_TOKEN_BUDGET).
+        fmt: Prompt format the budget is measured in (default: SCHEMA_PROMPT_FORMAT).
+
+    Returns:
+        The selected table names, in priority order.
+    """
+    schema = snapshot.schema
+    top_k = top_k or global_settings.SCHEMA_TOP_K
+    token_budget = token_budget or global_settings.SCHEMA_TOKEN_BUDGET
+    costs = table_token_costs(snapshot, fmt or global_settings.SCHEMA_PROMPT_FORMAT)
+
+    if len(schema) <= global_settings.SCHEMA_FULL_MAX_TABLES and sum(costs.values()) <= token_budget:
+        return list(schema)
+
+    retriever = snapshot.derive("retriever", SchemaRetriever)
+    tables = retriever.select(question, top_k, token_budget, costs)
+    if not tables:
+        tables = retriever.fallback(token_budget, costs)
+        logger.info(f"No table matched the question, sending the {len(tables)}/{len(schema)} most connected tables")
+        return tables
+
+    logger.info(f"Schema pruned to {len(tables)}/{len(schema)} tables: {tables}")
+    return tables
@@ -0,0 +1,306 @@
+from .sql_validator import SqlSyntaxError, Token, tokenize
+from config import global_settings
+from typing import Dict, List, Optional, Tuple
+import unicodedata
+import hashlib
+import logging
+import redis
+import json
+import time
+import re
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# A leading "-" is a sign unless it follows a word or ")" ("10-5", "(a)-5" are differences)
+NUMBER_PATTERN = re.compile(r"(?:(?<![\w)])-)?(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+NUMBER_PLACEHOLDER = "<num>"
+# Bumped when normalization changes, so entries stored under the old rules are not matched
+KEY_VERSION = "v2"
+
+def normalize_question(question: str) -> Tuple[str, List[str]]:
+    """
+    Normalizes a question so trivially different phrasings share a cache entry:
+    accents, case, punctuation and whitespace are dropped and number literals
+    are replaced by a placeholder.
+
+    Args:
+        question: Natural language question.
+
+    Returns:
+        The normalized question and the number literals it contained, in order,
+        negative ones with their sign.
+    """
+    text = unicodedata.normalize("NFKD", question)
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower().replace("\u2212", "-")
+    numbers = NUMBER_PATTERN.findall(text)
+    text = NUMBER_PATTERN.sub(f" {NUMBER_PLACEHOLDER} ", text)
+    text = re.sub(r"[^\w<>]+", " ", text)
+    return " ".join(text.split()), numbers
+
+# Keywords that can sit next to a comparison without being a column
+NOT_COLUMNS = {
+    "and", "or", "not", "is", "null", "true", "false", "case", "when", "then", "else", "end",
+    "select", "where", "having", "on", "all", "any", "some", "in", "between", "like", "exists"
+}
+COMPARISONS = {"=", "<>", "!=", "<", ">", "<=", ">="}
+# Operators that make the literal part of a larger expression
+EXPRESSION_OPERATORS = {"+", "-", "*", "/", "%", "^", "||", "::"}
+
+def _placeholder(index: int) -> str:
+    return f"{{{{NUM_{index}}}}}"
+
+def _is_column(tokens: List[Token], index: int, step: int) -> bool:
+    """
+    Whether the operand next to a comparison, starting at index and read in the
+    direction of step, is a plain (possibly qualified) column reference.
+    """
+    if not 0 <= index < len(tokens):
+        return False
+    token = tokens[index]
+    if token.kind not in ("ident", "quoted_ident") or (token.kind == "ident" and token.value in NOT_COLUMNS):
+        return False
+    # Walk the qualifier chain (schema.table.column) to the operand's far end
+    while 0 <= index + 2 * step < len(tokens) and tokens[index + step].value == "." \
+            and tokens[index + 2 * step].kind in ("ident", "quoted_ident"):
+        index += 2 * step
+    beyond = tokens[index + step] if 0 <= index + step < len(tokens) else None
+    if beyond is None:
+        return True
+    # A name followed by "(" is a function call, and one next to an arithmetic operator is an expression
+    return beyond.value not in EXPRESSION_OPERATORS and not (step > 0 and beyond.value == "(")
+
+def _ends_operand(tokens: List[Token], index: int) -> bool:
+    return index >= len(tokens) or tokens[index].value not in EXPRESSION_OPERATORS | {"(", "."}
+
+def _negated(tokens: List[Token], index: int) -> Optional[Tuple[Token, int]]:
+    """
+    The signed literal when the number at index is negated right after a comparison
+    (`balance < -5`, also lexed as `<-` `5`), with the index of the comparison.
+    """
+    sign = tokens[index - 1] if index else None
+    number = tokens[index]
+    if sign is None or sign.kind != "op" or not sign.value.endswith("-") \
+            or sign.position + len(sign.value) != number.position:
+        return None
+    if sign.value[:-1]:
+        comparison, comparison_index = sign.value[:-1], index - 1
+    elif index >= 2 and tokens[index - 2].kind == "op":
+        comparison, comparison_index = tokens[index - 2].value, index - 2
+    else:
+        return None
+    if comparison not in COMPARISONS:
+        return None
+    return Token("number", "-" + number.value, number.position - 1), comparison_index
+
+def value_literals(sql: str) -> List[Token]:
+    """
+    Number literals of a query that sit in value positions: compared against a
+    column (`rn <= 10`, `10 > o.quantity`, `balance < -5`, the sign included) or
+    the count of LIMIT, OFFSET or FETCH.
+    Literals inside strings, ORDER BY/GROUP BY ordinals and constants within
+    expressions (`THEN 1`, `COUNT(1)`, `amount * 2`) are not.
+
+    Args:
+        sql: SQL text.
+
+    Returns:
+        The number tokens in value positions, or none when the SQL does not tokenize.
+    """
+    try:
+        tokens = tokenize(sql)
+    except SqlSyntaxError:
+        return []
+
+    literals = []
+    for index, token in enumerate(tokens):
+        if token.kind != "number":
+            continue
+        negated = _negated(tokens, index)
+        if negated is not None:
+            literal, comparison_index = negated
+            if _is_column(tokens, comparison_index - 1, -1) and _ends_operand(tokens, index + 1):
+                literals.append(literal)
+            continue
+        previous = tokens[index - 1] if index else None
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+        if previous is not None and previous.kind == "ident" and (
+            previous.value in ("limit", "offset")
+            or (previous.value in ("first", "next") and index >= 2 and tokens[index - 2].value == "fetch")
+        ):
+            value = _ends_operand(tokens, index + 1)
+        elif previous is not None and previous.kind == "op" and previous.value in COMPARISONS:
+            value = _is_column(tokens, index - 2, -1) and _ends_operand(tokens, index + 1)
+        elif following is not None and following.kind == "op" and following.value in COMPARISONS:
+            before = tokens[index - 1] if index else None
+            value = _is_column(tokens, index + 2, 1) and (before is None or before.value not in EXPRESSION_OPERATORS)
+        else:
+            value = False
+        if value:
+            literals.append(token)
+    return literals
+
+def to_template(sql: str, numbers: List[str]) -> Tuple[str, List[int]]:
+    """
+    Replaces the question's number literals in the SQL with positional placeholders,
+    so "top 10 products" and "top 5 products" reuse the same entry. Only literals in
+    value positions (see value_literals) are replaced, and only when each of them is
+    the single use of a number the question mentions once: anything else is
+    ambiguous and the SQL is kept as generated.
+
+    Args:
+        sql: Generated SQL.
+        numbers: Number literals of the question, in order (see normalize_question).
+
+    Returns:
+        The template and the indices of the question numbers it has placeholders for.
+    """
+    indices: Dict[str, int] = {}
+    for index, number in enumerate(numbers):
+        # A number the question mentions twice can not be told apart in the SQL
+        indices[number] = -1 if number in indices else index
+
+    replacements = []
+    for token in value_literals(sql):
+        index = indices.get(token.value)
+        if index is None:
+            continue
+        if index == -1 or any(used == index for _, used in replacements):
+            return sql, []
+        replacements.append((token, index))
+
+    template = sql
+    for token, index in sorted(replacements, key=lambda item: item[0].position, reverse=True):
+        template = template[:token.position] + _placeholder(index) + template[token.position + len(token.value):]
+    return template, sorted(index for _, index in replacements)
+
+def from_template(template: str, numbers: List[str]) -> str:
+    """
+    Fills a cached SQL template with the number literals of the current question.
+    """
+    for index, number in enumerate(numbers):
+        template = template.replace(_placeholder(index), number)
+    return template
+
+class SQLCache:
+    """
+    Redis cache of generated SQL keyed by the normalized question and the schema
+    fingerprint, with TTL expiry, an LRU bound on the number of entries and hit/miss counters.
+    """
+
+    def __init__(self, redis_url: str = global_settings.REDIS_URI,
+                 ttl: int = 24 * 60 * 60, max_entries: int = 10000):
+        """
+        Initializes the cache
+
+        Args:
+            redis_url: Redis connection URL
+            ttl: Seconds an entry lives without being used
+            max_entries: Entries kept before the least recently used ones are evicted
+        """
+        self.redis_client = redis.from_url(redis_url)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lru_key = "sqlcache:lru"
+        self.stats_key = "sqlcache:stats"
+
+    def _key(self, normalized: str, fingerprint: str) -> str:
+        digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        return f"sqlcache:{KEY_VERSION}:{fingerprint}:{digest}"
+
+    def get(self, question: str, fingerprint: str) -> Optional[str]:
+        """
+        Looks up the SQL generated earlier for an equivalent question.
+
+        Args:
+            question: Natural language question
+            fingerprint: Schema fingerprint the SQL must have been generated against
+
+        Returns:
+            The SQL with this question's numbers filled in, or None on a miss
+        """
+        normalized, numbers = normalize_question(question)
+        key = self._key(normalized, fingerprint)
+        try:
+            payload = self.redis_client.get(key)
+            entry = json.loads(payload) if payload else None
+            # Numbers without a placeholder are baked into the SQL and must match
+            if entry and not self._matches(entry, numbers):
+                entry = None
+            pipe = self.redis_client.pipeline(transaction=False)
+            if entry:
+                pipe.expire(key, self.ttl)
+                pipe.zadd(self.lru_key, {key: time.time()})
+                pipe.hincrby(self.stats_key, "hits", 1)
+            else:
+                pipe.hincrby(self.stats_key, "misses", 1)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"Error reading SQL cache: {e}")
+            return None
+
+        if not entry:
+            return None
+        return from_template(entry["sql"], numbers)
+
+    @staticmethod
+    def _matches(entry: Dict, numbers: List[str]) -> bool:
+        stored = entry.get("numbers")
+        if stored is None or len(stored) != len(numbers):
+            return False
+        templated = set(entry.get("templated", []))
+        return all(index in templated or stored[index] == number for index, number in enumerate(numbers))
+
+    def set(self, question: str, fingerprint: str, sql: str) -> None:
+        """
+        Stores the SQL generated for a question.
+
+        Args:
+            question: Natural language question
+            fingerprint: Schema fingerprint the SQL was generated against
+            sql: Generated SQL
+        """
+        normalized, numbers = normalize_question(question)
+        key = self._key(normalized, fingerprint)
+        template, templated = to_template(sql, numbers)
+        payload = json.dumps({
+            "question": normalized,
+            "sql": template,
+            "numbers": numbers,
+            "templated": templated,
+            "created_at": time.time()
+        })
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.setex(key, self.ttl, payload)
+            pipe.zadd(self.lru_key, {key: time.time()})
+            pipe.zcard(self.lru_key)
+            size = pipe.execute()[-1]
+
+            if size > self.max_entries:
+                evicted = [member for member, _ in self.redis_client.zpopmin(self.lru_key, size - self.max_entries)]
+                if evicted:
+                    self.redis_client.delete(*evicted)
+                    self.redis_client.hincrby(self.stats_key, "evictions", len(evicted))
+        except redis.RedisError as e:
+            logger.error(f"Error writing SQL cache: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Hit/miss/eviction counters and current number of entries.
+        """
+        try:
+            counters = {k.decode(): int(v) for k, v in self.redis_client.hgetall(self.stats_key).items()}
+            counters["entries"] = self.redis_client.zcard(self.lru_key)
+        except redis.RedisError as e:
+            logger.error(f"Error reading SQL cache stats: {e}")
+            return {}
+
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        counters["hit_rate"] = counters.get("hits", 0) / lookups if lookups else 0.0
+        return counters
+
+sql_cache: SQLCache = SQLCache(
+    ttl=global_settings.SQL_CACHE_TTL,
+    max_entries=global_settings.SQL_CACHE_MAX_ENTRIES
+)
@@ -0,0 +1,401 @@
+from dataclasses import dataclass, field
+from typing import Dict, Any, FrozenSet, List, Optional, Set, Tuple
+import logging
+import re
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# One alternation scanned at each position, first match wins; block comments (which
+# nest) are handled apart. Group names map to token kinds through TOKEN_KINDS.
+TOKEN_PATTERN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--[^\n]*)
+  | (?P<escape_string>[eE]'(?:[^'\\]|\\.|'')*')
+  | (?P<string>(?:[bBxXnN]|[uU]&)?'(?:[^']|'')*')
+  | (?P<dollar_string>\$(?P<tag>[A-Za-z_][A-Za-z_0-9]*|)\$.*?\$(?P=tag)\$)
+  | (?P<quoted_ident>(?:[uU]&)?"(?:[^"]|"")+")
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<param>\$\d+|%\(\w+\)s|%s)
+  | (?P<ident>[A-Za-z_\u0080-\uffff][A-Za-z_0-9$\u0080-\uffff]*)
+  | (?P<punct>::|[(),;.\[\]])
+  | (?P<op>[+\-*/<>=~!@\#%^&|`?:]+)
+""", re.VERBOSE | re.DOTALL)
+TOKEN_KINDS = {"escape_string": "string", "dollar_string": "string"}
+
+READ_STATEMENTS = {"select", "with", "values"}
+DATA_MODIFYING = {"insert", "update", "delete", "merge"}
+LOCKING = {"update", "share", "no", "key"}
+EXPLAIN_OPTIONS = {"analyze", "analyse", "verbose"}
+# Functions with side effects outside the transaction, that read the server's files
+# or that run SQL text of their own (which validation never sees)
+DENIED_FUNCTIONS = {
+    "pg_sleep", "pg_sleep_for", "pg_sleep_until", "pg_terminate_backend", "pg_cancel_backend",
+    "pg_reload_conf", "pg_rotate_logfile", "pg_read_file", "pg_read_binary_file", "pg_ls_dir",
+    "pg_stat_file", "set_config", "txid_current", "nextval", "setval",
+    "query_to_xml", "query_to_xml_and_xsd", "query_to_xmlschema"
+}
+# Whole families: large objects, dblink and advisory locks
+DENIED_FUNCTION_PREFIXES = ("lo_", "dblink", "pg_advisory", "pg_try_advisory")
+# Words that end a FROM item, so they are never read as a table alias
+CLAUSE_KEYWORDS = {
+    "where", "group", "having", "order", "limit", "offset", "fetch", "for", "window", "union",
+    "intersect", "except", "join", "inner", "left", "right", "full", "cross", "natural", "on",
+    "using", "lateral", "tablesample", "returning", "select", "from", "into", "with", "as", "and", "or"
+}
+
+class SqlSyntaxError(ValueError):
+    """
+    Raised when a query cannot be tokenized (unterminated string, comment or identifier).
+    """
+
+@dataclass
+class Token:
+    """
+    A lexical token. Unquoted identifiers and keywords are case-folded into value,
+    as PostgreSQL does; quoted identifiers keep their case.
+    """
+    kind: str
+    value: str
+    position: int
+
+@dataclass
+class SqlAnalysis:
+    """
+    Outcome of validating a query.
+    Attributes:
+        valid: The query is a single read-only statement (and matches the schema when one was given)
+        statement: Leading statement keyword ("select", "with", "values" or "explain")
+        reason: Why the query was rejected
+        tables: Tables referenced, as (schema or None, name)
+        ctes: Names defined by WITH
+        aliases: Table name or alias -> tables it stands for
+        columns: Qualified column references, as (qualifier, column)
+    """
+    valid: bool
+    statement: Optional[str] = None
+    reason: Optional[str] = None
+    tables: List[Tuple[Optional[str], str]] = field(default_factory=list)
+    ctes: Set[str] = field(default_factory=set)
+    aliases: Dict[str, Set[Tuple[Optional[str], str]]] = field(default_factory=dict, repr=False)
+    columns: List[Tuple[str, str]] = field(default_factory=list)
+
+def _block_comment_end(sql: str, start: int) -> int:
+    depth, position = 0, start
+    while position < len(sql):
+        if sql.startswith("/*", position):
+            depth += 1
+            position += 2
+        elif sql.startswith("*/", position):
+            depth -= 1
+            position += 2
+            if depth == 0:
+                return position
+        else:
+            position += 1
+    raise SqlSyntaxError(f"Unterminated comment at position {start}")
+
+def tokenize(sql: str) -> List[Token]:
+    """
+    Splits SQL into tokens, dropping whitespace and comments. String literals,
+    dollar-quoted bodies and quoted identifiers are single tokens, so nothing inside
+    them is ever read as a keyword.
+
+    Args:
+        sql: SQL text.
+
+    Returns:
+        The tokens in order.
+
+    Raises:
+        SqlSyntaxError: On an unterminated string, comment or quoted identifier.
+    """
+    tokens: List[Token] = []
+    position = 0
+    while position < len(sql):
+        if sql.startswith("/*", position):
+            position = _block_comment_end(sql, position)
+            continue
+
+        match = TOKEN_PATTERN.match(sql, position)
+        if match is None:
+            if sql[position] in "'\"$":
+                raise SqlSyntaxError(f"Unterminated literal at position {position}")
+            raise SqlSyntaxError(f"Unexpected character {sql[position]!r} at position {position}")
+
+        kind = TOKEN_KINDS.get(match.lastgroup, match.lastgroup)
+        text = match.group(0)
+        if kind == "ident":
+            tokens.append(Token(kind, text.lower(), position))
+        elif kind == "quoted_ident":
+            tokens.append(Token(kind, text[text.index('"') + 1:-1].replace('""', '"'), position))
+        elif kind not in ("space", "comment"):
+            tokens.append(Token(kind, text, position))
+        position = match.end()
+    return tokens
+
+def _is_denied_function(name: str) -> bool:
+    return name in DENIED_FUNCTIONS or name.startswith(DENIED_FUNCTION_PREFIXES)
+
+def _is_word(token: Optional[Token], *values: str) -> bool:
+    return token is not None and token.kind == "ident" and (not values or token.value in values)
+
+def _is_name(token: Optional[Token]) -> bool:
+    return token is not None and token.kind in ("ident", "quoted_ident")
+
+def _is_punct(token: Optional[Token], value: str) -> bool:
+    return token is not None and token.kind == "punct" and token.value == value
+
+class _Analyzer:
+    """
+    Single pass over the tokens of one query, tracking parentheses so FROM lists,
+    CTE definitions and subqueries are told apart from function arguments.
+    """
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.analysis = SqlAnalysis(valid=True)
+        self.matching: Dict[int, int] = {}
+
+    def at(self, index: int) -> Optional[Token]:
+        return self.tokens[index] if 0 <= index < len(self.tokens) else None
+
+    def reject(self, reason: str) -> SqlAnalysis:
+        self.analysis.valid = False
+        self.analysis.reason = reason
+        return self.analysis
+
+    def run(self) -> SqlAnalysis:
+        tokens = self.tokens
+        if not tokens:
+            return self.reject("Empty query")
+
+        start = 0
+        if _is_word(tokens[0], "explain"):
+            self.analysis.statement = "explain"
+            start = 1
+            if _is_punct(self.at(1), "("):
+                start = self._skip_parens(1)
+            while _is_word(self.at(start)) and self.at(start).value in EXPLAIN_OPTIONS:
+                start += 1
+
+        first = next((token for token in tokens[start:] if not _is_punct(token, "(")), None)
+        if not _is_word(first) or first.value not in READ_STATEMENTS:
+            return self.reject("Only SELECT queries are allowed")
+        self.analysis.statement = self.analysis.statement or first.value
+
+        # Each open parenthesis: (index, whether a SELECT started inside it)
+        frames: List[List[Any]] = [[-1, False]]
+        index = start
+        while index < len(tokens):
+            token = tokens[index]
+            previous = self.at(index - 1)
+
+            if token.kind == "punct":
+                if token.value == "(":
+                    frames.append([index, False])
+                elif token.value == ")":
+                    if len(frames) == 1:
+                        return self.reject(f"Unbalanced parenthesis at position {token.position}")
+                    self.matching[index] = frames.pop()[0]
+                elif token.value == ";":
+                    if len(frames) > 1:
+                        return self.reject(f"Unbalanced parenthesis at position {token.position}")
+                    if index + 1 < len(tokens):
+                        return self.reject("Multiple statements are not allowed")
+                index += 1
+                continue
+
+            if token.kind != "ident":
+                if token.kind == "quoted_ident":
+                    # "pg_sleep"(10) calls pg_sleep as well
+                    if _is_denied_function(token.value) and _is_punct(self.at(index + 1), "("):
+                        return self.reject(f"Function {token.value} is not allowed")
+                    self._column_reference(index)
+                index += 1
+                continue
+
+            word = token.value
+            if word in ("select", "values"):
+                frames[-1][1] = True
+            elif word in DATA_MODIFYING and self._starts_statement(previous):
+                return self.reject(f"Data-modifying statement ({word.upper()}) is not allowed")
+            elif word == "into":
+                return self.reject("SELECT INTO is not allowed")
+            elif word == "for" and _is_word(self.at(index + 1)) and self.at(index + 1).value in LOCKING:
+                return self.reject("Row locking clauses (FOR UPDATE/SHARE) are not allowed")
+            elif _is_denied_function(word) and _is_punct(self.at(index + 1), "("):
+                return self.reject(f"Function {word} is not allowed")
+            elif word == "as":
+                self._cte_definition(index)
+            elif word == "join" or (word == "from" and frames[-1][1] and not self._distinct_from(index)):
+                index = self._from_items(index + 1)
+                continue
+            else:
+                self._column_reference(index)
+            index += 1
+
+        if len(frames) > 1:
+            return self.reject("Unbalanced parenthesis")
+        return self.analysis
+
+    def _skip_parens(self, index: int) -> int:
+        depth = 0
+        while index < len(self.tokens):
+            if _is_punct(self.tokens[index], "("):
+                depth += 1
+            elif _is_punct(self.tokens[index], ")"):
+                depth -= 1
+                if depth == 0:
+                    return index + 1
+            index += 1
+        return index
+
+    @staticmethod
+    def _starts_statement(previous: Optional[Token]) -> bool:
+        # A statement begins the query, a parenthesis (CTE body, subquery) or follows a CTE list
+        return (
+            previous is None
+            or _is_punct(previous, "(") or _is_punct(previous, ")")
+            or _is_word(previous, "explain", *EXPLAIN_OPTIONS)
+        )
+
+    def _distinct_from(self, index: int) -> bool:
+        # IS [NOT] DISTINCT FROM compares values, it is not a FROM clause
+        return _is_word(self.at(index - 1), "distinct") and _is_word(self.at(index - 2), "is", "not")
+
+    def _cte_definition(self, index: int) -> None:
+        # name [(columns)] AS [NOT] [MATERIALIZED] (
+        after = index + 1
+        while _is_word(self.at(after), "not", "materialized"):
+            after += 1
+        if not _is_punct(self.at(after), "("):
+            return
+        name_index = index - 1
+        if _is_punct(self.at(name_index), ")") and name_index in self.matching:
+            name_index = self.matching[name_index] - 1
+        if _is_name(self.at(name_index)):
+            self.analysis.ctes.add(self.at(name_index).value)
+
+    def _qualified_name(self, index: int) -> Tuple[List[str], int]:
+        parts = [self.tokens[index].value]
+        index += 1
+        while _is_punct(self.at(index), ".") and _is_name(self.at(index + 1)):
+            parts.append(self.tokens[index + 1].value)
+            index += 2
+        return parts, index
+
+    def _from_items(self, index: int) -> int:
+        """
+        Reads the table references of a FROM list or JOIN, returning where to resume.
+        Subqueries and function calls are left to the main loop.
+        """
+        while True:
+            while _is_word(self.at(index), "only", "lateral"):
+                index += 1
+            if not _is_name(self.at(index)) or (_is_word(self.at(index)) and self.at(index).value in CLAUSE_KEYWORDS):
+                return index
+
+            parts, after = self._qualified_name(index)
+            if _is_punct(self.at(after), "(") or len(parts) > 2:
+                # Table function such as generate_series(...)
+                return index
+            table = (parts[0], parts[1]) if len(parts) == 2 else (None, parts[0])
+            self.analysis.tables.append(table)
+            self.analysis.aliases.setdefault(table[1], set()).add(table)
+
+            index = after
+            if _is_word(self.at(index), "as"):
+                index += 1
+            alias = self.at(index)
+            if _is_name(alias) and not (alias.kind == "ident" and alias.value in CLAUSE_KEYWORDS):
+                self.analysis.aliases.setdefault(alias.value, set()).add(table)
+                index += 1
+                if _is_punct(self.at(index), "("):
+                    index = self._skip_parens(index)
+
+            if not _is_punct(self.at(index), ","):
+                return index
+            index += 1
+
+    def _column_reference(self, index: int) -> None:
+        # qualifier.column, with the qualifier not itself qualified (schema.table.column is kept as table.column)
+        if _is_punct(self.at(index - 1), ".") or not _is_punct(self.at(index + 1), "."):
+            return
+        parts, _ = self._qualified_name(index)
+        if len(parts) >= 2 and not _is_punct(self.at(index + 2 * len(parts) - 1), "("):
+            self.analysis.columns.append((parts[-2], parts[-1]))
+
+def analyze(sql: str) -> SqlAnalysis:
+    """
+    Classifies a query in a single pass over its tokens: it must be one SELECT
+    (WITH, VALUES or EXPLAIN of one) with no data-modifying CTE, SELECT INTO, row
+    locking clause or side-effecting function. Keywords inside string literals,
+    comments and quoted identifiers, and names such as created_at, never count.
+
+    Args:
+        sql: SQL text.
+
+    Returns:
+        SqlAnalysis with the verdict and the tables and qualified columns referenced.
+    """
+    try:
+        tokens = tokenize(sql)
+    except SqlSyntaxError as e:
+        return SqlAnalysis(valid=False, reason=str(e))
+    return _Analyzer(tokens).run()
+
+def is_read_only(sql: str) -> bool:
+    """
+    Whether a query is a single read-only statement.
+    """
+    return analyze(sql).valid
+
+def schema_catalog(schema: Dict[str, Any]) -> Dict[str, FrozenSet[str]]:
+    """
+    Table name -> column names of an extracted schema, the form validate_sql checks against.
+    """
+    return {table: frozenset(definition.get("columns", {})) for table, definition in schema.items()}
+
+def validate_sql(sql: str, catalog: Optional[Dict[str, FrozenSet[str]]] = None,
+                 schema_name: str = 'public') -> SqlAnalysis:
+    """
+    Validates a query and, given the schema, the tables and qualified columns it
+    references, so a hallucinated name is reported without a database round trip.
+    Tables of other schemas (pg_catalog, information_schema...) and unqualified
+    columns are left to the database: telling the latter apart from output aliases
+    needs full name resolution.
+
+    Args:
+        sql: SQL text.
+        catalog: Table name -> column names (see schema_catalog), or None to skip the check.
+        schema_name: Schema the catalog describes.
+
+    Returns:
+        SqlAnalysis; reason names the unknown table or column when one is found.
+    """
+    analysis = analyze(sql)
+    if not analysis.valid or catalog is None:
+        return analysis
+
+    for table_schema, table in analysis.tables:
+        if table_schema not in (None, schema_name):
+            continue
+        if table in catalog or (table_schema is None and (table in analysis.ctes or table.startswith("pg_"))):
+            continue
+        analysis.valid = False
+        analysis.reason = f"Unknown table: {table}"
+        return analysis
+
+    for qualifier, column in analysis.columns:
+        tables = [
+            catalog[table] for table_schema, table in analysis.aliases.get(qualifier, ())
+            if table_schema in (None, schema_name) and table in catalog and table not in analysis.ctes
+        ]
+        if column == "*" or not tables or any(column in columns for columns in tables):
+            continue
+        analysis.valid = False
+        analysis.reason = f"Unknown column: {qualifier}.{column}"
+        return analysis
+
+    return analysis
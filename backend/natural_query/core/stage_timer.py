@@ -0,0 +1,142 @@
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+from .metrics import stage_errors_total, stage_seconds
+import asyncio
+import time
+
+# Stage running in the current context, labels the LLM calls made inside it
+current_stage: ContextVar[Optional[str]] = ContextVar("current_stage", default=None)
+# Timer of the request running in the current context, for stages timed deep in the call stack
+current_timer: ContextVar[Optional["StageTimer"]] = ContextVar("current_timer", default=None)
+
+class StageLimits:
+    """
+    Concurrency cap per stage name (the names StageTimer records), shared by the
+    requests that use the same instance: e.g. at most 4 LLM SQL generations and
+    8 database queries in flight across a batch.
+    """
+
+    def __init__(self, limits: Dict[str, int]):
+        """
+        Args:
+            limits: Stage name -> concurrent executions allowed
+        """
+        self.limits = dict(limits)
+        self._semaphores = {name: asyncio.Semaphore(limit) for name, limit in limits.items()}
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "StageLimits":
+        """
+        Parses "stage=limit,stage=limit" (the BATCH_STAGE_LIMITS format)
+        """
+        limits = {}
+        for item in spec.split(","):
+            if item.strip():
+                name, _, limit = item.partition("=")
+                limits[name.strip()] = int(limit)
+        return cls(limits)
+
+    def semaphore(self, name: str) -> Optional[asyncio.Semaphore]:
+        return self._semaphores.get(name)
+
+class StageTimer:
+    """
+    Wall-clock timings of the stages of one request. Stages may run concurrently;
+    each one records its own duration and total_ms is the request's wall time, so
+    the sum of the stages minus total_ms is the latency saved by overlapping them.
+    Every duration is also observed in the knai_stage_duration_seconds histogram.
+    """
+
+    def __init__(self, limits: Optional[StageLimits] = None):
+        """
+        Args:
+            limits: Concurrency caps applied to the async stages (default: none);
+                the wait for a slot is recorded as "<stage>_wait"
+        """
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.limits = limits
+        current_timer.set(self)
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Adds a duration to a stage (a stage that runs twice accumulates)
+        """
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        stage_seconds.observe(seconds, stage=name)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Times the body of a with block as a stage; an exception escaping it is
+        counted in knai_stage_errors_total
+        """
+        token = current_stage.set(name)
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            stage_errors_total.inc(stage=name)
+            raise
+        finally:
+            self.record(name, time.perf_counter() - started)
+            try:
+                current_stage.reset(token)
+            except ValueError:
+                # The body yielded from an async generator and resumed in another context
+                pass
+
+    @asynccontextmanager
+    async def astage(self, name: str):
+        """
+        Times the body of an async with block as a stage, once the stage's
+        concurrency limit (if any) lets it in
+        """
+        semaphore = self.limits.semaphore(name) if self.limits else None
+        if semaphore is None:
+            with self.stage(name):
+                yield
+            return
+
+        with self.stage(f"{name}_wait"):
+            await semaphore.acquire()
+        try:
+            with self.stage(name):
+                yield
+        finally:
+            semaphore.release()
+
+    def timed(self, name: str, function: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Calls a function and times it as a stage; usable as an executor task
+        """
+        with self.stage(name):
+            return function(*args, **kwargs)
+
+    async def atimed(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        """
+        Awaits a coroutine and times it as a stage; usable as an asyncio task
+        """
+        async with self.astage(name):
+            return await awaitable
+
+    def as_dict(self) -> Dict[str, float]:
+        """
+        Stage durations and the total so far, in milliseconds
+        """
+        timings = {f"{name}_ms": round(seconds * 1000, 2) for name, seconds in self.stages.items()}
+        timings["total_ms"] = round((time.perf_counter() - self.started) * 1000, 2)
+        return timings
+
+def record_stage(name: str, seconds: float) -> None:
+    """
+    Records a stage timed outside a StageTimer (e.g. schema extraction inside a
+    cache lookup): observed in the histogram and added to the current request's
+    timings, if any.
+    """
+    timer = current_timer.get()
+    if timer is not None:
+        timer.record(name, seconds)
+    else:
+        stage_seconds.observe(seconds, stage=name)
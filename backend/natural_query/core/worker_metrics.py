@@ -0,0 +1,121 @@
+from .metrics import MetricsRegistry, registry
+from config import global_settings
+from typing import Any, Dict, List, Optional
+import threading
+import logging
+import socket
+import redis
+import json
+import time
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Snapshots of a launch are kept this long after its last publish
+RETENTION_SECONDS = 24 * 60 * 60
+
+class WorkerMetrics:
+    """
+    Shares the metrics of the API workers of one instance through Redis, so /metrics
+    reports the instance whatever worker a scrape reaches. Each worker publishes its
+    registry's snapshot every interval seconds into a hash per instance; rendering
+    merges this worker's live state with the others' last snapshots.
+
+    Counters and histograms of every worker of the instance are summed, including
+    workers that exited: their last published totals stay, so the sums never go
+    down when a worker is restarted. Gauges (callback metrics) only count workers
+    that published within the last three intervals.
+    """
+
+    def __init__(self, metrics: MetricsRegistry, redis_url: str = global_settings.REDIS_URI,
+                 instance: Optional[str] = None, interval: float = 5.0):
+        """
+        Args:
+            metrics: Registry of this process
+            redis_url: Redis connection URL
+            instance: Name of the set of workers to merge, default is the host and parent process
+            interval: Seconds between two publications
+        """
+        self.registry = metrics
+        self.redis_client = redis.from_url(redis_url)
+        # Workers started by one uvicorn supervisor share its pid
+        self.instance = instance or f"{socket.gethostname()}:{os.getppid()}"
+        self.worker = str(os.getpid())
+        self.key = f"metrics:{self.instance}"
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def publish(self) -> None:
+        """
+        Stores this worker's snapshot
+        """
+        payload = json.dumps({"at": time.time(), "metrics": self.registry.snapshot()})
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hset(self.key, self.worker, payload)
+            pipe.expire(self.key, RETENTION_SECONDS)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"Error publishing worker metrics: {e}")
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        """
+        This worker's live snapshot and the other workers' published ones, gauges
+        of the workers that stopped publishing left out
+        """
+        snapshots = [self.registry.snapshot()]
+        try:
+            published = self.redis_client.hgetall(self.key)
+        except redis.RedisError as e:
+            logger.error(f"Error reading worker metrics, serving this worker's only: {e}")
+            return snapshots
+
+        fresh_after = time.time() - 3 * self.interval
+        for worker, payload in published.items():
+            if worker.decode() == self.worker:
+                continue
+            entry = json.loads(payload)
+            metrics = entry["metrics"]
+            if entry["at"] < fresh_after:
+                metrics = {name: state for name, state in metrics.items() if not self.registry.is_callback(name)}
+            snapshots.append(metrics)
+        return snapshots
+
+    def render(self) -> str:
+        """
+        The instance's metrics in the Prometheus text format
+        """
+        return self.registry.render(self.snapshots())
+
+    def start(self) -> None:
+        """
+        Starts publishing in the background
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._publish_loop, name="worker-metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops publishing, after a last snapshot with this worker's final totals
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval)
+            self._thread = None
+            self.publish()
+
+    def _publish_loop(self) -> None:
+        self.publish()
+        while not self._stop_event.wait(self.interval):
+            self.publish()
+
+worker_metrics: WorkerMetrics = WorkerMetrics(
+    registry,
+    instance=global_settings.METRICS_INSTANCE or None,
+    interval=global_settings.METRICS_PUBLISH_INTERVAL
+)
@@ -1,13 +1,28 @@
 from fastapi import APIRouter, HTTPException
+from sse_starlette.sse import EventSourceResponse
 from config import global_settings
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
-from .service import ConversationManager, KNAIService
+from typing import Dict, Any, List, Optional
+from .service import ConversationManager, AsyncConversationManager, KNAIService
+from .core.stage_timer import StageLimits
+from .core.schema_cache import schema_cache
+from .core.sql_cache import sql_cache
+from .core.result_cache import result_cache
+from .core.job_manager import JobManager, JobQueueFullError, TERMINAL, SUCCEEDED
+import json
 
 router = APIRouter()
 
 conversation_manager = ConversationManager(redis_url=global_settings.REDIS_URI)
-knai_service = KNAIService(conversation_manager)
+async_conversation_manager = AsyncConversationManager(redis_url=global_settings.REDIS_URI)
+knai_service = KNAIService(conversation_manager, async_conversation_manager)
+job_manager = JobManager(
+    knai_service.process_query,
+    redis_url=global_settings.REDIS_URI,
+    workers=global_settings.JOB_WORKERS,
+    ttl=global_settings.JOB_TTL,
+    max_queued=global_settings.JOB_MAX_QUEUED
+)
 
 class QueryRequest(BaseModel):
     query: str
@@ -17,11 +32,15 @@ class QueryResponse(BaseModel):
     status: str
     response: Dict[str, Any]
 
+class BatchRequest(BaseModel):
+    questions: List[str]
+    max_concurrency: Optional[int] = None
+
 @router.post('/', response_model=QueryResponse)
-def process_query(request: QueryRequest):
+async def process_query(request: QueryRequest):
     """Process a natural language query and return the results"""
     try:
-        result = knai_service.process_query(
+        result = await knai_service.aprocess_query(
             request.query,
             conversation_id=request.conversation_id
         )
@@ -32,4 +51,155 @@ def process_query(request: QueryRequest):
             response={
                 "message": str(e)
             }
-        )
\ No newline at end of file
+        )
+
+@router.post('/stream')
+async def stream_query(request: QueryRequest):
+    """
+    Process a natural language query, sending each stage as a Server-Sent Event:
+    classification, sql, result, token (answer text chunks) and finally done or error
+    """
+    async def events():
+        async for event, data in knai_service.astream_query(
+            request.query,
+            conversation_id=request.conversation_id
+        ):
+            yield {"event": event, "data": json.dumps(data, default=str)}
+
+    return EventSourceResponse(events())
+
+@router.post('/batch', response_model=QueryResponse)
+async def process_batch(request: BatchRequest):
+    """
+    Process several natural language queries at once: duplicates run once and the
+    questions share a bounded worker pool with per-stage concurrency limits
+    """
+    if not request.questions or len(request.questions) > global_settings.BATCH_MAX_QUESTIONS:
+        return QueryResponse(
+            status="error",
+            response={
+                "message": f"A batch must have between 1 and {global_settings.BATCH_MAX_QUESTIONS} questions"
+            }
+        )
+
+    try:
+        max_concurrency = min(
+            request.max_concurrency or global_settings.BATCH_CONCURRENCY,
+            global_settings.BATCH_CONCURRENCY
+        )
+        return await knai_service.aprocess_batch(
+            request.questions,
+            max_concurrency=max(1, max_concurrency),
+            limits=StageLimits.from_spec(global_settings.BATCH_STAGE_LIMITS)
+        )
+    except Exception as e:
+        return QueryResponse(
+            status="error",
+            response={
+                "message": str(e)
+            }
+        )
+
+@router.post('/jobs', response_model=QueryResponse)
+def submit_job(request: QueryRequest):
+    """
+    Queue a natural language query for background processing and return its job at once;
+    follow it with GET /jobs/{job_id}, /jobs/{job_id}/events or /jobs/{job_id}/result
+    """
+    try:
+        return QueryResponse(
+            status="success",
+            response=job_manager.submit(request.query, conversation_id=request.conversation_id)
+        )
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        return QueryResponse(
+            status="error",
+            response={
+                "message": str(e)
+            }
+        )
+
+def _get_job(job_id: str) -> Dict[str, Any]:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@router.get('/jobs/{job_id}', response_model=QueryResponse)
+def get_job(job_id: str):
+    """Status of a background job, with its result or error once finished"""
+    return QueryResponse(status="success", response=_get_job(job_id))
+
+@router.get('/jobs/{job_id}/result', response_model=QueryResponse)
+def get_job_result(job_id: str):
+    """
+    Result of a background job in the shape of the synchronous endpoint; an error while
+    the job is still queued or running
+    """
+    job = _get_job(job_id)
+    if job["status"] == SUCCEEDED:
+        return QueryResponse(status="success", response=job["result"])
+    if job["status"] in TERMINAL:
+        return QueryResponse(
+            status="error",
+            response=job.get("error") or {"message": f"Job {job['status']}"}
+        )
+    return QueryResponse(
+        status="error",
+        response={
+            "message": f"Job is {job['status']}",
+            "job_status": job["status"]
+        }
+    )
+
+@router.get('/jobs/{job_id}/events')
+async def job_events(job_id: str):
+    """Server-Sent Events with the job's state on every status change until it finishes"""
+    if await job_manager.aget(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    async def events():
+        async for job in job_manager.aevents(job_id):
+            yield {"event": job["status"], "data": json.dumps(job, default=str)}
+
+    return EventSourceResponse(events())
+
+@router.post('/jobs/{job_id}/cancel', response_model=QueryResponse)
+def cancel_job(job_id: str):
+    """Cancel a background job, including the SQL it is running"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return QueryResponse(status="success", response=job)
+
+@router.post('/schema/invalidate', response_model=QueryResponse)
+def invalidate_schema_cache(schema_name: Optional[str] = None):
+    """Drop cached schema snapshots so the next query re-extracts the catalog"""
+    try:
+        invalidated = schema_cache.invalidate(schema_name)
+        return QueryResponse(
+            status="success",
+            response={
+                "invalidated": invalidated
+            }
+        )
+    except Exception as e:
+        return QueryResponse(
+            status="error",
+            response={
+                "message": str(e)
+            }
+        )
+
+@router.get('/cache/stats', response_model=QueryResponse)
+def get_cache_stats():
+    """Hit/miss counters of the question -> SQL and result caches"""
+    return QueryResponse(
+        status="success",
+        response={
+            "sql_cache": sql_cache.stats(),
+            "result_cache": result_cache.stats()
+        }
+    )
\ No newline at end of file
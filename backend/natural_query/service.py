@@ -1,16 +1,35 @@
-from .tools import sql_generator, execute_query
+from .tools import sql_generator, run_query, asql_generator, arun_query, observe_outcome
+from .core.schema_cache import schema_cache
+from .core.sql_cache import normalize_question, sql_cache
+from .core.question_classifier import get_question_classifier
+from .core.stage_timer import StageLimits, StageTimer
+from .core.result_profiler import result_for_prompt
+from .core.job_manager import JobCancelledError
+from .core.llm_scheduler import BATCH, llm_priority
+from .core.metrics import cache_requests_total, stage_errors_total, track_request, track_stream
+from concurrent.futures import ThreadPoolExecutor
 from .services.llm_service import llmService
 from dataclasses import dataclass, field
 from config import global_settings
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 import logging
+import redis.asyncio as aioredis
+import contextvars
+import asyncio
 import uuid
+import time
 import redis
 import json
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+
+# Runs speculative SQL generation next to the LLM classification on the sync path
+speculation_executor = ThreadPoolExecutor(
+    max_workers=global_settings.SPECULATIVE_SQL_WORKERS,
+    thread_name_prefix="speculative-sql"
+)
  
 @dataclass
 class Message:
@@ -18,18 +37,52 @@ class Message:
     content: str
     timestamp: float = field(default_factory=lambda: datetime.now().timestamp())
 
+CONVERSATION_KEY_PREFIX = "conv:"
+
+def _conversation_key(conversation_id: str) -> str:
+    return f"{CONVERSATION_KEY_PREFIX}{conversation_id}"
+
+def _encode_messages(messages: List[Tuple[str, str]]) -> List[str]:
+    return [json.dumps(Message(role=role, content=content).__dict__) for role, content in messages]
+
+def _decode_messages(items: List[bytes]) -> List[Dict]:
+    return [json.loads(item) for item in items]
+
+def _history_range(last_n: Optional[int]) -> Tuple[int, int]:
+    # LRANGE bounds of the tail to fetch: only the needed messages cross the network
+    return (-last_n if last_n else 0), -1
+
+def _is_legacy_value(error: Exception) -> bool:
+    # Conversations written before the list layout are JSON strings under the same key
+    return isinstance(error, redis.ResponseError) and "WRONGTYPE" in str(error)
+
+def _migrated(raw: Optional[bytes], max_messages: int) -> List[str]:
+    history = json.loads(raw) if raw else []
+    return [json.dumps(message) for message in history[-max_messages:]]
+
 class ConversationManager:
+    """
+    Conversation history stored as one Redis list per conversation (conv:{id}),
+    one JSON message per element. Appending is a single RPUSH/LTRIM/EXPIRE
+    transaction, so its cost does not depend on the conversation length and
+    concurrent requests on a conversation never overwrite each other's messages.
+    """
     
-    def __init__(self, redis_url: str = global_settings.REDIS_URI):
+    def __init__(self, redis_url: str = global_settings.REDIS_URI,
+                 conversation_ttl: int = global_settings.CONVERSATION_TTL,
+                 max_messages: int = global_settings.CONVERSATION_MAX_MESSAGES):
         """
         Initialize the manager converse
         
         Args:
             redis_url: Redis connection URL
+            conversation_ttl: Seconds a conversation is kept after its last message
+            max_messages: Most recent messages kept per conversation
         """
         try:
             self.redis_client = redis.from_url(redis_url)
-            self.conversation_ttl = 24 * 60 * 60  # 24 horas em segundos
+            self.conversation_ttl = conversation_ttl
+            self.max_messages = max_messages
         except redis.RedisError as e:
             logger.error(f"Failed to initialize Redis connection: {e}")
             raise
@@ -53,22 +106,36 @@ class ConversationManager:
             role: Role emissor ('user' ou 'assistant')
             content: Message Content
         """
+        self.add_messages(conversation_id, [(role, content)])
+
+    def add_messages(self, conversation_id: str, messages: List[Tuple[str, str]]) -> None:
+        """
+        Appends messages to the conversation history in one round trip
+        
+        Args:
+            conversation_id: Conversation ID
+            messages: (role, content) pairs, in order
+        """
+        key = _conversation_key(conversation_id)
         try:
-            message = Message(role=role, content=content)
-            
-            history = self.get_conversation_history(conversation_id) or []
-            
-            history.append(message.__dict__)
-            
-            self.redis_client.setex(
-                f"conv:{conversation_id}",
-                self.conversation_ttl,
-                json.dumps(history)
-            )
+            try:
+                self._append(key, messages)
+            except redis.ResponseError as e:
+                if not _is_legacy_value(e):
+                    raise
+                self.migrate(conversation_id)
+                self._append(key, messages)
         except Exception as e:
             logger.error(f"Error adding message to conversation {conversation_id}: {e}")
             raise
 
+    def _append(self, key: str, messages: List[Tuple[str, str]]) -> None:
+        pipeline = self.redis_client.pipeline(transaction=True)
+        pipeline.rpush(key, *_encode_messages(messages))
+        pipeline.ltrim(key, -self.max_messages, -1)
+        pipeline.expire(key, self.conversation_ttl)
+        pipeline.execute()
+
     def get_conversation_history(self, conversation_id: str, 
                                last_n: Optional[int] = None) -> List[Dict]:
         """
@@ -81,59 +148,373 @@ class ConversationManager:
         Returns:
             List of historical messages
         """
+        key = _conversation_key(conversation_id)
         try:
-            history_json = self.redis_client.get(f"conv:{conversation_id}")
+            try:
+                items = self.redis_client.lrange(key, *_history_range(last_n))
+            except redis.ResponseError as e:
+                if not _is_legacy_value(e):
+                    raise
+                self.migrate(conversation_id)
+                items = self.redis_client.lrange(key, *_history_range(last_n))
+            return _decode_messages(items)
+        except Exception as e:
+            logger.error(f"Error retrieving conversation history for {conversation_id}: {e}")
+            return []
+
+    def migrate(self, conversation_id: str) -> bool:
+        """
+        Converts a conversation stored as a JSON string into the list layout,
+        keeping its remaining TTL. Safe to run concurrently with requests.
+        
+        Args:
+            conversation_id: Conversation ID
             
-            if not history_json:
-                return []
-                
-            history = json.loads(history_json)
+        Returns:
+            bool: True if the key was converted here
+        """
+        key = _conversation_key(conversation_id)
+        with self.redis_client.pipeline() as pipeline:
+            try:
+                pipeline.watch(key)
+                if pipeline.type(key) != b"string":
+                    return False
+                raw = pipeline.get(key)
+                ttl = pipeline.ttl(key)
+                items = _migrated(raw, self.max_messages)
+
+                pipeline.multi()
+                pipeline.delete(key)
+                if items:
+                    pipeline.rpush(key, *items)
+                    pipeline.expire(key, ttl if ttl > 0 else self.conversation_ttl)
+                pipeline.execute()
+            except redis.WatchError:
+                # Another worker migrated (or wrote) the key first
+                return False
+
+        logger.info(f"Conversation {conversation_id} migrated to the list layout ({len(items)} messages)")
+        return True
+
+    def migrate_all(self, batch_size: int = 500) -> Dict[str, int]:
+        """
+        Converts every conversation still stored as a JSON string
+        
+        Args:
+            batch_size: Keys requested per SCAN call
             
-            if last_n:
-                return history[-last_n:]
-            return history
+        Returns:
+            Dict[str, int]: Keys scanned and keys migrated
+        """
+        scanned = migrated = 0
+        for key in self.redis_client.scan_iter(match=f"{CONVERSATION_KEY_PREFIX}*", count=batch_size, _type="string"):
+            scanned += 1
+            migrated += self.migrate(key.decode()[len(CONVERSATION_KEY_PREFIX):])
+        return {"scanned": scanned, "migrated": migrated}
+
+class AsyncConversationManager:
+    """
+    redis.asyncio counterpart of ConversationManager for the async request path.
+    Uses the same keys and layout, so both managers see the same conversations.
+    """
+
+    def __init__(self, redis_url: str = global_settings.REDIS_URI,
+                 conversation_ttl: int = global_settings.CONVERSATION_TTL,
+                 max_messages: int = global_settings.CONVERSATION_MAX_MESSAGES):
+        """
+        Initialize the manager converse
+        
+        Args:
+            redis_url: Redis connection URL
+            conversation_ttl: Seconds a conversation is kept after its last message
+            max_messages: Most recent messages kept per conversation
+        """
+        try:
+            self.redis_client = aioredis.from_url(redis_url)
+            self.conversation_ttl = conversation_ttl
+            self.max_messages = max_messages
+        except redis.RedisError as e:
+            logger.error(f"Failed to initialize Redis connection: {e}")
+            raise
+
+    def create_conversation(self) -> str:
+        """
+        Create a new conversation
+        
+        Returns:
+            str: Unic ID
+        """
+        return str(uuid.uuid4())
+
+    async def add_message(self, conversation_id: str, role: str, content: str) -> None:
+        """
+        Add a message to conversational historic
+        
+        Args:
+            conversation_id: Conversation ID
+            role: Role emissor ('user' ou 'assistant')
+            content: Message Content
+        """
+        await self.add_messages(conversation_id, [(role, content)])
+
+    async def add_messages(self, conversation_id: str, messages: List[Tuple[str, str]]) -> None:
+        """
+        Appends messages to the conversation history in one round trip
+        
+        Args:
+            conversation_id: Conversation ID
+            messages: (role, content) pairs, in order
+        """
+        key = _conversation_key(conversation_id)
+        try:
+            try:
+                await self._append(key, messages)
+            except redis.ResponseError as e:
+                if not _is_legacy_value(e):
+                    raise
+                await self.migrate(conversation_id)
+                await self._append(key, messages)
+        except Exception as e:
+            logger.error(f"Error adding message to conversation {conversation_id}: {e}")
+            raise
+
+    async def _append(self, key: str, messages: List[Tuple[str, str]]) -> None:
+        pipeline = self.redis_client.pipeline(transaction=True)
+        pipeline.rpush(key, *_encode_messages(messages))
+        pipeline.ltrim(key, -self.max_messages, -1)
+        pipeline.expire(key, self.conversation_ttl)
+        await pipeline.execute()
+
+    async def get_conversation_history(self, conversation_id: str, 
+                                       last_n: Optional[int] = None) -> List[Dict]:
+        """
+        Recover the conversation history
+        
+        Args:
+            conversation_id: Conversation ID
+            last_n: Optional parameter
+            
+        Returns:
+            List of historical messages
+        """
+        key = _conversation_key(conversation_id)
+        try:
+            try:
+                items = await self.redis_client.lrange(key, *_history_range(last_n))
+            except redis.ResponseError as e:
+                if not _is_legacy_value(e):
+                    raise
+                await self.migrate(conversation_id)
+                items = await self.redis_client.lrange(key, *_history_range(last_n))
+            return _decode_messages(items)
         except Exception as e:
             logger.error(f"Error retrieving conversation history for {conversation_id}: {e}")
             return []
 
+    async def migrate(self, conversation_id: str) -> bool:
+        """
+        Async variant of ConversationManager.migrate.
+        """
+        key = _conversation_key(conversation_id)
+        async with self.redis_client.pipeline() as pipeline:
+            try:
+                await pipeline.watch(key)
+                if await pipeline.type(key) != b"string":
+                    return False
+                raw = await pipeline.get(key)
+                ttl = await pipeline.ttl(key)
+                items = _migrated(raw, self.max_messages)
+
+                pipeline.multi()
+                pipeline.delete(key)
+                if items:
+                    pipeline.rpush(key, *items)
+                    pipeline.expire(key, ttl if ttl > 0 else self.conversation_ttl)
+                await pipeline.execute()
+            except redis.WatchError:
+                return False
+
+        logger.info(f"Conversation {conversation_id} migrated to the list layout ({len(items)} messages)")
+        return True
+
+    async def close(self) -> None:
+        """
+        Closes the Redis connection pool
+        """
+        await self.redis_client.aclose()
+
 class KNAIService:
     """
     A service class for processing natural language queries and generating insights or SQL queries.
     """
     
-    def __init__(self, conversation_manager: ConversationManager):
+    def __init__(self, conversation_manager: ConversationManager,
+                 async_conversation_manager: Optional[AsyncConversationManager] = None):
         """
         Initializes the KNAIService instance, setting up the LLM instance and query history.
+
+        Args:
+            conversation_manager: History store used by process_query
+            async_conversation_manager: History store used by aprocess_query
         """
         self.instance_llm = llmService.getwatson_llm()
         self.conversation_manager = conversation_manager
+        self.async_conversation_manager = async_conversation_manager
+
+
+    def _verification_prompt(self, question: str) -> str:
+        """
+        Prompt that classifies a query as "sql_request" or "casual_interaction".
+        """
+        return f"""
+            <|system|>
+                You are an assistant specialized in determining whether a query is a data request or a casual interaction with the user. Your task is to analyze the query and return one of the following fixed responses to classify the query:
+                If the query is a data request (e.g., "What's the most expensive product?", "How many sales did we have today?", etc.), return: "sql_request"
+                If the query is a casual interaction, such as a greeting or thank you (e.g., "hi", "thanks", "good afternoon", etc.), return: "casual_interaction"
+
+                Important: Only return "sql_request" or "casual_interaction" and nothing else. Do not provide explanations or additional context. Simply classify the query according to the examples above.
 
+            <|user|> 
+                {question}
 
-    def _verify_question(self, question: str) -> str:
+            <|assistant|>
         """
-        Verifies whether a query is a data request or a casual interaction.
+
+    def _answer_prompt(self, context_messages: List[str], question: str) -> str:
+        """
+        Prompt for a conversational answer over the last 10 context messages.
+        """
+        context = "\n".join(context_messages[-10:])
+
+        return f"""
+            <|context|>
+                {context}
+
+            <|user|> 
+                {question}
+
+            <|role|>
+                Your main function is to answer about product, sales and extract insight of data. 
+                We are a enterprise with AI Engineers, Designers and Developers that are together
+                to delivery critical resources to solve business problems with Generative AI and innovative tools
+                We born in 2025 with main idea to solve business problemas with IBM resources
+                
+            <|system|>
+                Your name is KNAI Assistant, if is your first message with the user, try to explain about your COMPANY,
+                you work for this guys:
+                    - Ivisson is the AI Developer, kindness guy :)
+                    - Giu is an AI Engineer, big engineer building a solid career
+                    - Marcos is our amazing frontender
+                    - Dani is our AI Researcher that drive the business model
+                    - Xoto (Hugo) is the designer tha created our visual identity
+                    - Edson is our AI Engineer.
+                Respond in a friendly, conversational tone to the user query based on the provided context.
+            
+            <|assistant|>
+        """
+
+    def _prompt_result(self, query_result: str) -> Tuple[str, bool]:
+        """
+        The query result as it goes into the insight prompt: large results are replaced
+        by a statistical profile and a sample within RESULT_PROMPT_TOKEN_BUDGET.
+
+        Returns:
+            The text for the prompt and whether it is a summary.
+        """
+        if not global_settings.RESULT_SUMMARY_ENABLED:
+            return query_result, False
+        return result_for_prompt(
+            query_result,
+            global_settings.RESULT_PROMPT_TOKEN_BUDGET,
+            sample_size=global_settings.RESULT_SAMPLE_ROWS,
+            top_k=global_settings.RESULT_TOP_K
+        )
+
+    def _insight_prompt(self, sql_query: str, query_result: str, truncated: bool = False,
+                        summarized: bool = False) -> str:
+        """
+        Prompt that turns a query and its result into insights.
+        """
+        context = f"""<user query> {sql_query} 
+                    <result query> {query_result}"""
+        if summarized:
+            context += """
+                    <note> The result is too large to show: it is given as per-column statistics, trends over time and a sample of rows."""
+        if truncated:
+            context += """
+                    <note> The result was truncated: only the first rows are shown, totals over them are partial."""
+        
+        return f"""
+            <|context|>
+                {context}
+
+            <|system|>
+                You received a JSON result with a question and an answer. You are an expert data analyst
+                with extensive experience in extracting insight and providing strategic recommendations. 
+                Your main task is to analyze the provided data comprehensively and generate actionable insights in a human-friendly response.
+                Use the query result to explain any key patterns, trends, and insights that can be derived from the data.
+        
+            <|example|>
+                <user> What are the main factors driving the drop in our Sales Revenue this week?
+                <result query> sales_revenue\tpercentage_down\tsales_date_time\n9.7M\t4%\t2025-22-02\n11M\t12%\t2025-18-02
+                <assistant> 
+                 Sales revenue has decreased by 4%, with a total of 9.7M in revenue this week, down from 11M the previous week (a decrease of 1.3M). Key contributing factors include:
+        
+                    1. A 12% drop in sales revenue from 11M to 9.7M over the past week, signaling a decline in overall sales performance.
+                    2. A reduction in user engagement, particularly from paid ads. The number of users driven by paid ads decreased by 17%, from 250k to 147k, leading to a loss of 138k in revenue.
+                    
+                    Recommendations:
+                    - Investigate the effectiveness of your paid ad campaigns and consider optimizing targeting to regain lost users.
+                    - Analyze customer behavior and purchase patterns to identify other potential causes of the decline.
+                    - Reevaluate pricing or promotional strategies to stimulate sales and increase revenue.
+                    - Consider alternative marketing strategies to diversify your revenue streams.
+                    
+                    In conclusion, the drop in sales revenue seems to be linked to both a decrease in user acquisition through paid ads and broader sales performance trends. Adjusting your marketing and sales strategies could help mitigate the decline.
+            <|end_example|>
+
+            <|assistant|>
+        """
+
+    def _classify_locally(self, question: str) -> Optional[str]:
+        """
+        Classifies a query with the in-process classifier.
 
         Args:
             question: A natural language query from the user.
 
         Returns:
-            A string indicating whether the query is a "sql_request" or "casual_interaction".
+            "sql_request" or "casual_interaction", or None when the classifier is disabled
+            or not confident enough and the LLM has to decide.
         """
-        try:
-            request_verification = f"""
-                <|system|>
-                    You are an assistant specialized in determining whether a query is a data request or a casual interaction with the user. Your task is to analyze the query and return one of the following fixed responses to classify the query:
-                    If the query is a data request (e.g., "What's the most expensive product?", "How many sales did we have today?", etc.), return: "sql_request"
-                    If the query is a casual interaction, such as a greeting or thank you (e.g., "hi", "thanks", "good afternoon", etc.), return: "casual_interaction"
+        if not global_settings.QUESTION_CLASSIFIER_ENABLED:
+            return None
 
-                    Important: Only return "sql_request" or "casual_interaction" and nothing else. Do not provide explanations or additional context. Simply classify the query according to the examples above.
+        classification = get_question_classifier(global_settings.QUESTION_CLASSIFIER_MODEL_PATH).classify(question)
+        if classification.confidence < global_settings.QUESTION_CLASSIFIER_THRESHOLD:
+            logger.info(f"Low classifier confidence ({classification.confidence:.2f}), asking the LLM")
+            return None
 
-                <|user|> 
-                    {question}
+        logger.info(f"Question classified locally as {classification.label} ({classification.confidence:.2f})")
+        return classification.label
 
-                <|assistant|>
-            """
+    def _verify_question(self, question: str, use_local: bool = True) -> str:
+        """
+        Verifies whether a query is a data request or a casual interaction. The local
+        classifier answers confident cases; the rest go to the LLM.
 
+        Args:
+            question: A natural language query from the user.
+            use_local: Try the local classifier before the LLM.
+
+        Returns:
+            A string indicating whether the query is a "sql_request" or "casual_interaction".
+        """
+        try:
+            query_type = self._classify_locally(question) if use_local else None
+            if query_type:
+                return query_type
+
+            request_verification = self._verification_prompt(question)
             response = self.instance_llm.invoke(request_verification).content
             return response.strip()
         except Exception as e:
@@ -153,34 +534,7 @@ class KNAIService:
             A friendly, conversational answer based on the context.
         """
         try:
-            context = "\n".join(context_messages[-10:])
-
-            prompt = f"""
-                <|context|>
-                    {context}
-
-                <|user|> 
-                    {question}
-
-                <|role|>
-                    Your main function is to answer about product, sales and extract insight of data. 
-                    We are a enterprise with AI Engineers, Designers and Developers that are together
-                    to delivery critical resources to solve business problems with Generative AI and innovative tools
-                    We born in 2025 with main idea to solve business problemas with IBM resources
-                    
-                <|system|>
-                    Your name is KNAI Assistant, if is your first message with the user, try to explain about your COMPANY,
-                    you work for this guys:
-                        - Ivisson is the AI Developer, kindness guy :)
-                        - Giu is an AI Engineer, big engineer building a solid career
-                        - Marcos is our amazing frontender
-                        - Dani is our AI Researcher that drive the business model
-                        - Xoto (Hugo) is the designer tha created our visual identity
-                        - Edson is our AI Engineer.
-                    Respond in a friendly, conversational tone to the user query based on the provided context.
-                
-                <|assistant|>
-            """
+            prompt = self._answer_prompt(context_messages, question)
 
             final_answer = self.instance_llm.invoke(prompt)
             return final_answer.content
@@ -188,59 +542,104 @@ class KNAIService:
             logger.error(f"Error generating answer: {e}")
             raise
         
-    def process_query(self, natural_query: str, conversation_id: Optional[str] = None) -> Dict:
+    @track_request("sync", cancelled=(JobCancelledError,))
+    def process_query(
+        self,
+        natural_query: str,
+        conversation_id: Optional[str] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> Dict:
         """
         Processes a user query
         
         Args:
             natural_query: Natural language query
             conversation_id: Optional conversation ID. If not provided, creates a new one.
+            should_stop: Polled between stages; when it returns True the query is abandoned
             
         Returns:
             Dict with processed response
+
+        Raises:
+            JobCancelledError: should_stop returned True
         """
+        def checkpoint(stage: str) -> None:
+            if should_stop is not None and should_stop():
+                raise JobCancelledError(f"Cancelled before {stage}")
+
         try:
+            timer = StageTimer()
             if not conversation_id:
                 conversation_id = self.conversation_manager.create_conversation()
                 
             logger.info(f"Processing query for conversation {conversation_id}")
             
-            # Verify query type
-            query_type = self._verify_question(natural_query)
+            # Questions answered before skip classification and SQL generation
+            fingerprint = None
+            cached_sql = None
+            if global_settings.SQL_CACHE_ENABLED:
+                with timer.stage("sql_cache"):
+                    fingerprint = schema_cache.get_snapshot().fingerprint
+                    cached_sql = sql_cache.get(natural_query, fingerprint)
+                cache_requests_total.inc(cache="sql", result="hit" if cached_sql else "miss")
+
+            # Verify query type. When the question has to go to the LLM, SQL generation
+            # starts speculatively alongside the classification.
+            speculative_sql = None
+            speculation = "off"
+            if cached_sql:
+                query_type = 'sql_request'
+            else:
+                with timer.stage("classify_local"):
+                    query_type = self._classify_locally(natural_query)
+                if query_type is None:
+                    if global_settings.SPECULATIVE_SQL_ENABLED:
+                        # In the caller's context, so the LLM call keeps its priority
+                        speculative_sql = speculation_executor.submit(
+                            contextvars.copy_context().run,
+                            timer.timed, "sql_generation", sql_generator, natural_query
+                        )
+                    query_type = timer.timed("classify_llm", self._verify_question, natural_query, False)
             
             if query_type == 'casual_interaction':
-                history = self.conversation_manager.get_conversation_history(
-                    conversation_id, 
-                    last_n=10
-                )
+                if speculative_sql is not None:
+                    # A generation already in flight cannot be interrupted; its SQL is dropped
+                    speculative_sql.cancel()
+                    speculation = "discarded"
+
+                checkpoint("answer")
+                with timer.stage("history"):
+                    history = self.conversation_manager.get_conversation_history(
+                        conversation_id, 
+                        last_n=10
+                    )
                 history_formatted = [
                     f"<{msg['role']}> {msg['content']}" 
                     for msg in history
                 ]
                 
-                model_response = self._answer_question_knai(
-                    history_formatted, 
-                    natural_query
-                )
+                with timer.stage("answer"):
+                    model_response = self._answer_question_knai(
+                        history_formatted, 
+                        natural_query
+                    )
                 
                 # Add interaction to history
-                self.conversation_manager.add_message(
-                    conversation_id, 
-                    "user", 
-                    natural_query
-                )
-                self.conversation_manager.add_message(
-                    conversation_id, 
-                    "assistant", 
-                    model_response
-                )
+                with timer.stage("history"):
+                    self.conversation_manager.add_messages(
+                        conversation_id,
+                        [("user", natural_query), ("assistant", model_response)]
+                    )
                 
                 response = {
                     "final_answer": model_response,
                     "sql_query": None,
                     "query_result": None,
-                    "conversation_id": conversation_id
+                    "conversation_id": conversation_id,
+                    "speculation": speculation
                 }
+                if global_settings.RESPONSE_TIMINGS:
+                    response["timings"] = timer.as_dict()
                 
                 return {
                     "status": "success",
@@ -248,10 +647,18 @@ class KNAIService:
                 }
             
             # SQL query processing
-            sql_query = sql_generator(natural_query)
-            logger.info(f"Generated SQL query: {sql_query}")
+            if cached_sql:
+                sql_query = cached_sql
+            elif speculative_sql is not None:
+                sql_query = speculative_sql.result()
+                speculation = "used"
+            else:
+                checkpoint("sql_generation")
+                sql_query = timer.timed("sql_generation", sql_generator, natural_query)
+            logger.info(f"{'Cached' if cached_sql else 'Generated'} SQL query: {sql_query}")
             
             if sql_query == "NO_CONTEXT":
+                stage_errors_total.inc(stage="sql_generation")
                 return {
                     "status": "error",
                     "response": {
@@ -259,69 +666,55 @@ class KNAIService:
                     }
                 }
                 
-            query_result = execute_query(sql_query)
+            checkpoint("query")
+            with timer.stage("query"):
+                outcome = run_query(sql_query)
+            observe_outcome(outcome)
+            query_result = outcome.result
             logger.info(f"Query result: {query_result}")
+            # A query cancelled with pg_cancel_backend comes back as an error result
+            checkpoint("insight")
+
+            if fingerprint and not cached_sql and not query_result.startswith('{"error"'):
+                sql_cache.set(natural_query, fingerprint, sql_query)
             
-            context = f"""<user query> {sql_query} 
-                        <result query> {query_result}"""
-            
-            prompt = f"""
-                <|context|>
-                    {context}
-
-                <|system|>
-                    You received a JSON result with a question and an answer. You are an expert data analyst
-                    with extensive experience in extracting insight and providing strategic recommendations. 
-                    Your main task is to analyze the provided data comprehensively and generate actionable insights in a human-friendly response.
-                    Use the query result to explain any key patterns, trends, and insights that can be derived from the data.
-        
-                <|example|>
-                    <user> What are the main factors driving the drop in our Sales Revenue this week?
-                    <result query> sales_revenue\tpercentage_down\tsales_date_time\n9.7M\t4%\t2025-22-02\n11M\t12%\t2025-18-02
-                    <assistant> 
-                     Sales revenue has decreased by 4%, with a total of 9.7M in revenue this week, down from 11M the previous week (a decrease of 1.3M). Key contributing factors include:
-            
-                        1. A 12% drop in sales revenue from 11M to 9.7M over the past week, signaling a decline in overall sales performance.
-                        2. A reduction in user engagement, particularly from paid ads. The number of users driven by paid ads decreased by 17%, from 250k to 147k, leading to a loss of 138k in revenue.
-                        
-                        Recommendations:
-                        - Investigate the effectiveness of your paid ad campaigns and consider optimizing targeting to regain lost users.
-                        - Analyze customer behavior and purchase patterns to identify other potential causes of the decline.
-                        - Reevaluate pricing or promotional strategies to stimulate sales and increase revenue.
-                        - Consider alternative marketing strategies to diversify your revenue streams.
-                        
-                        In conclusion, the drop in sales revenue seems to be linked to both a decrease in user acquisition through paid ads and broader sales performance trends. Adjusting your marketing and sales strategies could help mitigate the decline.
-                <|end_example|>
-
-                <|assistant|>
-            """
+            with timer.stage("profile"):
+                prompt_result, summarized = self._prompt_result(query_result)
+            prompt = self._insight_prompt(sql_query, prompt_result, outcome.truncated, summarized)
             
-            final_answer = self.instance_llm.invoke(prompt)
+            with timer.stage("insight"):
+                final_answer = self.instance_llm.invoke(prompt)
             
             # Add interaction to history
-            self.conversation_manager.add_message(
-                conversation_id, 
-                "user", 
-                natural_query
-            )
-            self.conversation_manager.add_message(
-                conversation_id, 
-                "assistant", 
-                final_answer.content
-            )
+            with timer.stage("history"):
+                self.conversation_manager.add_messages(
+                    conversation_id,
+                    [("user", natural_query), ("assistant", final_answer.content)]
+                )
             
             response = {
                 "final_answer": final_answer.content,
                 "sql_query": sql_query,
                 "query_result": query_result,
-                "conversation_id": conversation_id
+                "conversation_id": conversation_id,
+                "sql_cache": "hit" if cached_sql else "miss",
+                "cache": outcome.cache,
+                "row_count": outcome.row_count,
+                "truncated": outcome.truncated,
+                "admission": outcome.admission,
+                "result_summarized": summarized,
+                "speculation": speculation
             }
+            if global_settings.RESPONSE_TIMINGS:
+                response["timings"] = timer.as_dict()
             
             return {
                 "status": "success",
                 "response": response
             }
             
+        except JobCancelledError:
+            raise
         except Exception as e:
             logger.error(f"Error processing query: {e}")
             return {
@@ -329,4 +722,273 @@ class KNAIService:
                 "response": {
                     "message": f"Error processing query: {str(e)}"
                 }
-            }
\ No newline at end of file
+            }
+
+    async def _averify_question(self, question: str, use_local: bool = True) -> str:
+        """
+        Async variant of _verify_question.
+        """
+        try:
+            query_type = self._classify_locally(question) if use_local else None
+            if query_type:
+                return query_type
+
+            response = await self.instance_llm.ainvoke(self._verification_prompt(question))
+            return response.content.strip()
+        except Exception as e:
+            logger.error(f"Error verifying question type: {e}")
+            raise
+
+    async def _agenerate(self, prompt: str, stream: bool) -> AsyncIterator[str]:
+        """
+        Yields the LLM answer to a prompt, chunk by chunk when streaming and in one piece otherwise.
+        """
+        if stream:
+            async for chunk in self.instance_llm.astream(prompt):
+                if chunk.content:
+                    yield chunk.content
+        else:
+            yield (await self.instance_llm.ainvoke(prompt)).content
+
+    @track_stream("async")
+    async def astream_query(self, natural_query: str, conversation_id: Optional[str] = None,
+                            stream: bool = True,
+                            limits: Optional[StageLimits] = None) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        Processes a user query and yields an event per stage as it completes:
+        "classification", "sql", "result", "token" (answer text chunks), then "done"
+        with the full response or "error".
+
+        LLM calls use ainvoke/astream, queries run on the asyncpg pool and history goes
+        through redis.asyncio. The SQL and result caches still use redis-py and run in
+        worker threads.
+        
+        Args:
+            natural_query: Natural language query
+            conversation_id: Optional conversation ID. If not provided, creates a new one.
+            stream: Stream the answer from the LLM chunk by chunk
+            limits: Per-stage concurrency caps shared with other requests (batches)
+            
+        Yields:
+            (event name, event data) tuples
+        """
+        conversation_manager = self.async_conversation_manager
+        speculative_sql = None
+        try:
+            timer = StageTimer(limits)
+            if conversation_manager is None:
+                raise RuntimeError("KNAIService was created without an async conversation manager")
+
+            if not conversation_id:
+                conversation_id = conversation_manager.create_conversation()
+                
+            logger.info(f"Processing query for conversation {conversation_id}")
+            
+            # Questions answered before skip classification and SQL generation
+            fingerprint = None
+            cached_sql = None
+            if global_settings.SQL_CACHE_ENABLED:
+                with timer.stage("sql_cache"):
+                    fingerprint = (await schema_cache.aget_snapshot()).fingerprint
+                    cached_sql = await asyncio.to_thread(sql_cache.get, natural_query, fingerprint)
+                cache_requests_total.inc(cache="sql", result="hit" if cached_sql else "miss")
+
+            # Verify query type. When the question has to go to the LLM, SQL generation
+            # starts speculatively alongside the classification.
+            speculation = "off"
+            if cached_sql:
+                query_type = 'sql_request'
+            else:
+                with timer.stage("classify_local"):
+                    query_type = self._classify_locally(natural_query)
+                if query_type is None:
+                    if global_settings.SPECULATIVE_SQL_ENABLED:
+                        speculative_sql = asyncio.create_task(
+                            timer.atimed("sql_generation", asql_generator(natural_query))
+                        )
+                    query_type = await timer.atimed("classify_llm", self._averify_question(natural_query, False))
+
+            yield "classification", {"query_type": query_type, "conversation_id": conversation_id}
+            
+            if query_type == 'casual_interaction':
+                if speculative_sql is not None:
+                    speculative_sql.cancel()
+                    speculation = "discarded"
+
+                async with timer.astage("history"):
+                    history = await conversation_manager.get_conversation_history(
+                        conversation_id, 
+                        last_n=10
+                    )
+                history_formatted = [
+                    f"<{msg['role']}> {msg['content']}" 
+                    for msg in history
+                ]
+                prompt = self._answer_prompt(history_formatted, natural_query)
+                sql_query = query_result = None
+            else:
+                # SQL query processing
+                if cached_sql:
+                    sql_query = cached_sql
+                elif speculative_sql is not None:
+                    sql_query = await speculative_sql
+                    speculation = "used"
+                else:
+                    sql_query = await timer.atimed("sql_generation", asql_generator(natural_query))
+                logger.info(f"{'Cached' if cached_sql else 'Generated'} SQL query: {sql_query}")
+                
+                if sql_query == "NO_CONTEXT":
+                    stage_errors_total.inc(stage="sql_generation")
+                    yield "error", {"message": "Failed to generate a valid SQL query"}
+                    return
+
+                yield "sql", {"sql_query": sql_query, "sql_cache": "hit" if cached_sql else "miss"}
+                    
+                outcome = await timer.atimed("query", arun_query(sql_query))
+                observe_outcome(outcome)
+                query_result = outcome.result
+                logger.info(f"Query result: {query_result}")
+
+                yield "result", {
+                    "query_result": query_result,
+                    "cache": outcome.cache,
+                    "row_count": outcome.row_count,
+                    "truncated": outcome.truncated,
+                    "admission": outcome.admission
+                }
+
+                if fingerprint and not cached_sql and not query_result.startswith('{"error"'):
+                    await asyncio.to_thread(sql_cache.set, natural_query, fingerprint, sql_query)
+
+                prompt_result, summarized = await timer.atimed(
+                    "profile", asyncio.to_thread(self._prompt_result, query_result)
+                )
+                prompt = self._insight_prompt(sql_query, prompt_result, outcome.truncated, summarized)
+
+            stage = "insight" if sql_query else "answer"
+            chunks = []
+            async with timer.astage(stage):
+                async for chunk in self._agenerate(prompt, stream):
+                    if not chunks:
+                        timer.record(f"{stage}_first_token", time.perf_counter() - timer.started)
+                    chunks.append(chunk)
+                    yield "token", {"text": chunk}
+            final_answer = "".join(chunks)
+            
+            # Add interaction to history
+            async with timer.astage("history"):
+                await conversation_manager.add_messages(
+                    conversation_id,
+                    [("user", natural_query), ("assistant", final_answer)]
+                )
+
+            response = {
+                "final_answer": final_answer,
+                "sql_query": sql_query,
+                "query_result": query_result,
+                "conversation_id": conversation_id,
+                "speculation": speculation
+            }
+            if sql_query:
+                response.update({
+                    "sql_cache": "hit" if cached_sql else "miss",
+                    "cache": outcome.cache,
+                    "row_count": outcome.row_count,
+                    "truncated": outcome.truncated,
+                    "admission": outcome.admission,
+                    "result_summarized": summarized
+                })
+            if global_settings.RESPONSE_TIMINGS:
+                response["timings"] = timer.as_dict()
+            
+            yield "done", response
+            
+        except Exception as e:
+            logger.error(f"Error processing query: {e}")
+            yield "error", {"message": f"Error processing query: {str(e)}"}
+        finally:
+            # Also reached when a streaming client disconnects mid-request
+            if speculative_sql is not None and not speculative_sql.done():
+                speculative_sql.cancel()
+
+    async def aprocess_query(self, natural_query: str, conversation_id: Optional[str] = None,
+                             limits: Optional[StageLimits] = None) -> Dict:
+        """
+        Async variant of process_query; runs astream_query and returns its final event.
+        
+        Args:
+            natural_query: Natural language query
+            conversation_id: Optional conversation ID. If not provided, creates a new one.
+            limits: Per-stage concurrency caps shared with other requests (batches)
+            
+        Returns:
+            Dict with processed response
+        """
+        async for event, data in self.astream_query(natural_query, conversation_id, stream=False, limits=limits):
+            if event == "done":
+                return {"status": "success", "response": data}
+            if event == "error":
+                return {"status": "error", "response": data}
+
+    async def aprocess_batch(self, questions: List[str], max_concurrency: int = 8,
+                             limits: Optional[StageLimits] = None) -> Dict:
+        """
+        Processes several questions concurrently with the semantics of aprocess_query.
+        Questions that normalize to the same text (case, accents, punctuation and
+        whitespace ignored; numbers kept) run once and share the result. Each unique
+        question gets its own conversation.
+        
+        Args:
+            questions: Natural language queries
+            max_concurrency: Questions in flight at once
+            limits: Per-stage concurrency caps (classification, SQL generation, query...)
+            
+        Returns:
+            Dict with one item per question, in order, and the batch totals
+        """
+        # The batch's LLM calls queue behind interactive requests
+        llm_priority.set(BATCH)
+        timer = StageTimer()
+        first_of: Dict[Tuple[str, Tuple[str, ...]], int] = {}
+        duplicate_of: Dict[int, int] = {}
+        for index, question in enumerate(questions):
+            normalized, numbers = normalize_question(question)
+            original = first_of.setdefault((normalized, tuple(numbers)), index)
+            if original != index:
+                duplicate_of[index] = original
+
+        workers = asyncio.Semaphore(max_concurrency)
+
+        async def run(index: int) -> Dict:
+            async with workers:
+                return await self.aprocess_query(questions[index], limits=limits)
+
+        unique = sorted(first_of.values())
+        results = dict(zip(unique, await asyncio.gather(*(run(index) for index in unique))))
+
+        items = []
+        for index, question in enumerate(questions):
+            result = results[duplicate_of.get(index, index)]
+            item = {"index": index, "question": question, "status": result["status"], "response": result["response"]}
+            if index in duplicate_of:
+                item["duplicate_of"] = duplicate_of[index]
+            items.append(item)
+
+        failed = sum(results[index]["status"] != "success" for index in unique)
+        timings = timer.as_dict()
+        logger.info(
+            f"Batch of {len(questions)} questions ({len(unique)} unique, {failed} failed) "
+            f"processed in {timings['total_ms']:.0f}ms"
+        )
+        response = {
+            "items": items,
+            "questions": len(questions),
+            "unique_questions": len(unique),
+            "failed": failed
+        }
+        if global_settings.RESPONSE_TIMINGS:
+            response["timings"] = timings
+        return {
+            "status": "success",
+            "response": response
+        }
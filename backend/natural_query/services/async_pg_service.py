@@ -0,0 +1,268 @@
+from .pg_service import PostgresDB, PoolTimeoutError
+from typing import List, Dict, Any, AsyncIterator, Optional
+from contextlib import asynccontextmanager
+from config import global_settings
+import asyncpg
+import asyncio
+import json
+import logging
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class AsyncPostgresDB:
+    """
+    asyncpg counterpart of PostgresDB for the async request path.
+    """
+
+    def __init__(
+        self,
+        dbname: str,
+        user: str,
+        password: str,
+        host: str,
+        port: int = 5432,
+        min_connections: int = 1,
+        max_connections: int = 10,
+        acquire_timeout: float = 30.0,
+        max_lifetime: float = 1800.0
+    ):
+        """
+        Stores the connection settings; the pool is opened by open().
+        Args:
+            dbname: Name of database
+            user: Database user
+            password: Database password
+            host: Database host
+            port: Database port (default: 5432)
+            min_connections: Pool min connections (default: 1)
+            max_connections: Pool max connections (default: 10)
+            acquire_timeout: Seconds to wait for a free connection (default: 30)
+            max_lifetime: Seconds an idle connection is kept before being closed (default: 1800)
+        """
+        self.db_config = {
+            'database': dbname,
+            'user': user,
+            'password': password,
+            'host': host,
+            'port': port
+        }
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.acquire_timeout = acquire_timeout
+        self.max_lifetime = max_lifetime
+        self.pool: Optional[asyncpg.Pool] = None
+        self._open_lock = asyncio.Lock()
+        self._stats = {
+            "in_use": 0,
+            "waiting": 0,
+            "acquisitions": 0,
+            "timeouts": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0
+        }
+
+    async def open(self) -> None:
+        """
+        Opens the asyncpg pool
+        """
+        if self.pool is not None:
+            return
+        async with self._open_lock:
+            if self.pool is None:
+                self.pool = await asyncpg.create_pool(
+                    min_size=self.min_connections,
+                    max_size=self.max_connections,
+                    max_inactive_connection_lifetime=self.max_lifetime,
+                    **self.db_config
+                )
+                logger.info("Pool de conexões PostgreSQL (async) inicializado")
+
+    async def close(self) -> None:
+        """
+        Close pool connection
+        """
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            logger.info("Pool de conexões PostgreSQL (async) fechado")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of pool usage for monitoring
+        Returns:
+            Dict[str, Any]: Pool size, in-use/idle/waiting counts and wait times
+        """
+        stats = dict(self._stats)
+        acquisitions = stats["acquisitions"]
+        stats.update({
+            "min_size": self.min_connections,
+            "max_size": self.max_connections,
+            "idle": self.pool.get_idle_size() if self.pool else 0,
+            "avg_wait_ms": (stats["total_wait_seconds"] / acquisitions * 1000) if acquisitions else 0.0,
+            "max_wait_ms": stats.pop("max_wait_seconds") * 1000
+        })
+        return stats
+
+    @asynccontextmanager
+    async def get_connection(self):
+        """
+        Context manager to obtain pool connection.
+        Yields:
+            asyncpg.Connection: Pooled connection
+        Raises:
+            PoolTimeoutError: If no connection is available within acquire_timeout
+        """
+        await self.open()
+        started = time.monotonic()
+        self._stats["waiting"] += 1
+        try:
+            conn = await self.pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise PoolTimeoutError(
+                f"No database connection available after {self.acquire_timeout}s"
+            )
+        finally:
+            waited = time.monotonic() - started
+            self._stats["waiting"] -= 1
+            self._stats["total_wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+
+        self._stats["in_use"] += 1
+        self._stats["acquisitions"] += 1
+        try:
+            yield conn
+        finally:
+            self._stats["in_use"] -= 1
+            await self.pool.release(conn)
+
+    async def fetch(self, query: str, *args) -> List[asyncpg.Record]:
+        """
+        Runs a catalog/internal query with asyncpg ($1-style) parameters
+        Args:
+            query: SQL query
+            args: Query parameters
+        Returns:
+            List[asyncpg.Record]: Rows
+        """
+        async with self.get_connection() as conn:
+            return await conn.fetch(query, *args)
+
+    async def execute_select(self, query: str, *args) -> List[Dict]:
+        """
+        Execute a SQL Query securely
+        Args:
+            query: Query SQL (Must be SELECT)
+            args: Query parameters (optional)
+        Returns:
+            List[Dict]: Query results
+        Raises:
+            ValueError: If query wasn't valid
+        """
+        if not PostgresDB.is_select_query(query):
+            raise ValueError("Only SELECT queries are allowed")
+
+        try:
+            async with self.get_connection() as conn:
+                async with conn.transaction(readonly=True):
+                    rows = await conn.fetch(query, *args)
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Error executing query: {str(e)}")
+            raise
+
+    async def explain(self, query: str, *args, statement_timeout_ms: Optional[int] = None) -> List[Dict]:
+        """
+        Planner estimates of a SQL Query (EXPLAIN without ANALYZE: nothing is executed)
+        Args:
+            query: Query SQL (Must be SELECT)
+            args: Query parameters (optional)
+            statement_timeout_ms: Bound on the planning time (optional)
+        Returns:
+            List[Dict]: EXPLAIN (FORMAT JSON) output
+        Raises:
+            ValueError: If query wasn't valid
+        """
+        if not PostgresDB.is_select_query(query):
+            raise ValueError("Only SELECT queries are allowed")
+
+        async with self.get_connection() as conn:
+            async with conn.transaction(readonly=True):
+                if statement_timeout_ms:
+                    await conn.execute(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}")
+                return json.loads(await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args))
+
+    async def iter_select(self, query: str, *args, prefetch: int = 2000,
+                          statement_timeout_ms: Optional[int] = None) -> AsyncIterator[Dict]:
+        """
+        Streams a SQL Query through a server-side cursor, prefetch rows per round trip.
+        The connection stays checked out until the generator is exhausted or closed.
+        Args:
+            query: Query SQL (Must be SELECT)
+            args: Query parameters (optional)
+            prefetch: Rows fetched per round trip
+            statement_timeout_ms: Cancel the query after this many milliseconds (optional)
+        Yields:
+            Dict: One row at a time
+        Raises:
+            ValueError: If query wasn't valid
+        """
+        if not PostgresDB.is_select_query(query):
+            raise ValueError("Only SELECT queries are allowed")
+
+        try:
+            async with self.get_connection() as conn:
+                async with conn.transaction(readonly=True):
+                    if statement_timeout_ms:
+                        await conn.execute(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}")
+                    async for row in conn.cursor(query, *args, prefetch=prefetch):
+                        yield dict(row)
+        except Exception as e:
+            logger.error(f"Error executing query: {str(e)}")
+            raise
+
+_shared_async_db: Optional[AsyncPostgresDB] = None
+
+def get_async_db() -> AsyncPostgresDB:
+    """
+    Returns the shared async database instance; its pool opens on first use.
+    Returns:
+        AsyncPostgresDB: The shared async database instance
+    """
+    global _shared_async_db
+
+    if _shared_async_db is None:
+        _shared_async_db = AsyncPostgresDB(
+            dbname=global_settings.DB_NAME,
+            user=global_settings.DB_USER,
+            password=global_settings.DB_PASSWORD,
+            host=global_settings.DB_HOST,
+            port=global_settings.DB_PORT,
+            min_connections=global_settings.DB_POOL_MIN_SIZE,
+            max_connections=global_settings.DB_POOL_MAX_SIZE,
+            acquire_timeout=global_settings.DB_POOL_ACQUIRE_TIMEOUT,
+            max_lifetime=global_settings.DB_POOL_MAX_LIFETIME
+        )
+    return _shared_async_db
+
+async def init_async_db() -> AsyncPostgresDB:
+    """
+    Opens the process-wide asyncpg pool. Called from the application lifespan.
+    Returns:
+        AsyncPostgresDB: The shared async database instance
+    """
+    db = get_async_db()
+    await db.open()
+    return db
+
+async def close_async_db() -> None:
+    """
+    Closes the shared asyncpg pool.
+    """
+    global _shared_async_db
+
+    if _shared_async_db is not None:
+        await _shared_async_db.close()
+        _shared_async_db = None
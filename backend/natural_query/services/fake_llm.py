@@ -0,0 +1,112 @@
+from langchain_core.messages import AIMessage, AIMessageChunk
+from typing import Any, AsyncIterator, Dict, Optional
+import asyncio
+import random
+import time
+import re
+
+CASUAL_WORDS = frozenset([
+    "hi", "hello", "hey", "thanks", "thank", "bye", "ola", "olá", "oi", "obrigado", "obrigada",
+    "good", "morning", "afternoon", "evening", "tchau", "you", "there"
+])
+
+SECTION = r"<\|{}\|>:?\s*(.*?)(?:<\||$)"
+# First table of the rendered schema, in any SCHEMA_PROMPT_FORMAT: `orders(...)`,
+# `orders: ...` or `{'orders': ...}`
+FIRST_TABLE = re.compile(r"^\s*\{?'?([A-Za-z_][\w.]*)'?\s*[(:]", re.MULTILINE)
+
+ANSWER = (
+    "The result shows the requested figures. The largest values are concentrated in a few "
+    "records, while the remaining ones are evenly distributed. Consider monitoring the top "
+    "entries over time and comparing them with the previous period to confirm the trend."
+)
+
+def _section(prompt: str, name: str) -> str:
+    match = re.search(SECTION.format(name), prompt, re.DOTALL)
+    return match.group(1).strip() if match else ""
+
+def _tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+class FakeChatModel:
+    """
+    Deterministic stand-in for the chat model (LLM_PROVIDER=fake), so the pipeline
+    can be benchmarked and load tested without calling watsonx. It answers each
+    prompt of the pipeline by its shape:
+
+    - classification: "casual_interaction" for greetings and thanks, "sql_request" otherwise
+    - SQL generation: a SELECT over the first table of the prompt's schema
+    - answers and insights: a fixed paragraph
+
+    Responses carry usage_metadata like the real model's. Every call waits the
+    configured latency (plus jitter) first; streams spread it over their chunks.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, sql_limit: int = 100, seed: Optional[int] = None):
+        """
+        Args:
+            latency: Seconds each call takes
+            jitter: Up to this many seconds added to the latency at random
+            sql_limit: LIMIT of the generated queries
+            seed: Seed of the jitter
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.sql_limit = sql_limit
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    def _delay(self) -> float:
+        return self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def respond(self, prompt: Any) -> str:
+        """
+        The text the model answers to a prompt
+        """
+        text = prompt if isinstance(prompt, str) else str(prompt)
+        if "sql_request" in text and "casual_interaction" in text:
+            words = set(re.findall(r"\w+", _section(text, "user").lower()))
+            return "casual_interaction" if words and words <= CASUAL_WORDS else "sql_request"
+        if "<|schema|>" in text:
+            match = FIRST_TABLE.search(_section(text, "schema"))
+            sql = f"SELECT * FROM {match.group(1)} LIMIT {self.sql_limit}" if match else "SELECT 1 AS answer"
+            return f"```sql\n{sql}\n```"
+        return ANSWER
+
+    def _message(self, prompt: Any, content: str) -> AIMessage:
+        self.calls += 1
+        return AIMessage(content=content, usage_metadata=self._usage(prompt, content))
+
+    @staticmethod
+    def _usage(prompt: Any, content: str) -> Dict[str, int]:
+        input_tokens = _tokens(prompt if isinstance(prompt, str) else str(prompt))
+        output_tokens = _tokens(content)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def invoke(self, prompt: Any, **kwargs: Any) -> AIMessage:
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._message(prompt, self.respond(prompt))
+
+    async def ainvoke(self, prompt: Any, **kwargs: Any) -> AIMessage:
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._message(prompt, self.respond(prompt))
+
+    async def astream(self, prompt: Any, **kwargs: Any) -> AsyncIterator[AIMessageChunk]:
+        content = self.respond(prompt)
+        words = content.split(" ")
+        delay = self._delay() / len(words)
+        self.calls += 1
+        usage = self._usage(prompt, content)
+        for index, word in enumerate(words):
+            if delay:
+                await asyncio.sleep(delay)
+            # Usage is reported once, on the last chunk
+            last = index == len(words) - 1
+            yield AIMessageChunk(
+                content=word if last else f"{word} ",
+                usage_metadata=usage if last else None
+            )
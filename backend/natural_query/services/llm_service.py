@@ -1,37 +1,403 @@
 from langchain_ollama import OllamaLLM
 from langchain_ibm import ChatWatsonx
+from ibm_watsonx_ai import APIClient, Credentials
+from ..core.llm_scheduler import LLMScheduler, SingleFlight
+from ..core.metrics import llm_call_seconds, llm_calls_total, observe_llm_usage
+from ..core.stage_timer import current_stage, record_stage
+from .fake_llm import FakeChatModel
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 from config import global_settings
+import threading
+import asyncio
+import hashlib
 import logging
+import httpx
+import time
 
 logger = logging.getLogger(__name__)
 
-class LLMService:
+IAM_GRANT_TYPE = "urn:ibm:params:oauth:grant-type:apikey"
+# Longest wait before retrying a failed background refresh
+REFRESH_RETRY_SECONDS = 30
+
+class IAMTokenManager:
     """
-    Service to manage LLM's interactions
+    Exchanges the API key for an IAM access token once and refreshes it in the
+    background before it expires, so requests never wait for the token exchange.
+    Clients handed the token with APIClient.set_token no longer refresh it
+    themselves: they check get_token() before each call (see ScheduledLLM), which
+    fetches a new token on the spot if the background refresh failed until expiry.
     """
-    @staticmethod
-    def getwatson_llm():
 
-        parameters = {
-            "temperature": global_settings.LLM_TEMPERATURE
-        }
+    def __init__(
+        self,
+        api_key: str,
+        url: str,
+        refresh_margin: float = 300,
+        timeout: float = 30
+    ):
+        """
+        Args:
+            api_key: IBM Cloud API key
+            url: IAM token endpoint
+            refresh_margin: Seconds before expiry at which the token is refreshed
+            timeout: Seconds before a token request times out
+        """
+        self.api_key = api_key
+        self.url = url
+        self.refresh_margin = refresh_margin
+        self.http_client = httpx.Client(timeout=timeout)
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lifetime = 0.0
+        self._listeners: List[Callable[[str], None]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.fetches = 0
+        self.refreshes = 0
+        self.failures = 0
 
-        chat = ChatWatsonx(
-            model_id=global_settings.LLM_MODEL_ID,
-            params=parameters,
-            url=global_settings.LLM_URL,
-            project_id=global_settings.PROJECT_ID,
-            apikey=global_settings.WATSONX_API_KEY
+    def _exchange(self) -> Tuple[str, float]:
+        response = self.http_client.post(
+            self.url,
+            data={"grant_type": IAM_GRANT_TYPE, "apikey": self.api_key},
+            headers={"Accept": "application/json"}
         )
+        response.raise_for_status()
+        body = response.json()
+        return body["access_token"], float(body.get("expires_in", 3600))
 
-        return chat
-    
-    @staticmethod
-    def get_llm():
-        llm = OllamaLLM(
-            model=global_settings.OLLAMA_MODEL_ID, 
-            temperature=global_settings.LLM_TEMPERATURE,
-        )
-        return llm
+    def valid(self) -> bool:
+        """
+        Whether the cached token has not expired
+        """
+        return self._token is not None and time.time() < self._expires_at
+
+    def _fetch(self) -> str:
+        # Called under self._fetch_lock
+        token, lifetime = self._exchange()
+        with self._lock:
+            self._token, self._expires_at, self._lifetime = token, time.time() + lifetime, lifetime
+            self.fetches += 1
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(token)
+        return token
+
+    def get_token(self) -> str:
+        """
+        The cached token; fetched on the spot only the first time or when the
+        background refresh could not renew it in time.
+        """
+        if not self.valid():
+            # Serialized so concurrent first requests do not all exchange the key
+            with self._fetch_lock:
+                if not self.valid():
+                    self._fetch()
+            self.start()
+        return self._token
+
+    def on_refresh(self, listener: Callable[[str], None]) -> None:
+        """
+        Registers a callback receiving every new token
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def _refresh_loop(self) -> None:
+        failed = 0
+        while True:
+            # Short-lived tokens are renewed halfway through rather than continuously
+            margin = min(self.refresh_margin, self._lifetime / 2)
+            if self._stop.wait(max(self._expires_at - margin - time.time(), 0)):
+                return
+            try:
+                with self._fetch_lock:
+                    self._fetch()
+                failed = 0
+                self.refreshes += 1
+                logger.info(f"IAM token refreshed, valid for {self._expires_at - time.time():.0f}s")
+            except Exception as e:
+                failed += 1
+                self.failures += 1
+                logger.error(f"IAM token refresh failed: {e}")
+                remaining = self._expires_at - time.time()
+                if remaining > 0:
+                    # Retry while the current token can still be replaced in time
+                    delay = min(REFRESH_RETRY_SECONDS, max(remaining, 1))
+                else:
+                    # Expired: back off, get_token() fetches on demand meanwhile
+                    delay = min(REFRESH_RETRY_SECONDS, 2 ** (failed - 1))
+                if self._stop.wait(delay):
+                    return
+
+    def start(self) -> None:
+        """
+        Starts the background refresh
+        """
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._refresh_loop, name="iam-token-refresh", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.http_client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "token_fetches": self.fetches,
+            "token_refreshes": self.refreshes,
+            "token_refresh_failures": self.failures,
+            "token_expires_in": round(self._expires_at - time.time(), 1) if self._token else None
+        }
+
+class ScheduledLLM:
+    """
+    LLM client whose calls wait for their provider's scheduler; identical prompts
+    in flight share one call. Calls that reach the provider are counted and timed
+    per stage, with the tokens they report; the wait for a slot is recorded as the
+    request's "llm_queue" stage. Other attributes are those of the wrapped client.
+    """
+
+    def __init__(self, llm: Any, key: str, scheduler: LLMScheduler, single_flight: Optional[SingleFlight],
+                 token_manager: Optional[IAMTokenManager] = None):
+        """
+        Args:
+            llm: LangChain chat model or LLM
+            key: Provider, model and parameters, part of the coalescing key
+            scheduler: Admission for the provider's calls
+            single_flight: Coalescing of identical calls, None to disable it
+            token_manager: Source of the client's IAM token, renewed before a call if it expired
+        """
+        self.llm = llm
+        self.key = key
+        self.provider = scheduler.name
+        self.scheduler = scheduler
+        self.single_flight = single_flight
+        self.token_manager = token_manager
+
+    def _flight_key(self, prompt: Any) -> str:
+        text = prompt if isinstance(prompt, str) else repr(prompt)
+        return hashlib.sha256(f"{self.key}\x00{text}".encode()).hexdigest()
+
+    @contextmanager
+    def _observed(self) -> Iterator[str]:
+        # Entered once the slot is granted, so the queue wait is not counted
+        stage = current_stage.get() or "other"
+        started = time.perf_counter()
+        status = "cancelled"
+        try:
+            yield stage
+            status = "success"
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            llm_calls_total.inc(provider=self.provider, stage=stage, status=status)
+            llm_call_seconds.observe(time.perf_counter() - started, provider=self.provider, stage=stage)
+
+    async def _arefresh_token(self) -> None:
+        # The token exchange is blocking HTTP: off the event loop, and only when needed
+        if self.token_manager is not None and not self.token_manager.valid():
+            await asyncio.to_thread(self.token_manager.get_token)
+
+    def _invoke(self, prompt: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        with self.scheduler.slot():
+            record_stage("llm_queue", time.perf_counter() - started)
+            if self.token_manager is not None:
+                # A no-op while the token is valid; pushes a new one to the client otherwise
+                self.token_manager.get_token()
+            with self._observed() as stage:
+                response = self.llm.invoke(prompt, **kwargs)
+                observe_llm_usage(self.provider, stage, response)
+                return response
+
+    async def _ainvoke(self, prompt: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        async with self.scheduler.aslot():
+            record_stage("llm_queue", time.perf_counter() - started)
+            await self._arefresh_token()
+            with self._observed() as stage:
+                response = await self.llm.ainvoke(prompt, **kwargs)
+                observe_llm_usage(self.provider, stage, response)
+                return response
+
+    def invoke(self, prompt: Any, **kwargs: Any) -> Any:
+        if self.single_flight is None or kwargs:
+            return self._invoke(prompt, **kwargs)
+        return self.single_flight.do(self._flight_key(prompt), lambda: self._invoke(prompt))
+
+    async def ainvoke(self, prompt: Any, **kwargs: Any) -> Any:
+        if self.single_flight is None or kwargs:
+            return await self._ainvoke(prompt, **kwargs)
+        return await self.single_flight.ado(self._flight_key(prompt), lambda: self._ainvoke(prompt))
+
+    async def astream(self, prompt: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        # Streams are not shared; the slot is held until the last chunk
+        started = time.perf_counter()
+        async with self.scheduler.aslot():
+            record_stage("llm_queue", time.perf_counter() - started)
+            await self._arefresh_token()
+            with self._observed() as stage:
+                async for chunk in self.llm.astream(prompt, **kwargs):
+                    # Chunks carry partial usage that adds up to the call's total
+                    observe_llm_usage(self.provider, stage, chunk)
+                    yield chunk
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llm, name)
+
+class LLMService:
+    """
+    Service to manage LLM's interactions. Clients are built once per provider and
+    model and shared by all requests: watsonx models share one APIClient (and its
+    keep-alive connection pool) authenticated with a cached IAM token. Calls go
+    through a scheduler per provider (concurrency and rate limits, interactive
+    before batch) and identical prompts in flight are coalesced.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[Any, ...], ScheduledLLM] = {}
+        self._api_client: Optional[APIClient] = None
+        self._token_manager: Optional[IAMTokenManager] = None
+        self.schedulers: Dict[str, LLMScheduler] = {}
+        self.single_flight = SingleFlight()
+        self.clients_created: Dict[str, int] = {}
+        self.client_requests = 0
+
+    def _created(self, kind: str) -> None:
+        self.clients_created[kind] = self.clients_created.get(kind, 0) + 1
+        logger.info(f"LLM client created: {kind}")
+
+    def _watsonx_api_client(self) -> APIClient:
+        # Called under self._lock
+        if self._api_client is not None:
+            return self._api_client
+
+        if global_settings.LLM_IAM_URL:
+            if self._token_manager is None:
+                self._token_manager = IAMTokenManager(
+                    global_settings.WATSONX_API_KEY,
+                    global_settings.LLM_IAM_URL,
+                    refresh_margin=global_settings.LLM_TOKEN_REFRESH_MARGIN
+                )
+            credentials = Credentials(url=global_settings.LLM_URL, token=self._token_manager.get_token())
+            api_client = APIClient(credentials, project_id=global_settings.PROJECT_ID)
+            self._token_manager.on_refresh(api_client.set_token)
+        else:
+            # Not IBM Cloud IAM (e.g. Cloud Pak for Data): the client authenticates itself
+            credentials = Credentials(url=global_settings.LLM_URL, api_key=global_settings.WATSONX_API_KEY)
+            api_client = APIClient(credentials, project_id=global_settings.PROJECT_ID)
+
+        self._created("watsonx_api_client")
+        self._api_client = api_client
+        return api_client
+
+    def _scheduler(self, provider: str) -> LLMScheduler:
+        # Called under self._lock; every provider gets the same limits
+        if provider not in self.schedulers:
+            self.schedulers[provider] = LLMScheduler(
+                provider,
+                max_concurrency=global_settings.LLM_MAX_CONCURRENCY,
+                rate=global_settings.LLM_RATE_LIMIT,
+                burst=global_settings.LLM_RATE_BURST,
+                max_queue=global_settings.LLM_MAX_QUEUE,
+                queue_timeout=global_settings.LLM_QUEUE_TIMEOUT
+            )
+        return self.schedulers[provider]
+
+    def _client(self, provider: str, model_id: str, temperature: float, build: Callable[[], Any]) -> ScheduledLLM:
+        key = (provider, model_id, temperature)
+        self.client_requests += 1
+
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            if key not in self._clients:
+                llm = build()
+                self._clients[key] = ScheduledLLM(
+                    llm,
+                    f"{provider}:{model_id}:{temperature}",
+                    self._scheduler(provider),
+                    self.single_flight if global_settings.LLM_COALESCE_ENABLED else None,
+                    # Set by build() for watsonx clients authenticated with a managed token
+                    token_manager=self._token_manager if provider == "watsonx" else None
+                )
+                self._created(f"{provider}_chat" if provider == "watsonx" else provider)
+            return self._clients[key]
+
+    def _fake(self, model_id: str, temperature: float) -> ScheduledLLM:
+        # Offline model (LLM_PROVIDER=fake), scheduled like a real provider
+        return self._client("fake", model_id, temperature, lambda: FakeChatModel(
+            latency=global_settings.LLM_FAKE_LATENCY,
+            jitter=global_settings.LLM_FAKE_LATENCY_JITTER
+        ))
+
+    def getwatson_llm(self, model_id: Optional[str] = None, temperature: Optional[float] = None) -> ScheduledLLM:
+        """
+        Shared watsonx chat model (the fake model when LLM_PROVIDER=fake).
+
+        Args:
+            model_id: Model, LLM_MODEL_ID by default
+            temperature: Sampling temperature, LLM_TEMPERATURE by default
+
+        Returns:
+            The scheduled ChatWatsonx for this model and temperature
+        """
+        model_id = model_id or global_settings.LLM_MODEL_ID
+        temperature = global_settings.LLM_TEMPERATURE if temperature is None else temperature
+        if global_settings.LLM_PROVIDER == "fake":
+            return self._fake(model_id, temperature)
+        return self._client("watsonx", model_id, temperature, lambda: ChatWatsonx(
+            model_id=model_id,
+            params={"temperature": temperature},
+            watsonx_client=self._watsonx_api_client()
+        ))
+
+    def get_llm(self, model_id: Optional[str] = None, temperature: Optional[float] = None) -> ScheduledLLM:
+        """
+        Shared Ollama model.
+        """
+        model_id = model_id or global_settings.OLLAMA_MODEL_ID
+        temperature = global_settings.LLM_TEMPERATURE if temperature is None else temperature
+        if global_settings.LLM_PROVIDER == "fake":
+            return self._fake(model_id, temperature)
+        return self._client("ollama", model_id, temperature, lambda: OllamaLLM(
+            model=model_id,
+            temperature=temperature
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Client construction, token, scheduler and coalescing counters
+        """
+        stats = {
+            "clients": len(self._clients),
+            "clients_created": dict(self.clients_created),
+            "client_requests": self.client_requests,
+            "single_flight": self.single_flight.stats(),
+            "schedulers": {name: scheduler.stats() for name, scheduler in self.schedulers.items()}
+        }
+        if self._token_manager is not None:
+            stats.update(self._token_manager.stats())
+        return stats
+
+    def close(self) -> None:
+        """
+        Stops the token refresh
+        """
+        if self._token_manager is not None:
+            self._token_manager.stop()
 
-llmService: LLMService = LLMService()
\ No newline at end of file
+llmService: LLMService = LLMService()
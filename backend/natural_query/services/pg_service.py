@@ -1,13 +1,77 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+from contextvars import ContextVar
+from ..core.sql_validator import is_read_only
 from psycopg2.extras import RealDictCursor
 from contextlib import contextmanager
+from config import global_settings
 import psycopg2.pool
 import psycopg2
+import threading
 import logging
+import time
+import uuid
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class PoolTimeoutError(Exception):
+    """
+    Raised when no pooled connection becomes available within the acquire timeout.
+    """
+
+# Set by whoever needs to cancel a running query from elsewhere (background jobs):
+# called with (db, (backend pid, cursor name)) when iter_select starts streaming and
+# with (db, None) once it is done, so a stale pid is never cancelled.
+backend_observer: ContextVar[Optional[Callable[["PostgresDB", Optional[Tuple[int, str]]], None]]] = ContextVar(
+    "backend_observer", default=None
+)
+
+# Connection exceptions (class 08) and admin shutdown, crash shutdown, cannot connect now
+CONNECTION_SQLSTATES = ("08", "57P01", "57P02", "57P03")
+
+def is_connection_lost(conn, error: BaseException) -> bool:
+    """
+    Whether an error left the connection unusable, as opposed to failing or
+    cancelling (statement_timeout, pg_cancel_backend) the statement only
+    Args:
+        conn: Connection the error was raised on
+        error: The error
+    Returns:
+        bool: True if the connection must be discarded
+    """
+    if conn.closed or isinstance(error, psycopg2.InterfaceError):
+        return True
+    if isinstance(error, psycopg2.OperationalError):
+        # libpq reports a lost connection without a SQLSTATE
+        return error.pgcode is None or error.pgcode.startswith(CONNECTION_SQLSTATES)
+    return False
+
+class WarmConnectionPool(psycopg2.pool.ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool that opens minconn connections up front but keeps up to
+    maxconn of them idle, and reports how many are idle.
+
+    Relies on two internals of psycopg2.pool (unchanged since 2.0, checked against
+    the pinned 2.9): _putconn keeps a returned connection only while fewer than
+    minconn are idle and closes it otherwise, and _pool is the list of idle
+    connections. Review this class when upgrading psycopg2.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        # Raised once the initial connections are open, so warm connections
+        # survive bursts instead of being closed and reopened
+        self.minconn = maxconn
+
+    def idle(self) -> int:
+        """
+        Connections waiting in the pool
+        """
+        if self.closed:
+            return 0
+        with self._lock:
+            return len(self._pool)
+
 class PostgresDB:
     def __init__(
         self,
@@ -17,7 +81,10 @@ class PostgresDB:
         host: str,
         port: int = 5432,
         min_connections: int = 1,
-        max_connections: int = 10
+        max_connections: int = 10,
+        acquire_timeout: float = 30.0,
+        max_lifetime: float = 1800.0,
+        health_check_interval: float = 30.0
     ):
         """
         Initialize the connecticon with Postgres
@@ -29,6 +96,9 @@ class PostgresDB:
             port: Database port (default: 5432)
             min_connections: Pool min connections (default: 1)
             max_connections: Pool max connections (default: 10)
+            acquire_timeout: Seconds to wait for a free connection (default: 30)
+            max_lifetime: Seconds before a connection is recycled (default: 1800)
+            health_check_interval: Idle seconds after which a connection is pinged before reuse (default: 30)
         """
         self.db_config = {
             'dbname': dbname,
@@ -37,34 +107,171 @@ class PostgresDB:
             'host': host,
             'port': port
         }
-        
-        self.pool = psycopg2.pool.SimpleConnectionPool(
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.acquire_timeout = acquire_timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+
+        # ThreadedConnectionPool fails fast when exhausted, so the semaphore
+        # is what makes callers queue (with a timeout) for a free slot.
+        self.pool = WarmConnectionPool(
             min_connections,
             max_connections,
             **self.db_config
         )
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._created_at: Dict[int, float] = {}
+        self._last_used: Dict[int, float] = {}
+        self._stats = {
+            "in_use": 0,
+            "waiting": 0,
+            "acquisitions": 0,
+            "timeouts": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0
+        }
         logger.info("Pool de conexões PostgreSQL inicializado")
 
     def close(self):
         """
         Close pool connection
         """
-        if self.pool:
+        if self.pool and not self.pool.closed:
             self.pool.closeall()
             logger.info("Pool de conexões PostgreSQL fechado")
 
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of pool usage for monitoring
+        Returns:
+            Dict[str, Any]: Pool size, in-use/idle/waiting counts and wait times
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        acquisitions = stats["acquisitions"]
+        stats.update({
+            "min_size": self.min_connections,
+            "max_size": self.max_connections,
+            "idle": self.pool.idle(),
+            "avg_wait_ms": (stats["total_wait_seconds"] / acquisitions * 1000) if acquisitions else 0.0,
+            "max_wait_ms": stats.pop("max_wait_seconds") * 1000
+        })
+        return stats
+
+    def _is_healthy(self, conn) -> bool:
+        """
+        Pings a connection that sat idle for longer than the health check interval
+        Args:
+            conn: Pooled connection
+        Returns:
+            bool: False if the connection is closed or the ping failed
+        """
+        if conn.closed:
+            return False
+
+        idle_for = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if idle_for < self.health_check_interval:
+            return True
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._lock:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    def _discard(self, conn) -> None:
+        """
+        Closes a connection and removes it from the pool
+        """
+        self._created_at.pop(id(conn), None)
+        self._last_used.pop(id(conn), None)
+        self.pool.putconn(conn, close=True)
+
+    def _checkout(self):
+        """
+        Takes a healthy connection from the pool, recycling stale or broken ones
+        Returns:
+            psycopg2.connection: Ready to use connection
+        """
+        while True:
+            conn = self.pool.getconn()
+            now = time.monotonic()
+            created_at = self._created_at.setdefault(id(conn), now)
+            self._last_used.setdefault(id(conn), now)
+
+            if now - created_at > self.max_lifetime or not self._is_healthy(conn):
+                with self._lock:
+                    self._stats["recycled"] += 1
+                self._discard(conn)
+                continue
+
+            return conn
+
     @contextmanager
     def get_connection(self):
         """
         Context manager to obtain pool connection.
         Yields:
             psycopg2.connection: Connection pool
+        Raises:
+            PoolTimeoutError: If no connection is available within acquire_timeout
         """
-        conn = self.pool.getconn()
+        started = time.monotonic()
+        with self._lock:
+            self._stats["waiting"] += 1
+        acquired = self._slots.acquire(timeout=self.acquire_timeout)
+        waited = time.monotonic() - started
+        with self._lock:
+            self._stats["waiting"] -= 1
+            self._stats["total_wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+            if not acquired:
+                self._stats["timeouts"] += 1
+
+        if not acquired:
+            raise PoolTimeoutError(
+                f"No database connection available after {self.acquire_timeout}s"
+            )
+
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats["in_use"] += 1
+            self._stats["acquisitions"] += 1
+
+        broken = False
         try:
             yield conn
+        except Exception as e:
+            # A failed or cancelled statement leaves a healthy connection to roll back
+            broken = is_connection_lost(conn, e)
+            if not broken:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            raise
         finally:
-            self.pool.putconn(conn)
+            if broken or conn.closed:
+                self._discard(conn)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                self.pool.putconn(conn)
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
 
     @contextmanager
     def get_cursor(self, cursor_factory=RealDictCursor):
@@ -87,31 +294,17 @@ class PostgresDB:
                 cursor.close()
 
 
-    def is_select_query(self, query: str) -> bool:
+    @staticmethod
+    def is_select_query(query: str) -> bool:
         """
-        Verifies if select is valid
+        Verifies if select is valid: a single read-only statement, checked on its
+        tokens so string literals, comments and names such as created_at don't count
         Args:
             query: SQL Query to be verified
         Returns:
             bool: True if is valid SELECT
         """
-        query = query.lower().strip()
-        
-        forbidden_commands = [
-            'insert', 'update', 'delete', 'drop', 'truncate', 
-            'alter', 'create', 'replace', 'merge', 'upsert',
-            'grant', 'revoke', 'commit', 'rollback'
-        ]
-        
-        if query.startswith('explain'):
-            return True
-
-        if not query.startswith('select'):
-            return False
-        
-        
-        return not any(cmd in query for cmd in forbidden_commands)
-
+        return is_read_only(query)
 
     def execute_select(self, query: str, params: Optional[Dict] = None) -> List[Dict]:
         """
@@ -130,8 +323,8 @@ class PostgresDB:
 
         try:
             with self.get_cursor() as cursor:
-                # Executa a query
-                cursor.execute(query, params or {})
+                # Executa a query (no params: a literal % must not be read as a placeholder)
+                cursor.execute(query, params)
                 results = cursor.fetchall()
                 return results
 
@@ -139,6 +332,85 @@ class PostgresDB:
             logger.error(f"Error executing query: {str(e)}")
             raise
 
+    @staticmethod
+    def _begin_read_only(cursor, statement_timeout_ms: Optional[int] = None) -> None:
+        """
+        Makes the current transaction read-only and, optionally, bounds its statements
+        in time. Must run before any other statement of the transaction.
+        """
+        cursor.execute("SET TRANSACTION READ ONLY")
+        if statement_timeout_ms:
+            cursor.execute("SET LOCAL statement_timeout = %s", (int(statement_timeout_ms),))
+
+    def explain(self, query: str, params: Optional[Dict] = None,
+                statement_timeout_ms: Optional[int] = None) -> List[Dict]:
+        """
+        Planner estimates of a SQL Query (EXPLAIN without ANALYZE: nothing is executed)
+        Args:
+            query: Query SQL (Must be SELECT)
+            params: Params to query (opcional)
+            statement_timeout_ms: Bound on the planning time (optional)
+        Returns:
+            List[Dict]: EXPLAIN (FORMAT JSON) output
+        Raises:
+            ValueError: If query wasn't valid
+        """
+
+        if not self.is_select_query(query):
+            raise ValueError("Only SELECT queries are allowed")
+
+        with self.get_connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    self._begin_read_only(cursor, statement_timeout_ms)
+                    cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+                    return cursor.fetchone()[0]
+            finally:
+                if not conn.closed:
+                    conn.rollback()
+
+    def iter_select(self, query: str, params: Optional[Dict] = None, itersize: int = 2000,
+                    statement_timeout_ms: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Streams a SQL Query through a named (server-side) cursor, fetching itersize rows
+        per round trip so only one batch is held in memory. The connection stays checked
+        out until the generator is exhausted or closed.
+        Args:
+            query: Query SQL (Must be SELECT)
+            params: Params to query (opcional)
+            itersize: Rows fetched per round trip
+            statement_timeout_ms: Cancel the query after this many milliseconds (optional)
+        Yields:
+            Dict: One row at a time
+        Raises:
+            ValueError: If query wasn't valid
+        """
+
+        if not self.is_select_query(query):
+            raise ValueError("Only SELECT queries are allowed")
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor(name=f"knai_{uuid.uuid4().hex}", cursor_factory=RealDictCursor)
+            cursor.itersize = itersize
+            observer = backend_observer.get()
+            try:
+                if observer is not None:
+                    observer(self, (conn.get_backend_pid(), cursor.name))
+                with conn.cursor() as setup:
+                    self._begin_read_only(setup, statement_timeout_ms)
+                cursor.execute(query, params)
+                yield from cursor
+            except Exception as e:
+                logger.error(f"Error executing query: {str(e)}")
+                raise
+            finally:
+                if observer is not None:
+                    observer(self, None)
+                # Read-only: ending the transaction also drops the server-side cursor
+                if not conn.closed:
+                    cursor.close()
+                    conn.rollback()
+
     def get_schema_info(self) -> Dict[str, Any]:
         """
         Get schema infos of database
@@ -169,4 +441,52 @@ class PostgresDB:
             return self.execute_select(schema_query)
         except Exception as e:
             logger.error(f"Error getting schema info: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+_shared_db: Optional[PostgresDB] = None
+_shared_db_lock = threading.Lock()
+
+def init_db() -> PostgresDB:
+    """
+    Creates the process-wide connection pool from the global settings.
+    Called from the application lifespan; safe to call more than once.
+    Returns:
+        PostgresDB: The shared database instance
+    """
+    global _shared_db
+
+    with _shared_db_lock:
+        if _shared_db is None:
+            _shared_db = PostgresDB(
+                dbname=global_settings.DB_NAME,
+                user=global_settings.DB_USER,
+                password=global_settings.DB_PASSWORD,
+                host=global_settings.DB_HOST,
+                port=global_settings.DB_PORT,
+                min_connections=global_settings.DB_POOL_MIN_SIZE,
+                max_connections=global_settings.DB_POOL_MAX_SIZE,
+                acquire_timeout=global_settings.DB_POOL_ACQUIRE_TIMEOUT,
+                max_lifetime=global_settings.DB_POOL_MAX_LIFETIME,
+                health_check_interval=global_settings.DB_POOL_HEALTH_CHECK_INTERVAL
+            )
+        return _shared_db
+
+def get_db() -> PostgresDB:
+    """
+    Returns the shared database instance, creating it on first use
+    (scripts that never run the application lifespan).
+    Returns:
+        PostgresDB: The shared database instance
+    """
+    return _shared_db or init_db()
+
+def close_db() -> None:
+    """
+    Closes the shared connection pool.
+    """
+    global _shared_db
+
+    with _shared_db_lock:
+        if _shared_db is not None:
+            _shared_db.close()
+            _shared_db = None
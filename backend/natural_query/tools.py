@@ -1,30 +1,57 @@
 from .prompt import POSTGRES_SINTAX_RULES, AGENT_ROLE, AGENT_RULES
-from .core.schema_extractor import SchemaExtractor
+from .core.schema_cache import SchemaSnapshot, schema_cache
+from .core.schema_retriever import select_tables
+from .core.schema_renderer import render_snapshot
+from .core.result_cache import result_cache
+from .core.query_guard import query_guard
+from .core.sql_validator import SqlAnalysis, analyze, schema_catalog, validate_sql
 from .services.llm_service import llmService
-from .services.pg_service import PostgresDB
+from .core.llm_scheduler import LLMOverloadedError
+from .core.metrics import cache_requests_total, query_rows, stage_errors_total
+from .services.db_router import DatabaseNode, db_router, is_node_failure, is_pool_exhausted, is_recovery_conflict
+from typing import Dict, List, Optional
+from dataclasses import dataclass
 from config import global_settings
 import logging
+import asyncio
 import json
 import re
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def sql_generator(natural_query: str) -> str:
+@dataclass
+class QueryOutcome:
     """
-    Generates SQL from natural language query.
+    Result of running a generated query.
+    Attributes:
+        result: Query results as JSON string or error message
+        cache: Result cache status: "hit", "miss", "stale", "uncacheable" or "off"
+        row_count: Rows in the result (None when served from the cache or on error)
+        truncated: The query returned more than the row cap or byte budget allowed
+        admission: Admission decision and plan summary (None when the guard did not run)
+        node: Database node that ran the query (None when it did not reach one)
+    """
+    result: str
+    cache: str = "off"
+    row_count: Optional[int] = None
+    truncated: bool = False
+    admission: Optional[Dict] = None
+    node: Optional[str] = None
+
+def build_sql_prompt(natural_query: str, snapshot: SchemaSnapshot) -> str:
+    """
+    Builds the SQL generation prompt with the schema pruned to the question.
     Args:
         natural_query: The natural language query to convert
+        snapshot: Cached schema snapshot
     Returns:
-        Generated SQL query or "NO_CONTEXT" on error
+        The prompt sent to the LLM
     """
-    logger.info(f'NATURAL QUERY SQL GENERATOR (QUERY): {natural_query}')
-    
-    try:
-        extractor = SchemaExtractor()
-        schema = extractor.get_schema()
+    tables = select_tables(snapshot, natural_query)
+    schema = render_snapshot(snapshot, tables, global_settings.SCHEMA_PROMPT_FORMAT)
 
-        template = f"""
+    return f"""
         <|system|>:
             {AGENT_ROLE}
         <|sintax|>:
@@ -37,38 +64,230 @@ def sql_generator(natural_query: str) -> str:
             {natural_query}
         <|assistant|>
         """
+
+def parse_sql_response(response) -> str:
+    """
+    Extracts the SQL query from the LLM response.
+    Args:
+        response: LLM message (or raw text)
+    Returns:
+        SQL query or "NO_CONTEXT" if the response is not a SELECT
+    """
+    # More robust response handling
+    if hasattr(response, 'content'):
+        response_text = response.content
+    else:
+        response_text = str(response)
+        
+    # Extract SQL from the response
+    sql_matches = re.findall(r'```sql\n(.*?)\n```', response_text, re.DOTALL)
+    if sql_matches:
+        sql_query = sql_matches[0].strip()
+    else:
+        # If no SQL block found, try to use the whole response
+        sql_query = response_text
+        
+    # Clean and format the query
+    sql_query = " ".join(line.strip() for line in sql_query.splitlines())
+    
+    # Basic validation. EXPLAIN passes the validator but can not run through the
+    # query guard (EXPLAIN of EXPLAIN) nor a server-side cursor.
+    analysis = analyze(sql_query)
+    if not analysis.valid or analysis.statement == "explain":
+        logger.warning(f"Generated query doesn't look like a SELECT statement: {sql_query}")
+        return "NO_CONTEXT"
+        
+    return sql_query
+
+def sql_generator(natural_query: str) -> str:
+    """
+    Generates SQL from natural language query.
+    Args:
+        natural_query: The natural language query to convert
+    Returns:
+        Generated SQL query or "NO_CONTEXT" on error
+    """
+    logger.info(f'NATURAL QUERY SQL GENERATOR (QUERY): {natural_query}')
+    
+    try:
+        template = build_sql_prompt(natural_query, schema_cache.get_snapshot())
         
         llm = llmService.getwatson_llm()
         response = llm.invoke(template)
         
-        # More robust response handling
-        if hasattr(response, 'content'):
-            response_text = response.content
-        else:
-            response_text = str(response)
-            
-        # Extract SQL from the response
-        sql_matches = re.findall(r'```sql\n(.*?)\n```', response_text, re.DOTALL)
-        if sql_matches:
-            sql_query = sql_matches[0].strip()
-        else:
-            # If no SQL block found, try to use the whole response
-            sql_query = response_text
-            
-        # Clean and format the query
-        sql_query = " ".join(line.strip() for line in sql_query.splitlines())
-        
-        # Basic validation
-        if not sql_query.lower().strip().startswith('select'):
-            logger.warning(f"Generated query doesn't look like a SELECT statement: {sql_query}")
-            return "NO_CONTEXT"
-            
-        return sql_query
+        return parse_sql_response(response)
         
+    except LLMOverloadedError:
+        # Back-pressure reaches the caller instead of reading as an unanswerable question
+        raise
     except Exception as e:
         logger.error(f"Error in sql_generator: {str(e)}")
         return "NO_CONTEXT"
 
+async def asql_generator(natural_query: str) -> str:
+    """
+    Async variant of sql_generator.
+    Args:
+        natural_query: The natural language query to convert
+    Returns:
+        Generated SQL query or "NO_CONTEXT" on error
+    """
+    logger.info(f'NATURAL QUERY SQL GENERATOR (QUERY): {natural_query}')
+
+    try:
+        template = build_sql_prompt(natural_query, await schema_cache.aget_snapshot())
+
+        llm = llmService.getwatson_llm()
+        response = await llm.ainvoke(template)
+
+        return parse_sql_response(response)
+
+    except LLMOverloadedError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in asql_generator: {str(e)}")
+        return "NO_CONTEXT"
+
+NO_RESULTS = json.dumps({"message": "Query executed successfully but returned no results"})
+
+class ResultBuffer:
+    """
+    Serializes rows one at a time as the cursor yields them, stopping at a row cap or
+    a byte budget. The result is a JSON array with one compact row per line.
+    """
+
+    def __init__(self, max_rows: int, max_bytes: int):
+        """
+        Args:
+            max_rows: Rows kept before the result is truncated
+            max_bytes: Serialized size kept before the result is truncated
+        """
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.rows: List[str] = []
+        self.size = 4
+        self.truncated = False
+
+    def add(self, row: Dict) -> bool:
+        """
+        Serializes a row.
+        Args:
+            row: Query row
+        Returns:
+            False once a limit is reached; the row is dropped and the result marked truncated
+        """
+        if len(self.rows) >= self.max_rows:
+            self.truncated = True
+            return False
+
+        # default=str covers Decimal, date and other non-JSON column types
+        chunk = json.dumps(row, default=str)
+        if self.size + len(chunk) + 2 > self.max_bytes:
+            self.truncated = True
+            return False
+
+        self.rows.append(chunk)
+        self.size += len(chunk) + 2
+        return True
+
+    def outcome(self) -> QueryOutcome:
+        """
+        The collected rows as a QueryOutcome
+        """
+        if not self.rows:
+            return QueryOutcome(NO_RESULTS, row_count=0, truncated=self.truncated)
+        return QueryOutcome(
+            "[\n" + ",\n".join(self.rows) + "\n]",
+            row_count=len(self.rows),
+            truncated=self.truncated
+        )
+
+def _new_buffer() -> ResultBuffer:
+    return ResultBuffer(global_settings.QUERY_MAX_ROWS, global_settings.QUERY_MAX_BYTES)
+
+def _log_truncation(outcome: QueryOutcome) -> None:
+    if outcome.truncated:
+        logger.warning(
+            f"Query result truncated at {outcome.row_count} rows "
+            f"(limits: {global_settings.QUERY_MAX_ROWS} rows, {global_settings.QUERY_MAX_BYTES} bytes)"
+        )
+
+def _rejected(admission: Dict) -> QueryOutcome:
+    return QueryOutcome(json.dumps({"error": f"Query rejected: {admission['reason']}"}), admission=admission)
+
+def _validate(query: str, snapshot: Optional[SchemaSnapshot]) -> SqlAnalysis:
+    # Hallucinated tables or columns are reported without a database round trip
+    if snapshot is None:
+        return validate_sql(query)
+    return validate_sql(query, snapshot.derive("sql_catalog", schema_catalog), snapshot.schema_name)
+
+def _error(e: Exception, admission: Optional[Dict] = None) -> QueryOutcome:
+    error_msg = f'Error executing query: {str(e)}'
+    logger.error(error_msg)
+    return QueryOutcome(json.dumps({"error": error_msg}), admission=admission)
+
+def _fetch_from(node: DatabaseNode, sql: str) -> QueryOutcome:
+    # Runs on the node picked by the router; node failures and recovery conflicts
+    # propagate so it can fail over
+    db = node.db
+    admission = None
+    try:
+        if global_settings.QUERY_GUARD_ENABLED:
+            decision = query_guard.admit(
+                sql, lambda q: db.explain(q, statement_timeout_ms=global_settings.QUERY_STATEMENT_TIMEOUT_MS)
+            )
+            admission = decision.to_dict()
+            if decision.action == "reject":
+                return _rejected(admission)
+            sql = decision.sql
+
+        buffer = _new_buffer()
+        rows = db.iter_select(
+            sql,
+            itersize=global_settings.QUERY_FETCH_SIZE,
+            statement_timeout_ms=global_settings.QUERY_STATEMENT_TIMEOUT_MS
+        )
+        try:
+            for row in rows:
+                if not buffer.add(row):
+                    break
+        finally:
+            # Closes the server-side cursor and returns the connection early on truncation
+            rows.close()
+
+        outcome = buffer.outcome()
+        outcome.admission = admission
+        outcome.node = node.name
+        _log_truncation(outcome)
+        return outcome
+
+    except Exception as e:
+        if is_node_failure(e) or is_pool_exhausted(e) or is_recovery_conflict(e):
+            raise
+        return _error(e, admission)
+
+def fetch_result(query: str) -> QueryOutcome:
+    """
+    Executes SQL SELECT queries safely: the plan goes through the admission guard,
+    then rows stream from a server-side cursor, in a read-only transaction with a
+    statement timeout, into a bounded result. Runs on a read replica when configured.
+    Args:
+        query: The SQL query to execute (must be SELECT only)
+    Returns:
+        QueryOutcome with the JSON result (or error message), row count and truncation flag
+    """
+    logger.info(f'EXECUTION OF QUERY: {query}')
+
+    try:
+        validation = _validate(query, schema_cache.get_snapshot() if global_settings.QUERY_VALIDATE_SCHEMA else None)
+        if not validation.valid:
+            logger.error(validation.reason)
+            return QueryOutcome(json.dumps({"error": validation.reason}))
+
+        return db_router.run(lambda node: _fetch_from(node, query))
+
+    except Exception as e:
+        return _error(e)
 
 def execute_query(query: str) -> str: 
     """
@@ -78,32 +297,141 @@ def execute_query(query: str) -> str:
     Returns:
         Query results as JSON string or error message
     """
+    return fetch_result(query).result
+
+async def _afetch_from(node: DatabaseNode, sql: str) -> QueryOutcome:
+    db = node.async_db
+    admission = None
+    try:
+        if global_settings.QUERY_GUARD_ENABLED:
+            decision = await query_guard.aadmit(
+                sql, lambda q: db.explain(q, statement_timeout_ms=global_settings.QUERY_STATEMENT_TIMEOUT_MS)
+            )
+            admission = decision.to_dict()
+            if decision.action == "reject":
+                return _rejected(admission)
+            sql = decision.sql
+
+        buffer = _new_buffer()
+        rows = db.iter_select(
+            sql,
+            prefetch=global_settings.QUERY_FETCH_SIZE,
+            statement_timeout_ms=global_settings.QUERY_STATEMENT_TIMEOUT_MS
+        )
+        try:
+            async for row in rows:
+                if not buffer.add(row):
+                    break
+        finally:
+            await rows.aclose()
+
+        outcome = buffer.outcome()
+        outcome.admission = admission
+        outcome.node = node.name
+        _log_truncation(outcome)
+        return outcome
+
+    except Exception as e:
+        if is_node_failure(e) or is_pool_exhausted(e) or is_recovery_conflict(e):
+            raise
+        return _error(e, admission)
+
+async def afetch_result(query: str) -> QueryOutcome:
+    """
+    Async variant of fetch_result running on the asyncpg pools.
+    Args:
+        query: The SQL query to execute (must be SELECT only)
+    Returns:
+        QueryOutcome with the JSON result (or error message), row count and truncation flag
+    """
     logger.info(f'EXECUTION OF QUERY: {query}')
 
     try:
-        # Validate query is SELECT only
-        if not query.lower().strip().startswith('select'):
-            error_msg = "Only SELECT queries are allowed"
-            logger.error(error_msg)
-            return json.dumps({"error": error_msg})
-
-        db_config = {
-            'dbname': global_settings.DB_NAME,
-            'user': global_settings.DB_USER,
-            'password': global_settings.DB_PASSWORD,
-            'host': global_settings.DB_HOST,
-            'port': global_settings.DB_PORT
-        }
-        
-        db = PostgresDB(**db_config)
-        results = db.execute_select(query.lower())
-        
-        if not results:
-            return json.dumps({"message": "Query executed successfully but returned no results"})
-            
-        return json.dumps(results, indent=4)
+        validation = _validate(query, await schema_cache.aget_snapshot() if global_settings.QUERY_VALIDATE_SCHEMA else None)
+        if not validation.valid:
+            logger.error(validation.reason)
+            return QueryOutcome(json.dumps({"error": validation.reason}))
+
+        return await db_router.arun(lambda node: _afetch_from(node, query))
 
     except Exception as e:
-        error_msg = f'Error executing query: {str(e)}'
-        logger.error(error_msg)
-        return json.dumps({"error": error_msg})
\ No newline at end of file
+        return _error(e)
+
+def _cacheable(outcome: QueryOutcome) -> bool:
+    # Truncated results are not cached: they are the large ones and the flag would be lost.
+    # Table versions are read on the primary, so rows from a lagging replica could be
+    # older than the versions they would be stored under.
+    return (
+        not outcome.truncated
+        and not outcome.result.startswith('{"error"')
+        and db_router.is_current(outcome.node)
+    )
+
+def observe_outcome(outcome: QueryOutcome) -> None:
+    """
+    Counts a query outcome in the metrics: result cache status, rows returned
+    and failed queries.
+    Args:
+        outcome: The outcome of run_query or arun_query
+    """
+    if outcome.cache != "off":
+        cache_requests_total.inc(cache="result", result=outcome.cache)
+    if outcome.row_count is not None:
+        query_rows.observe(outcome.row_count)
+    if outcome.result.startswith('{"error"'):
+        stage_errors_total.inc(stage="query")
+
+def run_query(query: str) -> QueryOutcome:
+    """
+    Executes a SQL SELECT query through the result cache.
+    Args:
+        query: The SQL query to execute (must be SELECT only)
+    Returns:
+        QueryOutcome with the JSON result and the cache status
+    """
+    if not global_settings.RESULT_CACHE_ENABLED:
+        return fetch_result(query)
+
+    try:
+        lookup = result_cache.lookup(query)
+    except Exception as e:
+        logger.error(f"Result cache lookup failed, executing directly: {e}")
+        return fetch_result(query)
+
+    if lookup.status == "hit":
+        logger.info("Result cache hit")
+        return QueryOutcome(lookup.result, "hit")
+
+    outcome = fetch_result(query)
+    if lookup.status != "uncacheable" and _cacheable(outcome):
+        result_cache.store(query, outcome.result, lookup.versions)
+    outcome.cache = lookup.status
+    return outcome
+
+async def arun_query(query: str) -> QueryOutcome:
+    """
+    Async variant of run_query. The result cache (redis-py and psycopg2) is
+    consulted in a worker thread so the event loop never blocks on it.
+    Args:
+        query: The SQL query to execute (must be SELECT only)
+    Returns:
+        QueryOutcome with the JSON result and the cache status
+    """
+    if not global_settings.RESULT_CACHE_ENABLED:
+        return await afetch_result(query)
+
+    try:
+        lookup = await asyncio.to_thread(result_cache.lookup, query)
+    except Exception as e:
+        logger.error(f"Result cache lookup failed, executing directly: {e}")
+        return await afetch_result(query)
+
+    if lookup.status == "hit":
+        logger.info("Result cache hit")
+        return QueryOutcome(lookup.result, "hit")
+
+    outcome = await afetch_result(query)
+    if lookup.status != "uncacheable" and _cacheable(outcome):
+        await asyncio.to_thread(result_cache.store, query, outcome.result, lookup.versions)
+    outcome.cache = lookup.status
+    return outcome
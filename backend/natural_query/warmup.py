@@ -0,0 +1,109 @@
+from .services.pg_service import init_db
+from .services.async_pg_service import init_async_db
+from .services.db_router import db_router
+from .services.llm_service import llmService
+from .core.schema_cache import schema_cache
+from .core.sql_validator import schema_catalog
+from .core.question_classifier import get_question_classifier
+from .tools import build_sql_prompt
+from contextlib import contextmanager
+from config import global_settings
+from typing import Any, Dict, List
+import logging
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class Readiness:
+    """
+    Warm state of this worker, reported by /ready: each warmup step with its
+    duration and error, whether the warmup finished and whether the worker is
+    shutting down.
+    """
+
+    def __init__(self):
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.warmed = False
+        self.draining = False
+        self.warmup_ms = None
+
+    @contextmanager
+    def step(self, name: str, required: bool = False):
+        """
+        Times a warmup step and records its outcome. A failing optional step is
+        logged and skipped: what it prepares is then built on the first request.
+
+        Args:
+            name: Step name in the readiness report
+            required: Re-raise the step's error, so the worker does not start
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.steps[name] = {"ok": False, "ms": round((time.perf_counter() - started) * 1000, 2), "error": str(e)}
+            logger.error(f"Warmup step {name} failed: {e}")
+            if required:
+                raise
+            return
+        self.steps[name] = {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Ready once the warmup finished, until shutdown starts, while the primary
+        database is healthy
+        """
+        database = db_router.primary.healthy
+        return {
+            "ready": self.warmed and not self.draining and database,
+            "warmed": self.warmed,
+            "draining": self.draining,
+            "database_healthy": database,
+            "warmup_ms": self.warmup_ms,
+            "steps": dict(self.steps)
+        }
+
+readiness: Readiness = Readiness()
+
+async def warmup(schema_names: List[str]) -> None:
+    """
+    Prepares the worker before it accepts traffic: database pools, schema snapshots,
+    question classifier, LLM clients and the derived prompt structures (rendered
+    tables, token costs, validator catalog).
+
+    Args:
+        schema_names: Schemas loaded ahead of the first request
+
+    Raises:
+        Exception: The database pools could not be opened
+    """
+    started = time.perf_counter()
+
+    with readiness.step("database", required=True):
+        init_db()
+        await init_async_db()
+        db_router.start()
+
+    snapshots = []
+    with readiness.step("schema"):
+        for name in schema_names:
+            snapshots.append(schema_cache.refresh(name))
+    schema_cache.start()
+
+    if global_settings.QUESTION_CLASSIFIER_ENABLED:
+        with readiness.step("question_classifier"):
+            get_question_classifier(global_settings.QUESTION_CLASSIFIER_MODEL_PATH)
+
+    with readiness.step("llm_clients"):
+        # Builds the shared clients and, for watsonx, fetches the IAM token
+        llmService.getwatson_llm()
+
+    with readiness.step("prompts"):
+        for snapshot in snapshots:
+            build_sql_prompt("warmup", snapshot)
+            snapshot.derive("sql_catalog", schema_catalog)
+
+    readiness.warmed = True
+    readiness.warmup_ms = round((time.perf_counter() - started) * 1000, 2)
+    logger.info(f"Worker warmed up in {readiness.warmup_ms:.0f}ms: {readiness.steps}")
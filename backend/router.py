@@ -1,12 +1,92 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-from natural_query.router import router as natural_query_router
+from natural_query.router import router as natural_query_router, job_manager, async_conversation_manager
+from natural_query.services.pg_service import get_db
+from natural_query.services.async_pg_service import get_async_db
+from natural_query.services.db_router import db_router
+from natural_query.services.llm_service import llmService
+from natural_query.core.metrics import CONTENT_TYPE, registry
+from natural_query.core.worker_metrics import worker_metrics
+from config import global_settings
+from natural_query.warmup import readiness
+import asyncio
+import os
 
 api_router = APIRouter()
 
 api_router.include_router(natural_query_router,
                           prefix="/natural_query")
 
+def _pool_connections():
+    for pool, stats in (("sync", get_db().stats()), ("async", get_async_db().stats())):
+        for state in ("in_use", "idle", "waiting"):
+            yield {"pool": pool, "state": state}, stats[state]
+
+def _llm_calls():
+    for provider, scheduler in list(llmService.schedulers.items()):
+        stats = scheduler.stats()
+        yield {"provider": provider, "state": "active"}, stats["active"]
+        for priority, queued in stats["queued"].items():
+            yield {"provider": provider, "state": f"queued_{priority}"}, queued
+
+def _db_nodes():
+    for node in db_router.stats():
+        yield {"node": node["name"], "role": node["role"]}, int(node["healthy"])
+
+def _jobs():
+    stats = job_manager.stats()
+    for state in ("queued", "running"):
+        yield {"state": state}, stats[state]
+
+# Read when /metrics is scraped, so they cost nothing on the request path
+registry.callback("knai_db_pool_connections", "Database pool connections by state", ("pool", "state"), _pool_connections)
+registry.callback("knai_db_node_healthy", "1 if the database node passes its health checks", ("node", "role"), _db_nodes,
+                  merge="min")
+registry.callback("knai_llm_calls_in_flight", "LLM calls running or waiting for a slot", ("provider", "state"), _llm_calls)
+registry.callback("knai_jobs", "Background jobs run by the instance's workers, by state", ("state",), _jobs)
+
 @api_router.get("/ping")
 async def get_health_check():
-    return "Hello we are Knai :). Thank you for pinging us"
\ No newline at end of file
+    return "Hello we are Knai :). Thank you for pinging us"
+
+@api_router.get("/ready")
+async def get_readiness():
+    """
+    Readiness of this worker, for load balancers and orchestrators: 200 once it is
+    warmed up with its database and Redis reachable, 503 otherwise. /ping only
+    tells that the process answers.
+    """
+    status = readiness.status()
+    try:
+        await asyncio.wait_for(async_conversation_manager.redis_client.ping(), timeout=1)
+        status["redis_healthy"] = True
+    except Exception:
+        status["redis_healthy"] = False
+        status["ready"] = False
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@api_router.get("/pool/stats")
+async def get_pool_stats():
+    """
+    Pools, database nodes and LLM schedulers of the worker that answers, for
+    debugging; /metrics has the instance's totals.
+    """
+    return {
+        "worker": os.getpid(),
+        "sync": get_db().stats(),
+        "async": get_async_db().stats(),
+        "nodes": db_router.stats(),
+        "llm": llmService.stats()
+    }
+
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Metrics in the Prometheus text format. With METRICS_SHARED, the totals of all
+    workers of the instance (see worker_metrics), whatever worker answers; otherwise
+    this worker's alone.
+    """
+    if global_settings.METRICS_SHARED:
+        return PlainTextResponse(await asyncio.to_thread(worker_metrics.render), media_type=CONTENT_TYPE)
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,30 @@
+"""
+Converts conversations stored by earlier versions (one JSON string per conv:{id} key)
+into the Redis list layout used by ConversationManager, keeping each key's TTL and
+its last CONVERSATION_MAX_MESSAGES messages.
+
+Running it is optional: a legacy key is also converted the first time a request
+reads or appends to it. The script is idempotent and safe to run while the API serves
+traffic.
+
+Usage (from backend/):
+    python -m scripts.migrate_conversations
+    python -m scripts.migrate_conversations --redis-url redis://localhost:6379/0 --batch-size 1000
+"""
+from natural_query.service import ConversationManager
+from config import global_settings
+import argparse
+import time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default=global_settings.REDIS_URI)
+    parser.add_argument("--batch-size", type=int, default=500, help="Keys requested per SCAN call")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    report = ConversationManager(redis_url=args.redis_url).migrate_all(batch_size=args.batch_size)
+    print(
+        f"{report['migrated']} of {report['scanned']} legacy conversations migrated "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
@@ -0,0 +1,64 @@
+"""
+Production launcher: several uvicorn worker processes, one per CPU unless
+SERVER_WORKERS says otherwise, without auto reload and without recycling workers
+(SERVER_MAX_REQUESTS=0), so database pools, LLM clients and caches stay warm.
+
+Workers share nothing but Redis (conversations, SQL/result/schema caches, jobs): each
+one opens its own database pools (up to DB_POOL_MAX_SIZE connections each) and runs
+the warmup of app.py before it accepts connections. A dead worker is restarted by the
+uvicorn supervisor. Point readiness probes at /ready and liveness probes at /ping.
+
+Metrics: a scrape of /metrics reaches whichever worker accepts it, so the workers
+merge their metrics through Redis (METRICS_SHARED, natural_query/core/worker_metrics.py)
+instead of each serving its own registry, which would make counters jump between
+scrapes and break rate(). Every METRICS_PUBLISH_INTERVAL seconds each worker
+publishes a snapshot under this launch's METRICS_INSTANCE; /metrics sums them, so
+other workers' figures can be that many seconds old. prometheus_client's
+multiprocess mode would do the same through files in a shared directory, at the
+cost of a new dependency and of replacing the registry. /pool/stats stays per worker.
+
+Usage (from backend/):
+    python serve.py
+    SERVER_WORKERS=4 SERVER_PORT=8080 python serve.py
+"""
+from config import global_settings
+import logging
+import uvicorn
+import socket
+import time
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def worker_count() -> int:
+    """
+    SERVER_WORKERS, or the CPUs available to this process
+    """
+    if global_settings.SERVER_WORKERS > 0:
+        return global_settings.SERVER_WORKERS
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Not available on macOS and Windows
+        return os.cpu_count() or 1
+
+if __name__ == "__main__":
+    workers = worker_count()
+    # Workers inherit it: metrics of earlier launches on this host are never merged in
+    os.environ.setdefault("METRICS_INSTANCE", f"{socket.gethostname()}:{os.getpid()}:{int(time.time())}")
+    logger.info(
+        f"Starting {workers} workers on {global_settings.SERVER_HOST}:{global_settings.SERVER_PORT} "
+        f"(up to {workers * global_settings.DB_POOL_MAX_SIZE} database connections per pool type)"
+    )
+    uvicorn.run(
+        "app:app",
+        host=global_settings.SERVER_HOST,
+        port=global_settings.SERVER_PORT,
+        workers=workers,
+        log_level="info",
+        timeout_keep_alive=global_settings.SERVER_KEEP_ALIVE,
+        timeout_graceful_shutdown=global_settings.SERVER_GRACEFUL_TIMEOUT,
+        limit_concurrency=global_settings.SERVER_LIMIT_CONCURRENCY or None,
+        limit_max_requests=global_settings.SERVER_MAX_REQUESTS or None
+    )